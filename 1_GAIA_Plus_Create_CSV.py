@@ -5,13 +5,21 @@ import pandas as pd
 import numpy as np
 import os
 import re
-import base64
 from astroquery.gaia import Gaia
 from astroquery.simbad import Simbad
 from astropy.coordinates import SkyCoord
 import astropy.units as u
+from astropy.table import Table
 import requests
-from collections import defaultdict
+import sqlite3
+import hashlib
+import json
+import threading
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from gaia_codec import encode_cube, encode_2d, encode_cube_array, encode_2d_array
+from gaia_io import write_catalogue_parquet
 
 # Configure logging
 import logging
@@ -19,38 +27,51 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-# Base64 encoding functions for cube and 2D grid systems
-def encode_axis(n):
-    """Encodes an integer 0–262,143 into 3-character Base64."""
-    n = max(0, min(int(n), 262143))  # Clip to 18-bit range
-    b = bytes([(n >> 12) & 0x3F, (n >> 6) & 0x3F, n & 0x3F])
-    return base64.b64encode(b).decode('ascii')[:3]
-
-def encode_cube(x, y, z):
-    """Encodes 3D coordinates into a 9-character Base64 string."""
-    return encode_axis(x) + encode_axis(y) + encode_axis(z)
-
-def encode_2d(x, y):
-    x = int(x)
-    y = int(y)
-    val = (x << 64) + y  # 128-bit total
-    b = val.to_bytes(16, byteorder='big')  # 16 bytes = 128 bits
-    return base64.b64encode(b).decode('ascii').rstrip('=')  # typically 22 chars
-
-def decode_2d(b64):
-    b64 += '=' * ((4 - len(b64) % 4) % 4)  # pad to multiple of 4
-    val = int.from_bytes(base64.b64decode(b64), byteorder='big')
-    x = (val >> 64) & ((1 << 64) - 1)
-    y = val & ((1 << 64) - 1)
-    return x, y
-
-
 # Output files
 output_dir = r"C:/Users/luser/OneDrive/Python_script/GAIA/"
 endless_sky_csv = r"C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus.csv"
 endless_sky_no_simbad_csv = r"C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus_Simbad.csv"
 append_mode = False
 
+# Optional Parquet copy of the catalogue, partitioned by quadrant and 2D_sector, for the downstream stages
+write_parquet = False
+parquet_output_dir = os.path.join(output_dir, "GAIA_Plus_parquet")
+
+# Tile manifest: with resume set, a restart skips completed tiles and redoes failed or missing ones.
+# The manifest records the tiling parameters and refuses to resume under different ones. Rows past
+# the last completed tile are cut only when the manifest knows which tile wrote them; set
+# truncate_outputs to also discard rows it has no record of (e.g. a CSV without its manifest).
+# sky_region = (ra_min, ra_max, dec_min, dec_max) limits a run to the tiles overlapping that region.
+tile_manifest_path = os.path.join(output_dir, "GAIA_Plus_manifest.sqlite")
+resume = True
+truncate_outputs = False
+sky_region = None
+
+# SIMBAD cross-match settings; point simbad_tap_url at a local TAP service to test without the network
+simbad_bulk_match = True
+simbad_tap_url = None
+SIMBAD_MATCH_RADIUS_ARCSEC = 30
+SIMBAD_TAP_MAXREC = 2000000
+
+# Persistent SIMBAD name cache; bump SIMBAD_CACHE_VERSION when the matching rules change
+simbad_cache_path = os.path.join(output_dir, "simbad_names_cache.sqlite")
+SIMBAD_CACHE_VERSION = "1"
+simbad_cache_ttl_days = 180
+
+# Full-sky pass: tiles in flight, and per-service concurrency and minimum spacing between calls
+batch_size = 10000
+
+# Adaptive tiling: equal-area base tiles of base_tile_deg, split into quadrants down to
+# min_tile_deg whenever a query returns the full TOP batch_size rows
+adaptive_tiling = True
+base_tile_deg = 2
+min_tile_deg = 1 / 16
+tile_workers = 8
+gaia_max_concurrent = 4
+gaia_min_interval = 0.5
+simbad_max_concurrent = 2
+simbad_min_interval = 1.0
+
 # Star classification table
 star_image_key = [
     {"class": "O", "type": "giant", "sprites": ["star/o0", "star/o0_supergiant", "star/o1"]},
@@ -77,6 +98,22 @@ star_image_key = [
 ]
 
 
+def best_simbad_match(result, query_coord):
+    """Pick the object of a cone search result that names the star.
+
+    The nearest object with a '*'-prefixed main_id wins; when none is
+    '*'-prefixed, the nearest object. Returns (main_id, distance in arcsec).
+    """
+    main_id_col = 'main_id' if 'main_id' in result.colnames else 'MAIN_ID'
+    main_ids = [str(main_id) for main_id in result[main_id_col]]
+    coords = SkyCoord(ra=np.asarray(result['ra'], dtype=float) * u.degree,
+                      dec=np.asarray(result['dec'], dtype=float) * u.degree, frame='icrs')
+    distances = np.atleast_1d(query_coord.separation(coords).arcsec)
+    stars = [i for i, main_id in enumerate(main_ids) if main_id.startswith('*')]
+    candidates = np.array(stars) if stars else np.arange(len(main_ids))
+    best = int(candidates[np.argmin(distances[candidates])])
+    return main_ids[best], float(distances[best])
+
 def get_simbad_names_sync(df_batch , default_names):
     """Query SIMBAD for additional names using RA and Dec, return only the primary name (main_id)."""
     custom_simbad = Simbad()
@@ -124,17 +161,7 @@ def get_simbad_names_sync(df_batch , default_names):
             if success:
                 name = default_names[sid]
                 if result is not None and len(result) > 0:
-                    main_id_col = 'main_id' if 'main_id' in result.colnames else 'MAIN_ID'
-                    best_match_idx = 0
-                    min_distance = float('inf')
-                    for i in range(len(result)):
-                        result_coord = SkyCoord(ra=result['ra'][i] * u.degree , dec=result['dec'][i] * u.degree ,
-                                                frame='icrs')
-                        distance = query_coord.separation(result_coord).arcsec
-                        if result[main_id_col][i].startswith('*') and distance < min_distance:
-                            best_match_idx = i
-                            min_distance = distance
-                    name = result[main_id_col][best_match_idx]
+                    name, min_distance = best_simbad_match(result, query_coord)
                     found += 1
                     if found <= 5:
                         logger.info(
@@ -152,8 +179,13 @@ def get_simbad_names_sync(df_batch , default_names):
     logger.info(f"SIMBAD query summary: Found matches for {found}/{total} stars ({found / total * 100:.1f}%)")
     return names_dict
 
-def get_simbad_names(df_batch, default_names):
-    """Query SIMBAD for additional names using RA and Dec, return only the primary name (main_id)."""
+def get_simbad_names(df_batch, default_names, matches=None):
+    """Query SIMBAD for additional names using RA and Dec, return only the primary name (main_id).
+
+    With a matches dict, also record {source_id: (main_id or None, distance_arcsec
+    or None)} for every star SIMBAD answered, so misses can be told apart from
+    failed queries, which get the default name too.
+    """
     custom_simbad = Simbad()
     custom_simbad.add_votable_fields('main_id', 'ids', 'ra', 'dec')
     names_dict = {}
@@ -178,21 +210,16 @@ def get_simbad_names(df_batch, default_names):
 
                 name = default_names[sid]
                 if result is not None and len(result) > 0:
-                    main_id_col = 'main_id' if 'main_id' in result.colnames else 'MAIN_ID'
-                    best_match_idx = 0
-                    min_distance = float('inf')
-                    for i in range(len(result)):
-                        result_coord = SkyCoord(ra=result['ra'][i] * u.degree, dec=result['dec'][i] * u.degree, frame='icrs')
-                        distance = query_coord.separation(result_coord).arcsec
-                        if result[main_id_col][i].startswith('*') and distance < min_distance:
-                            best_match_idx = i
-                            min_distance = distance
-                    name = result[main_id_col][best_match_idx]
+                    name, distance = best_simbad_match(result, query_coord)
                     found += 1
                     if found <= 5:
                         logger.info(f"Simbad source_id {sid} at RA={ra}°, Dec={dec}° found {name}")
+                    if matches is not None:
+                        matches[sid] = (name, distance)
                 else:
                     logger.info(f"Simbad source_id {sid} at RA={ra}°, Dec={dec}° found None, using default {name}")
+                    if matches is not None:
+                        matches[sid] = (None, None)
 
                 names_dict[sid] = name
                 time.sleep(0.3)
@@ -217,6 +244,168 @@ def get_simbad_names(df_batch, default_names):
     logger.info(f"SIMBAD query summary: Found matches for {found}/{total} stars ({found/total*100:.1f}%)")
     return names_dict
 
+class SimbadNameCache:
+    """SQLite cache of SIMBAD cross-match results keyed by Gaia source_id.
+
+    A row with a NULL name records a "no match" so the star is not queried again.
+    Rows written under another SIMBAD_CACHE_VERSION, or older than ttl_days, are
+    treated as missing and get re-queried.
+    """
+
+    def __init__(self, path, version=SIMBAD_CACHE_VERSION, ttl_days=None):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS simbad_names (
+                source_id INTEGER PRIMARY KEY,
+                name TEXT,
+                distance_arcsec REAL,
+                version TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.version = version
+        self.ttl_days = ttl_days
+
+    def lookup(self, source_ids):
+        """Return {source_id: name or None} for the fresh entries among source_ids."""
+        ids = [int(sid) for sid in source_ids]
+        oldest = time.time() - self.ttl_days * 86400 if self.ttl_days else 0
+        found = {}
+        for start in range(0, len(ids), 900):  # stay under SQLite's bound-parameter limit
+            chunk = ids[start:start + 900]
+            placeholders = ','.join('?' * len(chunk))
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT source_id, name FROM simbad_names "
+                    f"WHERE version = ? AND fetched_at >= ? AND source_id IN ({placeholders})",
+                    [self.version, oldest, *chunk]
+                ).fetchall()
+            found.update(rows)
+        return found
+
+    def store(self, records):
+        """Record (source_id, name or None, distance_arcsec or None) tuples."""
+        now = time.time()
+        rows = [
+            (int(sid), name, None if distance is None or pd.isna(distance) else float(distance), self.version, now)
+            for sid, name, distance in records
+        ]
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO simbad_names VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+
+    def invalidate(self, version=None):
+        """Delete entries of one version, or of every version except the current one."""
+        with self.lock:
+            if version is None:
+                self.conn.execute("DELETE FROM simbad_names WHERE version != ?", [self.version])
+            else:
+                self.conn.execute("DELETE FROM simbad_names WHERE version = ?", [version])
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def _tap_service(tap_url):
+    """pyvo TAPService for tap_url; pyvo is imported lazily, only simbad_tap_url needs it."""
+    try:
+        from pyvo.dal import TAPService
+    except ImportError as e:
+        raise ImportError("simbad_tap_url needs pyvo (pip install pyvo)") from e
+    return TAPService(tap_url)
+
+def query_simbad_bulk(df_tile, tap_url=None):
+    """Cross-match a whole tile against SIMBAD with one TAP upload.
+
+    Uploads (source_id, ra, dec) once and returns every SIMBAD object within
+    30 arcsec, then keeps the nearest '*'-prefixed main_id per source (or the
+    nearest object when none is '*'-prefixed), as best_simbad_match does for
+    the per-star path.
+    Set tap_url to point at another TAP service, e.g. a local stand-in.
+    Returns a DataFrame of source_id, main_id, dist_arcsec for matched stars and
+    raises on any service error so the caller can fall back to per-star queries.
+    """
+    upload = Table.from_pandas(df_tile[['source_id', 'ra', 'dec']].reset_index(drop=True))
+
+    query = f"""
+    SELECT up.source_id, b.main_id,
+        DISTANCE(POINT('ICRS', up.ra, up.dec), POINT('ICRS', b.ra, b.dec)) * 3600 AS dist_arcsec
+    FROM TAP_UPLOAD.tile AS up
+    JOIN basic AS b
+    ON 1 = CONTAINS(POINT('ICRS', b.ra, b.dec), CIRCLE('ICRS', up.ra, up.dec, {SIMBAD_MATCH_RADIUS_ARCSEC} / 3600.))
+    """
+    if tap_url:
+        result = _tap_service(tap_url).run_sync(query, uploads={'tile': upload}, maxrec=SIMBAD_TAP_MAXREC).to_table()
+    else:
+        result = Simbad().query_tap(query, maxrec=SIMBAD_TAP_MAXREC, tile=upload)
+
+    matches = result.to_pandas() if len(result) else pd.DataFrame(columns=['source_id', 'main_id', 'dist_arcsec'])
+    matches.columns = [c.lower() for c in matches.columns]
+    matches['main_id'] = matches['main_id'].astype(str)
+    matches['not_star'] = ~matches['main_id'].str.startswith('*')
+    best = (matches.sort_values(['source_id', 'not_star', 'dist_arcsec'], kind='stable')
+            .drop_duplicates('source_id', keep='first'))
+    for sid, name, dist in best[['source_id', 'main_id', 'dist_arcsec']].head(5).itertuples(index=False):
+        logger.info(f"Simbad source_id {sid} found {name} (distance={dist:.2f} arcsec)")
+    return best[['source_id', 'main_id', 'dist_arcsec']]
+
+def resolve_simbad_names(milkyway_stars, default_names, cache=None):
+    """Resolve SIMBAD names for a tile.
+
+    Stars already in the cache are answered from it. The rest go through the
+    bulk TAP cross-match, with per-star cone searches as the fallback, and the
+    outcome is written back to the cache.
+    """
+    total = len(milkyway_stars)
+    cached = cache.lookup(milkyway_stars['source_id']) if cache is not None else {}
+    names_dict = {sid: name if name is not None else default_names[sid] for sid, name in cached.items()}
+    found = sum(name is not None for name in cached.values())
+
+    todo = milkyway_stars[~milkyway_stars['source_id'].isin(list(cached))]
+    valid = todo['ra'].between(-360, 360) & todo['dec'].between(-90, 90)
+    for sid in todo.loc[~valid, 'source_id']:
+        logger.error(f"Invalid RA/Dec for source_id {sid}, using default name")
+        names_dict[sid] = default_names[sid]
+    todo = todo[valid]
+
+    records = []
+    bulk_done = False
+    if simbad_bulk_match and not todo.empty:
+        try:
+            best = simbad_limiter.call(query_simbad_bulk, todo, tap_url=simbad_tap_url)
+            matched = dict(zip(best['source_id'], zip(best['main_id'], best['dist_arcsec'])))
+            for sid in todo['source_id']:
+                name, distance = matched.get(sid, (None, None))
+                names_dict[sid] = name if name is not None else default_names[sid]
+                records.append((sid, name, distance))
+            found += len(matched)
+            bulk_done = True
+        except Exception as e:
+            logger.warning(f"Bulk SIMBAD cross-match failed ({e}), falling back to per-star queries")
+
+    if not bulk_done:
+        # Stars whose query failed are left out of the cache and retried next run
+        simbad_batch_size = 100
+        for start in range(0, len(todo), simbad_batch_size):
+            df_batch = todo[start:start + simbad_batch_size]
+            matches = {}
+            with simbad_limiter.slot():
+                batch_names = get_simbad_names(df_batch, default_names, matches)
+            names_dict.update(batch_names)
+            records.extend((sid, name, distance) for sid, (name, distance) in matches.items())
+            found += sum(name is not None for name, _ in matches.values())
+            time.sleep(1)
+
+    if cache is not None and records:
+        cache.store(records)
+
+    hit_rate = len(cached) / total * 100 if total else 0.0
+    logger.info(f"SIMBAD tile summary: Found matches for {found}/{total} stars ({found / total * 100:.1f}%), "
+                f"cache hits {len(cached)}/{total} ({hit_rate:.1f}%)")
+    return names_dict
+
 def get_star_classification(star_class, luminosity_class):
     """Map star_class and luminosity_class to StarClass and Sub_Class from the table."""
     sub_class_map = {"I": "giant", "V": "dwarf"}
@@ -377,194 +566,760 @@ def calculate_relative_force(mass, distance_pc):
     min_force = G * min_mass * M_earth / (max_distance_m ** 2)
     return force / min_force if min_force > 0 else 1.0
 
-# Create the output directory if it doesn't exist
-try:
-    os.makedirs(output_dir, exist_ok=True)
-except PermissionError as e:
-    raise PermissionError(f"Cannot create directory at {output_dir}. Check write permissions: {e}")
-
-# Initialize Simbad custom query
-custom_simbad = Simbad()
-custom_simbad.add_votable_fields('main_id', 'ids')
 
-# Batch query Gaia DR3 by RA and Dec ranges
-batch_size = 10000
-ra_step = 1
-dec_step = 1
-ra_ranges = [(i, i + ra_step) for i in range(0, 360, ra_step)]
-dec_ranges = [(i, i + dec_step) for i in range(-90, 90, dec_step)]
-
-for ra_idx, (ra_start, ra_end) in enumerate(ra_ranges):
-    for dec_idx, (dec_start, dec_end) in enumerate(dec_ranges):
-        try:
-            print(f"Querying Gaia DR3 for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}...")
-            query = f"""
-            SELECT TOP {batch_size} 
-                gs.source_id, gs.ra, gs.dec, gs.parallax, 
-                gs.phot_g_mean_mag, gs.phot_bp_mean_mag, gs.phot_rp_mean_mag, 
-                gs.bp_rp, gs.bp_g, gs.g_rp, gs.radial_velocity, 
-                gs.l, gs.b, gs.ecl_lon, gs.ecl_lat,
-                ap.teff_gspphot, ap.radius_gspphot
-            FROM gaiadr3.gaia_source AS gs
-            LEFT JOIN gaiadr3.astrophysical_parameters AS ap ON gs.source_id = ap.source_id
-            WHERE gs.parallax > 0.01
-            AND gs.ra BETWEEN {ra_start} AND {ra_end}
-            AND gs.dec BETWEEN {dec_start} AND {dec_end}
-            AND gs.ra IS NOT NULL AND gs.dec IS NOT NULL
-            AND gs.phot_g_mean_mag IS NOT NULL
-            AND gs.phot_bp_mean_mag IS NOT NULL
-            AND gs.phot_rp_mean_mag IS NOT NULL
-            AND ap.teff_gspphot IS NOT NULL
-            AND gs.l IS NOT NULL
-            """
-            job = Gaia.launch_job(query)
-            result = job.get_results()
-            df = result.to_pandas()
-
-            if df.empty:
-                print(f"No data returned for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}, skipping...")
-                continue
-
-            print(f"Processing {len(df)} stars for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}...")
-
-            df['Computed_Distance_Parsec'] = df['parallax'].apply(lambda p: 1000 / p if p > 0 else float('inf'))
-
-            milkyway_stars = df[df['Computed_Distance_Parsec'] <= 100000].copy()
-
-            if not milkyway_stars.empty:
-                coords = milkyway_stars.apply(calculate_3d_coordinates, axis=1, result_type='expand')
-                milkyway_stars[['x_Coord', 'y_Coord', 'z_Coord']] = coords
-
-                # Calculate Base64 cube coordinates (1-light-year cubes)
-                PARSEC_TO_LY = 3.26
-                milkyway_stars['cube_x'] = ((milkyway_stars['x_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
-                milkyway_stars['cube_y'] = ((milkyway_stars['y_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
-                milkyway_stars['cube_z'] = ((milkyway_stars['z_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
-                milkyway_stars['base64_Cube'] = milkyway_stars.apply(
-                    lambda row: encode_cube(row['cube_x'], row['cube_y'], row['cube_z']),
-                    axis=1
-                )
-
-                # Calculate Base64 2D grid coordinates (1-light-year grids)
-                milkyway_stars['flat_x'] = milkyway_stars['x_Coord']
-                milkyway_stars['flat_y'] = milkyway_stars['y_Coord'] + (milkyway_stars['z_Coord'] / 100)
-                milkyway_stars['grid_x'] = ((milkyway_stars['flat_x'] * PARSEC_TO_LY) / 1).astype(int) + 75000
-                milkyway_stars['grid_y'] = ((milkyway_stars['flat_y'] * PARSEC_TO_LY) / 1).astype(int) + 75000
-                milkyway_stars['base64_2D'] = milkyway_stars.apply(
-                    lambda row: encode_2d(row['grid_x'], row['grid_y']),
-                    axis=1
-                )
-
-                milkyway_stars['quadrant'] = milkyway_stars.apply(determine_quadrant, axis=1)
-
-                milkyway_stars['abs_g_mag'] = milkyway_stars.apply(
-                    lambda row: calculate_absolute_magnitude(row['phot_g_mean_mag'], row['parallax']), axis=1)
-
-                milkyway_stars['B_V'] = milkyway_stars['bp_rp'].apply(approximate_bv)
-
-                milkyway_stars['mass'] = milkyway_stars.apply(
-                    lambda row: estimate_mass(row['bp_rp'], row['teff_gspphot'], row['abs_g_mag']), axis=1)
-                milkyway_stars['gravitational_force'] = milkyway_stars.apply(
-                    lambda row: calculate_relative_force(row['mass'], row['Computed_Distance_Parsec']), axis=1)
-
-                milkyway_stars['star_class'] = milkyway_stars['teff_gspphot'].apply(classify_star)
-                milkyway_stars['luminosity_class'] = milkyway_stars['abs_g_mag'].apply(determine_luminosity_class)
-
-                milkyway_stars[['StarClass', 'Sub_Class', 'Sys_Icons']] = milkyway_stars.apply(
-                    lambda row: pd.Series(get_star_classification(row['star_class'], row['luminosity_class'])), axis=1)
-
-                milkyway_stars['Remaining_Mass_Earth'] = milkyway_stars['mass'].apply(calculate_remaining_mass_earth)
-
-                milkyway_stars['planet_types'] = milkyway_stars.apply(
-                    lambda row: assign_planet_types(row['StarClass'], row['Computed_Distance_Parsec']), axis=1)
-                milkyway_stars['age_gyr'] = milkyway_stars['teff_gspphot'].apply(estimate_age)
-                milkyway_stars['game_x'] = milkyway_stars['flat_x'] / 1000
-                milkyway_stars['game_y'] = milkyway_stars['flat_y'] / 1000
-                milkyway_stars['game_z'] = milkyway_stars['z_Coord'] / 1000
-                milkyway_stars['estimate_lum'] = milkyway_stars.apply(
-                    lambda row: estimate_luminosity(row['abs_g_mag'], row['teff_gspphot']), axis=1)
-
-                # Assign trade values
-                trade_goods = {
-                    "Clothing": (250, 255),
-                    "Electronics": (600, 605),
-                    "Equipment": (361, 366),
-                    "Food": (100, 105),
-                    "Heavy Metals": (800, 805),
-                    "Luxury Goods": (900, 905),
-                    "Industrial": (650, 655),
-                    "Medical": (500, 505),
-                    "Metal": (200, 205),
-                    "Plastic": (300, 305)
-                }
-                trade_data = [
-                    {good: random.uniform(min_val, max_val) for good, (min_val, max_val) in trade_goods.items()}
-                    for _ in range(len(milkyway_stars))
-                ]
-                for good in trade_goods:
-                    milkyway_stars[good] = [data[good] for data in trade_data]
-
-                # Flag potential binary systems (cubes with exactly 2 stars)
-                cube_counts = milkyway_stars['base64_Cube'].value_counts()
-                milkyway_stars['binary_candidate'] = milkyway_stars['base64_Cube'].map(cube_counts == 2)
-
-                grid_index = str(ra_idx * 180 + dec_idx).zfill(4)
-                milkyway_stars['counter'] = [str(i).zfill(4) for i in range(len(milkyway_stars))]
-                milkyway_stars['Name_two'] = milkyway_stars.apply(
-                    lambda row: f"S{row['quadrant']}{grid_index}-{row['counter']}",
-                    axis=1
-                )
-
-                # Calculate 2D and 3D sectors (16,300-light-year cubes)
-                min_game_x = milkyway_stars['game_x'].min()
-                min_game_y = milkyway_stars['game_y'].min()
-                min_game_z = milkyway_stars['game_z'].min()
-                milkyway_stars['game_x_adj'] = milkyway_stars['game_x'] - min_game_x
-                milkyway_stars['game_y_adj'] = milkyway_stars['game_y'] - min_game_y
-                milkyway_stars['game_z_adj'] = milkyway_stars['game_z'] - min_game_z
-                milkyway_stars['sector_x'] = (milkyway_stars['game_x_adj'] / 5).astype(int)
-                milkyway_stars['sector_y'] = (milkyway_stars['game_y_adj'] / 5).astype(int)
-                milkyway_stars['sector_z'] = (milkyway_stars['game_z_adj'] / 5).astype(int)
-                milkyway_stars['2D_sector'] = milkyway_stars.apply(
-                    lambda row: f"S{row['quadrant']}{str(row['sector_x'] * 20 + row['sector_y']).zfill(2)}",
-                    axis=1
-                )
-                milkyway_stars['3D_sector'] = milkyway_stars.apply(
-                    lambda row: f"S{row['quadrant']}{str(row['sector_z'] * 400 + row['sector_x'] * 20 + row['sector_y']).zfill(3)}",
-                    axis=1
-                )
-                milkyway_stars = milkyway_stars.drop(columns=['cube_x', 'cube_y', 'cube_z', 'grid_x', 'grid_y', 'game_x_adj', 'game_y_adj', 'game_z_adj', 'sector_x', 'sector_y', 'sector_z'])
-
-                simbad_batch_size = 100
-                default_names = milkyway_stars.set_index('source_id')['Name_two'].to_dict()
-                for start in range(0, len(milkyway_stars), simbad_batch_size):
-                    df_batch = milkyway_stars[start:start + simbad_batch_size]
-                    simbad_names = get_simbad_names(df_batch, default_names)
-                    milkyway_stars.loc[df_batch.index, 'simbad_names'] = df_batch['source_id'].map(simbad_names)
-                    time.sleep(1)
-
-                milkyway_stars = milkyway_stars.drop(columns=['star_class', 'luminosity_class'])
-
-                mode = 'a' if append_mode else 'w'
-                header = not append_mode
-                try:
-                    milkyway_stars.to_csv(endless_sky_csv, mode=mode, header=header, index=False)
-                    append_mode = True
-                    print(f"Appended {len(milkyway_stars)} stars to {endless_sky_csv}")
-
-                    no_simbad_matches = milkyway_stars[milkyway_stars['Name_two'] != milkyway_stars['simbad_names']]
-                    no_simbad_matches.to_csv(endless_sky_no_simbad_csv, mode=mode, header=header, index=False)
-                    print(f"Appended {len(no_simbad_matches)} stars with no SIMBAD name match to {endless_sky_no_simbad_csv}")
-                except PermissionError as e:
-                    print(f"Error writing to {endless_sky_csv} or {endless_sky_no_simbad_csv}: {e}")
-                    continue
+# Vectorized derivation chain
+# The output is bit-identical to add_derived_columns_rowwise. The four libm steps
+# (the squares in B_V and gravitational_force, the log10 in abs_g_mag and the
+# power of ten in estimate_lum) run through math per element for that, as NumPy's
+# kernels can differ from libm by 1 ulp. EXACT_LIBM = False uses NumPy's kernels
+# instead: a little faster, but abs_g_mag, estimate_lum and the rest can then be
+# 1 ulp off, and a value on a class threshold can flip luminosity_class/Sub_Class.
+EXACT_LIBM = True
+
+
+def _log10(x):
+    if EXACT_LIBM:
+        return np.array([math.log10(v) for v in np.asarray(x, dtype=float).tolist()], dtype=float)
+    return np.log10(x)
+
+def _pow(x, y):
+    if EXACT_LIBM:
+        x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y))
+        return np.array([a ** b for a, b in zip(x.tolist(), y.tolist())], dtype=float).reshape(x.shape)
+    return np.power(x, y)
+
+def calculate_3d_coordinates_vec(ra, dec, parallax):
+    """Vectorized calculate_3d_coordinates over column arrays."""
+    ra_rad = np.radians(np.asarray(ra, dtype=float))
+    dec_rad = np.radians(np.asarray(dec, dtype=float))
+    parallax = np.asarray(parallax, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.where(parallax > 0, 1000 / parallax, 100000)
+    x = distance * np.cos(dec_rad) * np.cos(ra_rad)
+    y = distance * np.cos(dec_rad) * np.sin(ra_rad)
+    z = distance * np.sin(dec_rad)
+    return x, y, z
 
-                append_mode = True
+def approximate_bv_vec(bp_rp):
+    """Vectorized approximate_bv."""
+    bp_rp = np.asarray(bp_rp, dtype=float)
+    bv = np.full(bp_rp.shape, np.nan)
+    valid = ~np.isnan(bp_rp)
+    v = bp_rp[valid]
+    bv[valid] = -0.0238 + 0.6485 * v + -0.0175 * _pow(v, 2)
+    return bv
+
+def determine_quadrant_vec(l):
+    """Vectorized determine_quadrant; pass None when there is no l column."""
+    if l is None:
+        return "1"
+    l = np.asarray(l, dtype=float)
+    return np.select(
+        [(0 <= l) & (l < 90), (90 <= l) & (l < 180), (180 <= l) & (l < 270)],
+        ["1", "2", "3"],
+        default="4"
+    )
+
+def estimate_mass_vec(bp_rp, teff, abs_mag):
+    """Vectorized estimate_mass."""
+    bp_rp = np.asarray(bp_rp, dtype=float)
+    teff = np.asarray(teff, dtype=float)
+    abs_mag = np.asarray(abs_mag, dtype=float)
+    mass = np.select([teff >= 6000, teff >= 4000], [1.0, 0.5], default=0.1)
+    mass = np.where(abs_mag < 5, mass * 1.5, mass)
+    missing = np.isnan(bp_rp) | np.isnan(teff) | np.isnan(abs_mag)
+    return np.where(missing, 0.5 * 1.989e30, mass * 1.989e30)
+
+def calculate_absolute_magnitude_vec(phot_g_mean_mag, parallax):
+    """Vectorized calculate_absolute_magnitude."""
+    phot_g_mean_mag = np.asarray(phot_g_mean_mag, dtype=float)
+    parallax = np.asarray(parallax, dtype=float)
+    abs_mag = np.full(parallax.shape, np.nan)
+    valid = parallax > 0
+    distance_pc = 1000 / parallax[valid]
+    abs_mag[valid] = phot_g_mean_mag[valid] - 5 * _log10(distance_pc) + 5
+    return abs_mag
+
+def estimate_luminosity_vec(abs_mag, teff):
+    """Vectorized estimate_luminosity."""
+    abs_mag = np.asarray(abs_mag, dtype=float)
+    teff = np.asarray(teff, dtype=float)
+    lum = np.ones(abs_mag.shape)
+    valid = ~(np.isnan(abs_mag) | np.isnan(teff))
+    t = teff[valid]
+    bc = np.select([t > 30000, t > 10000, t > 7500, t > 6000, t > 4000],
+                   [-0.2, -0.1, 0.0, 0.1, 0.2], default=0.3)
+    m_bol = abs_mag[valid] + bc
+    m_bol_sun = 4.74
+    lum[valid] = _pow(10, 0.4 * (m_bol_sun - m_bol))
+    return lum
+
+def estimate_age_vec(teff):
+    """Vectorized estimate_age."""
+    teff = np.asarray(teff, dtype=float)
+    return np.where(np.isnan(teff), 5.0, np.clip(10 - (teff / 10000), 0, 13))
+
+def assign_planet_types_vec(star_class, distance):
+    """Vectorized assign_planet_types."""
+    star_class = np.asarray(star_class, dtype=object)
+    distance = np.asarray(distance, dtype=float)
+    distance = np.where(np.isnan(distance), 100000, distance)
+    return np.select(
+        [np.isin(star_class, ["O", "B"]), np.isin(star_class, ["A", "F", "G"]) & (distance < 5000)],
+        ["Gas Giant", "Rocky, Gas Giant"],
+        default="Rocky"
+    )
+
+def determine_luminosity_class_vec(abs_mag):
+    """Vectorized determine_luminosity_class."""
+    return np.where(np.asarray(abs_mag, dtype=float) < 0, "I", "V")
+
+def classify_star_vec(teff):
+    """Vectorized classify_star."""
+    teff = np.asarray(teff, dtype=float)
+    return np.select(
+        [teff > 30000,
+         (10000 <= teff) & (teff < 30000),
+         (7500 <= teff) & (teff < 10000),
+         (6000 <= teff) & (teff < 7500),
+         (5200 <= teff) & (teff < 6000),
+         (3700 <= teff) & (teff < 5200)],
+        ["O", "B", "A", "F", "G", "K"],
+        default="M"
+    )
+
+def get_star_classification_vec(star_class, luminosity_class):
+    """Vectorized get_star_classification, returns (StarClass, Sub_Class, Sys_Icons) arrays."""
+    star_class = np.asarray(star_class, dtype=object)
+    luminosity_class = np.asarray(luminosity_class, dtype=object)
+    sub_class = np.select([luminosity_class == "I", luminosity_class == "V"], ["giant", "dwarf"], default="normal")
+    first_sprites = {}
+    for entry in star_image_key:
+        first_sprites.setdefault((entry["class"], entry["type"]), entry["sprites"][0])
+    icons = np.array([first_sprites.get((c, s), f"star/{c}0") for c, s in zip(star_class, sub_class)], dtype=object)
+    return star_class, sub_class, icons
 
-        except Exception as e:
-            print(f"Error processing RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}: {e}")
-            continue
+def calculate_remaining_mass_earth_vec(mass):
+    """Vectorized calculate_remaining_mass_earth."""
+    mass = np.asarray(mass, dtype=float)
+    EARTH_MASS_KG = 5.972e24
+    STAR_MASS_FRACTION = 0.9986
+    remaining = np.maximum(0.0, (mass / STAR_MASS_FRACTION - mass) / EARTH_MASS_KG)
+    return np.where(np.isnan(mass), 0.0, remaining)
 
-print("Processing complete.")
-print(f"Endless Sky stars saved to {endless_sky_csv}")
-print(f"Stars with no SIMBAD name match saved to {endless_sky_no_simbad_csv}")
\ No newline at end of file
+def calculate_relative_force_vec(mass, distance_pc):
+    """Vectorized calculate_relative_force."""
+    mass = np.asarray(mass, dtype=float)
+    distance_pc = np.asarray(distance_pc, dtype=float)
+    G = 6.674e-11
+    M_earth = 5.972e24
+    pc_to_m = 3.0857e16
+    distance_m = distance_pc * pc_to_m
+    force = G * mass * M_earth / _pow(distance_m, 2)
+    min_mass = 0.1 * 1.989e30
+    max_distance_m = 100000 * pc_to_m
+    min_force = G * min_mass * M_earth / (max_distance_m ** 2)
+    return force / min_force
+
+
+PARSEC_TO_LY = 3.26
+
+
+def add_derived_columns_rowwise(milkyway_stars):
+    """Original row-wise derivation chain, kept as the reference for the vectorized one."""
+    coords = milkyway_stars.apply(calculate_3d_coordinates, axis=1, result_type='expand')
+    milkyway_stars[['x_Coord', 'y_Coord', 'z_Coord']] = coords
+
+    # Calculate Base64 cube coordinates (1-light-year cubes)
+    milkyway_stars['cube_x'] = ((milkyway_stars['x_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['cube_y'] = ((milkyway_stars['y_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['cube_z'] = ((milkyway_stars['z_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['base64_Cube'] = milkyway_stars.apply(
+        lambda row: encode_cube(row['cube_x'], row['cube_y'], row['cube_z']),
+        axis=1
+    )
+
+    # Calculate Base64 2D grid coordinates (1-light-year grids)
+    milkyway_stars['flat_x'] = milkyway_stars['x_Coord']
+    milkyway_stars['flat_y'] = milkyway_stars['y_Coord'] + (milkyway_stars['z_Coord'] / 100)
+    milkyway_stars['grid_x'] = ((milkyway_stars['flat_x'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['grid_y'] = ((milkyway_stars['flat_y'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['base64_2D'] = milkyway_stars.apply(
+        lambda row: encode_2d(row['grid_x'], row['grid_y']),
+        axis=1
+    )
+
+    milkyway_stars['quadrant'] = milkyway_stars.apply(determine_quadrant, axis=1)
+
+    milkyway_stars['abs_g_mag'] = milkyway_stars.apply(
+        lambda row: calculate_absolute_magnitude(row['phot_g_mean_mag'], row['parallax']), axis=1)
+
+    milkyway_stars['B_V'] = milkyway_stars['bp_rp'].apply(approximate_bv)
+
+    milkyway_stars['mass'] = milkyway_stars.apply(
+        lambda row: estimate_mass(row['bp_rp'], row['teff_gspphot'], row['abs_g_mag']), axis=1)
+    milkyway_stars['gravitational_force'] = milkyway_stars.apply(
+        lambda row: calculate_relative_force(row['mass'], row['Computed_Distance_Parsec']), axis=1)
+
+    milkyway_stars['star_class'] = milkyway_stars['teff_gspphot'].apply(classify_star)
+    milkyway_stars['luminosity_class'] = milkyway_stars['abs_g_mag'].apply(determine_luminosity_class)
+
+    milkyway_stars[['StarClass', 'Sub_Class', 'Sys_Icons']] = milkyway_stars.apply(
+        lambda row: pd.Series(get_star_classification(row['star_class'], row['luminosity_class'])), axis=1)
+
+    milkyway_stars['Remaining_Mass_Earth'] = milkyway_stars['mass'].apply(calculate_remaining_mass_earth)
+
+    milkyway_stars['planet_types'] = milkyway_stars.apply(
+        lambda row: assign_planet_types(row['StarClass'], row['Computed_Distance_Parsec']), axis=1)
+    milkyway_stars['age_gyr'] = milkyway_stars['teff_gspphot'].apply(estimate_age)
+    milkyway_stars['game_x'] = milkyway_stars['flat_x'] / 1000
+    milkyway_stars['game_y'] = milkyway_stars['flat_y'] / 1000
+    milkyway_stars['game_z'] = milkyway_stars['z_Coord'] / 1000
+    milkyway_stars['estimate_lum'] = milkyway_stars.apply(
+        lambda row: estimate_luminosity(row['abs_g_mag'], row['teff_gspphot']), axis=1)
+    return milkyway_stars
+
+def add_derived_columns(milkyway_stars):
+    """Columnar derivation chain, same columns and values as add_derived_columns_rowwise."""
+    x, y, z = calculate_3d_coordinates_vec(milkyway_stars['ra'], milkyway_stars['dec'], milkyway_stars['parallax'])
+    milkyway_stars['x_Coord'] = x
+    milkyway_stars['y_Coord'] = y
+    milkyway_stars['z_Coord'] = z
+
+    # Calculate Base64 cube coordinates (1-light-year cubes)
+    milkyway_stars['cube_x'] = ((milkyway_stars['x_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['cube_y'] = ((milkyway_stars['y_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['cube_z'] = ((milkyway_stars['z_Coord'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['base64_Cube'] = encode_cube_array(
+        milkyway_stars['cube_x'], milkyway_stars['cube_y'], milkyway_stars['cube_z'])
+
+    # Calculate Base64 2D grid coordinates (1-light-year grids)
+    milkyway_stars['flat_x'] = milkyway_stars['x_Coord']
+    milkyway_stars['flat_y'] = milkyway_stars['y_Coord'] + (milkyway_stars['z_Coord'] / 100)
+    milkyway_stars['grid_x'] = ((milkyway_stars['flat_x'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['grid_y'] = ((milkyway_stars['flat_y'] * PARSEC_TO_LY) / 1).astype(int) + 75000
+    milkyway_stars['base64_2D'] = encode_2d_array(milkyway_stars['grid_x'], milkyway_stars['grid_y'])
+
+    milkyway_stars['quadrant'] = determine_quadrant_vec(
+        milkyway_stars['l'] if 'l' in milkyway_stars.columns else None)
+
+    milkyway_stars['abs_g_mag'] = calculate_absolute_magnitude_vec(
+        milkyway_stars['phot_g_mean_mag'], milkyway_stars['parallax'])
+
+    milkyway_stars['B_V'] = approximate_bv_vec(milkyway_stars['bp_rp'])
+
+    milkyway_stars['mass'] = estimate_mass_vec(
+        milkyway_stars['bp_rp'], milkyway_stars['teff_gspphot'], milkyway_stars['abs_g_mag'])
+    milkyway_stars['gravitational_force'] = calculate_relative_force_vec(
+        milkyway_stars['mass'], milkyway_stars['Computed_Distance_Parsec'])
+
+    milkyway_stars['star_class'] = classify_star_vec(milkyway_stars['teff_gspphot'])
+    milkyway_stars['luminosity_class'] = determine_luminosity_class_vec(milkyway_stars['abs_g_mag'])
+
+    star_class, sub_class, icons = get_star_classification_vec(
+        milkyway_stars['star_class'], milkyway_stars['luminosity_class'])
+    milkyway_stars['StarClass'] = star_class
+    milkyway_stars['Sub_Class'] = sub_class
+    milkyway_stars['Sys_Icons'] = icons
+
+    milkyway_stars['Remaining_Mass_Earth'] = calculate_remaining_mass_earth_vec(milkyway_stars['mass'])
+
+    milkyway_stars['planet_types'] = assign_planet_types_vec(
+        milkyway_stars['StarClass'], milkyway_stars['Computed_Distance_Parsec'])
+    milkyway_stars['age_gyr'] = estimate_age_vec(milkyway_stars['teff_gspphot'])
+    milkyway_stars['game_x'] = milkyway_stars['flat_x'] / 1000
+    milkyway_stars['game_y'] = milkyway_stars['flat_y'] / 1000
+    milkyway_stars['game_z'] = milkyway_stars['z_Coord'] / 1000
+    milkyway_stars['estimate_lum'] = estimate_luminosity_vec(
+        milkyway_stars['abs_g_mag'], milkyway_stars['teff_gspphot'])
+    return milkyway_stars
+
+class ServiceLimiter:
+    """Bounds concurrent calls to one remote service, spaces out their start times and retries with backoff."""
+
+    def __init__(self, name, max_concurrent, min_interval=0.0, max_retries=3, retry_delay=1.0):
+        self.name = name
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the service's concurrency slots, waiting for the rate limit first."""
+        with self.semaphore:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._next_start - now
+                self._next_start = max(now, self._next_start) + self.min_interval
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+    def call(self, func, *args, **kwargs):
+        """Run func inside a slot, retrying failures with exponential backoff."""
+        retry_delay = self.retry_delay
+        for attempt in range(self.max_retries):
+            try:
+                with self.slot():
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                logger.warning(f"{self.name} attempt {attempt + 1} failed: {e}. Retrying in {retry_delay}s...")
+                time.sleep(retry_delay)
+                retry_delay *= 2
+
+
+gaia_limiter = ServiceLimiter("Gaia", gaia_max_concurrent, gaia_min_interval)
+simbad_limiter = ServiceLimiter("SIMBAD", simbad_max_concurrent, simbad_min_interval)
+
+
+Tile = namedtuple('Tile', ['index', 'ra_start', 'ra_end', 'dec_start', 'dec_end'])
+
+
+def iter_tiles(ra_step=1, dec_step=1):
+    """Yield the full-sky Tiles, numbered in the order they are yielded.
+
+    With adaptive_tiling the sky is cut into Dec bands of base_tile_deg. Each band
+    is split into RA tiles of roughly equal area, so sparse tiles near the poles
+    are merged and dense ones are later split by fetch_gaia_tile. Without it this
+    is the fixed RA-major grid of ra_step x dec_step tiles.
+    """
+    index = 0
+    if not adaptive_tiling:
+        for ra_start in range(0, 360, ra_step):
+            for dec_start in range(-90, 90, dec_step):
+                yield Tile(index, ra_start, ra_start + ra_step, dec_start, dec_start + dec_step)
+                index += 1
+        return
+
+    for dec_start in range(-90, 90, base_tile_deg):
+        dec_end = min(dec_start + base_tile_deg, 90)
+        band_width = math.cos(math.radians((dec_start + dec_end) / 2))
+        n_ra = max(1, round(360 * band_width / base_tile_deg))
+        for k in range(n_ra):
+            ra_end = 360 if k == n_ra - 1 else 360 * (k + 1) / n_ra
+            yield Tile(index, 360 * k / n_ra, ra_end, dec_start, dec_end)
+            index += 1
+
+def query_gaia_tile(ra_start, ra_end, dec_start, dec_end):
+    """Query Gaia DR3 for one RA/Dec box.
+
+    Bounds are half-open, [start, end), so a star on a shared edge belongs to
+    exactly one tile. The box touching the north pole keeps dec = 90 inclusive.
+    """
+    dec_end_op = '<=' if dec_end >= 90 else '<'
+    query = f"""
+    SELECT TOP {batch_size} 
+        gs.source_id, gs.ra, gs.dec, gs.parallax, 
+        gs.phot_g_mean_mag, gs.phot_bp_mean_mag, gs.phot_rp_mean_mag, 
+        gs.bp_rp, gs.bp_g, gs.g_rp, gs.radial_velocity, 
+        gs.l, gs.b, gs.ecl_lon, gs.ecl_lat,
+        ap.teff_gspphot, ap.radius_gspphot
+    FROM gaiadr3.gaia_source AS gs
+    LEFT JOIN gaiadr3.astrophysical_parameters AS ap ON gs.source_id = ap.source_id
+    WHERE gs.parallax > 0.01
+    AND gs.ra >= {ra_start} AND gs.ra < {ra_end}
+    AND gs.dec >= {dec_start} AND gs.dec {dec_end_op} {dec_end}
+    AND gs.ra IS NOT NULL AND gs.dec IS NOT NULL
+    AND gs.phot_g_mean_mag IS NOT NULL
+    AND gs.phot_bp_mean_mag IS NOT NULL
+    AND gs.phot_rp_mean_mag IS NOT NULL
+    AND ap.teff_gspphot IS NOT NULL
+    AND gs.l IS NOT NULL
+    """
+    job = Gaia.launch_job(query)
+    result = job.get_results()
+    return result.to_pandas()
+
+def fetch_gaia_tile(ra_start, ra_end, dec_start, dec_end):
+    """Fetch one tile, recursively splitting it into quadrants while a query hits the TOP limit."""
+    df = gaia_limiter.call(query_gaia_tile, ra_start, ra_end, dec_start, dec_end)
+    if not adaptive_tiling or len(df) < batch_size:
+        return df
+
+    ra_mid = (ra_start + ra_end) / 2
+    dec_mid = (dec_start + dec_end) / 2
+    if min(ra_mid - ra_start, dec_mid - dec_start) < min_tile_deg:
+        logger.warning(f"RA {ra_start}-{ra_end}, Dec {dec_start}-{dec_end} still returns {batch_size} rows "
+                       f"at the minimum tile size, some stars may be missing")
+        return df
+
+    logger.info(f"RA {ra_start}-{ra_end}, Dec {dec_start}-{dec_end} hit TOP {batch_size}, splitting into quadrants")
+    parts = [
+        fetch_gaia_tile(ra_lo, ra_hi, dec_lo, dec_hi)
+        for dec_lo, dec_hi in ((dec_start, dec_mid), (dec_mid, dec_end))
+        for ra_lo, ra_hi in ((ra_start, ra_mid), (ra_mid, ra_end))
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+def process_tile(tile, simbad_cache=None):
+    """Fetch one tile and build its output rows; returns None when the tile has no usable stars."""
+    _, ra_start, ra_end, dec_start, dec_end = tile
+    print(f"Querying Gaia DR3 for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}...")
+    df = fetch_gaia_tile(ra_start, ra_end, dec_start, dec_end)
+
+    if df.empty:
+        print(f"No data returned for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}, skipping...")
+        return None
+
+    print(f"Processing {len(df)} stars for RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}...")
+
+    parallax = df['parallax'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['Computed_Distance_Parsec'] = np.where(parallax > 0, 1000 / parallax, float('inf'))
+
+    milkyway_stars = df[df['Computed_Distance_Parsec'] <= 100000].copy()
+    if milkyway_stars.empty:
+        return None
+
+    milkyway_stars = add_derived_columns(milkyway_stars)
+
+    # Assign trade values
+    trade_goods = {
+        "Clothing": (250, 255),
+        "Electronics": (600, 605),
+        "Equipment": (361, 366),
+        "Food": (100, 105),
+        "Heavy Metals": (800, 805),
+        "Luxury Goods": (900, 905),
+        "Industrial": (650, 655),
+        "Medical": (500, 505),
+        "Metal": (200, 205),
+        "Plastic": (300, 305)
+    }
+    trade_data = [
+        {good: random.uniform(min_val, max_val) for good, (min_val, max_val) in trade_goods.items()}
+        for _ in range(len(milkyway_stars))
+    ]
+    for good in trade_goods:
+        milkyway_stars[good] = [data[good] for data in trade_data]
+
+    # Flag potential binary systems (cubes with exactly 2 stars)
+    cube_counts = milkyway_stars['base64_Cube'].value_counts()
+    milkyway_stars['binary_candidate'] = milkyway_stars['base64_Cube'].map(cube_counts == 2)
+
+    grid_index = str(tile.index).zfill(4)
+    milkyway_stars['counter'] = [str(i).zfill(4) for i in range(len(milkyway_stars))]
+    milkyway_stars['Name_two'] = (
+        'S' + milkyway_stars['quadrant'] + grid_index + '-' + milkyway_stars['counter']
+    )
+
+    # Calculate 2D and 3D sectors (16,300-light-year cubes)
+    min_game_x = milkyway_stars['game_x'].min()
+    min_game_y = milkyway_stars['game_y'].min()
+    min_game_z = milkyway_stars['game_z'].min()
+    milkyway_stars['game_x_adj'] = milkyway_stars['game_x'] - min_game_x
+    milkyway_stars['game_y_adj'] = milkyway_stars['game_y'] - min_game_y
+    milkyway_stars['game_z_adj'] = milkyway_stars['game_z'] - min_game_z
+    milkyway_stars['sector_x'] = (milkyway_stars['game_x_adj'] / 5).astype(int)
+    milkyway_stars['sector_y'] = (milkyway_stars['game_y_adj'] / 5).astype(int)
+    milkyway_stars['sector_z'] = (milkyway_stars['game_z_adj'] / 5).astype(int)
+    sector_2d = milkyway_stars['sector_x'] * 20 + milkyway_stars['sector_y']
+    sector_3d = milkyway_stars['sector_z'] * 400 + sector_2d
+    milkyway_stars['2D_sector'] = 'S' + milkyway_stars['quadrant'] + sector_2d.astype(str).str.zfill(2)
+    milkyway_stars['3D_sector'] = 'S' + milkyway_stars['quadrant'] + sector_3d.astype(str).str.zfill(3)
+    milkyway_stars = milkyway_stars.drop(columns=['cube_x', 'cube_y', 'cube_z', 'grid_x', 'grid_y', 'game_x_adj', 'game_y_adj', 'game_z_adj', 'sector_x', 'sector_y', 'sector_z'])
+
+    default_names = milkyway_stars.set_index('source_id')['Name_two'].to_dict()
+    simbad_names = resolve_simbad_names(milkyway_stars, default_names, cache=simbad_cache)
+    milkyway_stars['simbad_names'] = milkyway_stars['source_id'].map(simbad_names)
+
+    return milkyway_stars.drop(columns=['star_class', 'luminosity_class'])
+
+def output_offsets():
+    """Byte offsets at which the next tile's rows start in both output CSVs."""
+    if not append_mode:
+        return 0, 0
+    return tuple(os.path.getsize(path) if os.path.exists(path) else 0
+                 for path in (endless_sky_csv, endless_sky_no_simbad_csv))
+
+def write_tile(milkyway_stars, tile=None):
+    """Append one tile's rows to the output CSVs; only ever called from the writer thread.
+
+    With write_parquet the rows also go to the partitioned Parquet dataset, in
+    files named after the tile so a redone tile replaces its earlier files.
+    A failed write is rolled back, so no partial tile is left in either CSV.
+
+    Returns (checksum, csv_end, no_simbad_end) for the manifest, or None when the write failed.
+    """
+    global append_mode
+    mode = 'ab' if append_mode else 'wb'
+    header = not append_mode
+    csv_start, no_simbad_start = output_offsets()
+    try:
+        data = milkyway_stars.to_csv(header=header, index=False, lineterminator=os.linesep).encode('utf-8')
+        with open(endless_sky_csv, mode) as f:
+            f.write(data)
+            csv_end = f.tell()
+        print(f"Appended {len(milkyway_stars)} stars to {endless_sky_csv}")
+
+        no_simbad_matches = milkyway_stars[milkyway_stars['Name_two'] != milkyway_stars['simbad_names']]
+        with open(endless_sky_no_simbad_csv, mode) as f:
+            f.write(no_simbad_matches.to_csv(header=header, index=False, lineterminator=os.linesep).encode('utf-8'))
+            no_simbad_end = f.tell()
+        print(f"Appended {len(no_simbad_matches)} stars with no SIMBAD name match to {endless_sky_no_simbad_csv}")
+
+        if write_parquet:
+            tile_name = f"tile-{tile.index:05d}" if tile is not None else f"rows-{time.time_ns()}"
+            # csv_start + i increases along the CSV, as every row takes at least one byte
+            write_catalogue_parquet(milkyway_stars, parquet_output_dir, tile_name + "-{i}.parquet",
+                                    row_order=csv_start + np.arange(len(milkyway_stars)))
+    except Exception as e:
+        print(f"Error writing to {endless_sky_csv} or {endless_sky_no_simbad_csv}: {e}")
+        truncate_output(endless_sky_csv, csv_start)
+        truncate_output(endless_sky_no_simbad_csv, no_simbad_start)
+        return None
+    append_mode = True
+    return hashlib.sha256(data).hexdigest(), csv_end, no_simbad_end
+
+class TileManifest:
+    """SQLite record of every tile's outcome, used to resume an interrupted full-sky pass.
+
+    Each tile is keyed by its RA/Dec bounds and stores its status ('running',
+    'writing', 'done', 'empty' or 'failed'), row count, a SHA-256 of the rows it
+    wrote, start/finish times and the byte range it wrote in both output CSVs.
+    Tile ids only mean the same sky under the same tiling, so the tiling
+    parameters are stored alongside and checked before resuming.
+    """
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tiles (
+                tile_id TEXT PRIMARY KEY,
+                ra_start REAL, ra_end REAL, dec_start REAL, dec_end REAL,
+                status TEXT NOT NULL,
+                row_count INTEGER,
+                checksum TEXT,
+                started_at REAL,
+                finished_at REAL,
+                csv_end INTEGER,
+                no_simbad_end INTEGER,
+                error TEXT
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tiles)")}
+        for column in ('csv_start', 'no_simbad_start'):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE tiles ADD COLUMN {column} INTEGER")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS params (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    def check_params(self, params):
+        """Record the tiling parameters, or raise ValueError if the manifest was written under others."""
+        with self.lock:
+            stored = dict(self.conn.execute("SELECT key, value FROM params").fetchall())
+            has_tiles = self.conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0] > 0
+        current = {key: json.dumps(value) for key, value in params.items()}
+        if stored == current:
+            return
+        if stored or has_tiles:
+            changed = sorted(key for key in stored.keys() | current.keys() if stored.get(key) != current.get(key))
+            raise ValueError(f"Tile manifest was written with other tiling parameters ({', '.join(changed)}); "
+                             f"restore them or set resume = False to start over")
+        with self.lock:
+            self.conn.executemany("INSERT INTO params VALUES (?, ?)", list(current.items()))
+            self.conn.commit()
+
+    @staticmethod
+    def tile_id(tile):
+        _, ra_start, ra_end, dec_start, dec_end = tile
+        return f"{ra_start:.6f}:{ra_end:.6f}:{dec_start:.6f}:{dec_end:.6f}"
+
+    def _upsert(self, tile, **fields):
+        _, ra_start, ra_end, dec_start, dec_end = tile
+        row = {'tile_id': self.tile_id(tile), 'ra_start': ra_start, 'ra_end': ra_end,
+               'dec_start': dec_start, 'dec_end': dec_end, **fields}
+        columns = ', '.join(row)
+        updates = ', '.join(f"{c} = excluded.{c}" for c in fields)
+        with self.lock:
+            self.conn.execute(
+                f"INSERT INTO tiles ({columns}) VALUES ({', '.join('?' * len(row))}) "
+                f"ON CONFLICT(tile_id) DO UPDATE SET {updates}",
+                list(row.values())
+            )
+            self.conn.commit()
+
+    def start(self, tile):
+        self._upsert(tile, status='running', started_at=time.time(), error=None)
+
+    def begin_write(self, tile, csv_start, no_simbad_start):
+        self._upsert(tile, status='writing', csv_start=csv_start, no_simbad_start=no_simbad_start)
+
+    def finish(self, tile, status, row_count=0, checksum=None, csv_end=None, no_simbad_end=None):
+        self._upsert(tile, status=status, row_count=row_count, checksum=checksum, finished_at=time.time(),
+                     csv_end=csv_end, no_simbad_end=no_simbad_end)
+
+    def fail(self, tile, error):
+        self._upsert(tile, status='failed', finished_at=time.time(), error=str(error))
+
+    def completed(self):
+        """Tile ids that finished ('done' or 'empty') and need no rerun."""
+        with self.lock:
+            rows = self.conn.execute("SELECT tile_id FROM tiles WHERE status IN ('done', 'empty')").fetchall()
+        return {tile_id for tile_id, in rows}
+
+    def checkpoint(self):
+        """Byte lengths of both output CSVs covered by an unbroken run of written tiles.
+
+        'done' tiles are followed from offset 0 while each starts where the last
+        one ended. Any 'done' tile past a gap is marked failed so it is redone
+        rather than left behind rows that are about to be cut.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT tile_id, csv_start, csv_end, no_simbad_start, no_simbad_end FROM tiles "
+                "WHERE status = 'done' ORDER BY csv_start"
+            ).fetchall()
+        csv_end = no_simbad_end = 0
+        for i, (_, csv_start, end, no_simbad_start, ns_end) in enumerate(rows):
+            if (csv_start, no_simbad_start) != (csv_end, no_simbad_end):
+                stranded = [tile_id for tile_id, *_ in rows[i:]]
+                with self.lock:
+                    self.conn.executemany(
+                        "UPDATE tiles SET status = 'failed', error = 'rows after a gap in the output' "
+                        "WHERE tile_id = ?", [(tile_id,) for tile_id in stranded])
+                    self.conn.commit()
+                break
+            csv_end, no_simbad_end = end, ns_end
+        return csv_end, no_simbad_end
+
+    def wrote_from(self, csv_start, no_simbad_start):
+        """True when some tile's write began at these offsets, i.e. the bytes past them are a known tile's."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM tiles WHERE csv_start = ? AND no_simbad_start = ? LIMIT 1",
+                [csv_start, no_simbad_start]
+            ).fetchone()
+        return row is not None
+
+    def summary(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM tiles GROUP BY status").fetchall())
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM tiles")
+            self.conn.execute("DELETE FROM params")
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def tiling_params():
+    """Settings that decide the tile bounds, and so the manifest's tile ids."""
+    return {'adaptive_tiling': adaptive_tiling, 'base_tile_deg': base_tile_deg, 'min_tile_deg': min_tile_deg,
+            'batch_size': batch_size}
+
+def tile_in_region(tile, region):
+    """True when the tile overlaps region = (ra_min, ra_max, dec_min, dec_max), or region is None."""
+    if region is None:
+        return True
+    _, ra_start, ra_end, dec_start, dec_end = tile
+    ra_min, ra_max, dec_min, dec_max = region
+    return ra_start < ra_max and ra_end > ra_min and dec_start < dec_max and dec_end > dec_min
+
+def truncate_output(path, length):
+    """Cut a CSV back to length bytes, dropping rows from a tile that never made it into the manifest."""
+    if os.path.exists(path) and os.path.getsize(path) > length:
+        with open(path, 'r+b') as f:
+            f.truncate(length)
+
+def run_tiles(tiles, process, write, workers=tile_workers, on_error=None):
+    """Run process(tile) on a thread pool, keeping at most 2 * workers tiles in flight.
+
+    Finished tiles are handed to write(tile, result) from the calling thread in
+    tile order, so the output files see exactly one writer. A tile whose
+    processing raises is reported, passed to on_error(tile, exc) and skipped.
+    """
+    pending = deque()
+    tiles = iter(tiles)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < 2 * workers:
+                tile = next(tiles, None)
+                if tile is None:
+                    break
+                pending.append((tile, executor.submit(process, tile)))
+            if not pending:
+                break
+            tile, future = pending.popleft()
+            _, ra_start, ra_end, dec_start, dec_end = tile
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error processing RA range {ra_start} to {ra_end}, Dec range {dec_start} to {dec_end}: {e}")
+                if on_error is not None:
+                    on_error(tile, e)
+                continue
+            write(tile, result)
+
+def main():
+    global append_mode
+
+    # Create the output directory if it doesn't exist
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+    except PermissionError as e:
+        raise PermissionError(f"Cannot create directory at {output_dir}. Check write permissions: {e}")
+
+    simbad_cache = SimbadNameCache(simbad_cache_path, ttl_days=simbad_cache_ttl_days)
+    manifest = TileManifest(tile_manifest_path)
+
+    completed = set()
+    if resume and os.path.exists(endless_sky_csv):
+        manifest.check_params(tiling_params())
+        csv_end, no_simbad_end = manifest.checkpoint()
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0
+                 for path in (endless_sky_csv, endless_sky_no_simbad_csv)]
+        unrecorded = sizes[0] > csv_end or sizes[1] > no_simbad_end
+        if unrecorded and not manifest.wrote_from(csv_end, no_simbad_end) and not truncate_outputs:
+            raise RuntimeError(f"{endless_sky_csv} has rows the tile manifest has no record of; set "
+                               f"truncate_outputs = True to discard them or resume = False to start over")
+        truncate_output(endless_sky_csv, csv_end)
+        truncate_output(endless_sky_no_simbad_csv, no_simbad_end)
+        completed = manifest.completed()
+        append_mode = csv_end > 0
+        print(f"Resuming: {len(completed)} tiles already complete, manifest status {manifest.summary()}")
+    else:
+        manifest.clear()
+        manifest.check_params(tiling_params())
+
+    tiles = [
+        tile for tile in iter_tiles()
+        if tile_in_region(tile, sky_region) and TileManifest.tile_id(tile) not in completed
+    ]
+
+    def process(tile):
+        manifest.start(tile)
+        return process_tile(tile, simbad_cache)
+
+    def write(tile, milkyway_stars):
+        if milkyway_stars is None:
+            manifest.finish(tile, 'empty')
+            return
+        manifest.begin_write(tile, *output_offsets())
+        written = write_tile(milkyway_stars, tile)
+        if written is None:
+            manifest.fail(tile, "write failed")
+            return
+        checksum, csv_end, no_simbad_end = written
+        manifest.finish(tile, 'done', len(milkyway_stars), checksum, csv_end, no_simbad_end)
+
+    run_tiles(tiles, process, write, workers=tile_workers, on_error=manifest.fail)
+
+    print(f"Tile manifest status: {manifest.summary()}")
+    manifest.close()
+    simbad_cache.close()
+    print("Processing complete.")
+    print(f"Endless Sky stars saved to {endless_sky_csv}")
+    print(f"Stars with no SIMBAD name match saved to {endless_sky_no_simbad_csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
 import pandas as pd
 import numpy as np
 from collections import Counter
-import base64
+import heapq
 import logging
+import os
+import tempfile
+from gaia_codec import encode_2d, decode_2d, encode_2d_array, grid_key
+from gaia_io import read_catalogue, iter_catalogue, scan_csv_dtypes, is_parquet
 
 # Set up logging
 logging.basicConfig(
@@ -15,27 +19,20 @@ logging.basicConfig(
 )
 
 logger = logging.getLogger(__name__)
-i = 0
 
 
 # === You must define this ===
 PARSEC_TO_LY = 3.26156
 
-# === Encode/Decode base64_2D ===
-def encode_2d(x: int, y: int) -> str:
-    x = int(x)
-    y = int(y)
-    val = (x << 64) + y
-    b = val.to_bytes(16, byteorder='big')
-    return base64.b64encode(b).decode('ascii').rstrip('=')
+# Offsets of the 3x3 neighbourhood in grid_key space
+NEIGHBOR_OFFSETS = [int(grid_key(dx, 0)) + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
 
-
-def decode_2d(b64: str) -> tuple[int, int]:
-    b64 += '=' * ((4 - len(b64) % 4) % 4)  # Pad to multiple of 4
-    val = int.from_bytes(base64.b64decode(b64), byteorder='big')
-    x = (val >> 64) & ((1 << 64) - 1)
-    y = val & ((1 << 64) - 1)
-    return x, y
+# === Streaming mode ===
+# Thin the catalogue strip by strip instead of loading it whole; memory is bounded by
+# the two largest adjacent grid_x strips rather than the catalogue size
+stream = False
+STRIP_WIDTH = 1000  # grid_x columns (light years) per strip
+CHUNK_ROWS = 200000  # rows per read of the input
 
 
 def get_neighbor_keys(base64_key: str) -> list[str]:
@@ -47,53 +44,251 @@ def get_neighbor_keys(base64_key: str) -> list[str]:
             neighbors.append(encode_2d(nx, ny))
     return neighbors
 
-# === Load Data ===
-df = pd.read_csv("GAIA_Plus.csv")
-logger.info(f"CSV imported to Dataframe")
-# === Compute base64_2D if not already present ===
-df['flat_x'] = df['x_Coord']
-df['flat_y'] = df['y_Coord'] + (df['z_Coord'] / 100)
-df['grid_x'] = ((df['flat_x'] * PARSEC_TO_LY)).astype(int) + 75000
-df['grid_y'] = ((df['flat_y'] * PARSEC_TO_LY)).astype(int) + 75000
-df['base64_2D'] = df.apply(lambda row: encode_2d(row['grid_x'], row['grid_y']), axis=1)
-
-# === Local Rarity Algorithm ===
-unique_stars = []
-
-for cube_key in df['base64_2D'].unique():
-    neighbor_keys = get_neighbor_keys(cube_key)
-    neighbor_df = df[df['base64_2D'].isin(neighbor_keys)].copy()
-    i += 1
-    if i % 100 == 0:
-        logger.info(f"Processed {i} cubes")
-    # Count StarClass/Sub_Class in neighborhood
-    neighbor_counts = Counter(
-        neighbor_df['StarClass'].astype(str) + "/" + neighbor_df['Sub_Class'].astype(str)
-    )
 
-    # Current cube's stars
-    local_df = df[df['base64_2D'] == cube_key].copy()
-    local_df['class_combo'] = local_df['StarClass'].astype(str) + "/" + local_df['Sub_Class'].astype(str)
-    local_df['rarity_score'] = local_df['class_combo'].map(
-        lambda c: 1 / (neighbor_counts[c] if neighbor_counts[c] else 1)
+def add_grid_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Compute flat/grid coordinates and base64_2D from the 3D coordinates."""
+    df['flat_x'] = df['x_Coord']
+    df['flat_y'] = df['y_Coord'] + (df['z_Coord'] / 100)
+    df['grid_x'] = ((df['flat_x'] * PARSEC_TO_LY)).astype(int) + 75000
+    df['grid_y'] = ((df['flat_y'] * PARSEC_TO_LY)).astype(int) + 75000
+    df['base64_2D'] = encode_2d_array(df['grid_x'], df['grid_y'])
+    return df
+
+
+def select_unique_stars_scan(df: pd.DataFrame) -> pd.DataFrame:
+    """Original per-cell scan, O(cells x N); kept as the reference for select_unique_stars."""
+    unique_stars = []
+    i = 0
+    for cube_key in df['base64_2D'].unique():
+        neighbor_keys = get_neighbor_keys(cube_key)
+        neighbor_df = df[df['base64_2D'].isin(neighbor_keys)].copy()
+        i += 1
+        if i % 100 == 0:
+            logger.info(f"Processed {i} cubes")
+        # Count StarClass/Sub_Class in neighborhood
+        neighbor_counts = Counter(
+            neighbor_df['StarClass'].astype(str) + "/" + neighbor_df['Sub_Class'].astype(str)
+        )
+
+        # Current cube's stars
+        local_df = df[df['base64_2D'] == cube_key].copy()
+        local_df['class_combo'] = local_df['StarClass'].astype(str) + "/" + local_df['Sub_Class'].astype(str)
+        local_df['rarity_score'] = local_df['class_combo'].map(
+            lambda c: 1 / (neighbor_counts[c] if neighbor_counts[c] else 1)
+        )
+
+        if not local_df.empty:
+            most_unique_star = local_df.sort_values('rarity_score', ascending=False).iloc[0]
+            unique_stars.append(most_unique_star)
+    return pd.DataFrame(unique_stars)
+
+
+def pick_rarest(cell_codes: np.ndarray, rarity: np.ndarray) -> np.ndarray:
+    """Row position of the star the scan keeps for each cell, in cell code order.
+
+    The scan takes the first row of a descending quicksort, which is not stable,
+    so ties are broken the way numpy's quicksort breaks them. Cells of equal size
+    are stacked into one matrix and argsorted row by row, which runs the same
+    sort per row as the scan did per cell.
+    """
+    order = np.argsort(cell_codes, kind='stable')
+    sizes = np.bincount(cell_codes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    best = np.empty(len(sizes), dtype=np.int64)
+    for n in np.unique(sizes):
+        cells = np.flatnonzero(sizes == n)
+        rows = order[starts[cells][:, None] + np.arange(n)]
+        # pandas sorts descending by reversing, sorting ascending and reversing again
+        last = np.argsort(rarity[rows[:, ::-1]], axis=1, kind='quicksort')[:, -1]
+        best[cells] = rows[np.arange(len(cells)), n - 1 - last]
+    return best
+
+
+def class_combo(df: pd.DataFrame) -> pd.Series:
+    return df['StarClass'].astype(str) + "/" + df['Sub_Class'].astype(str)
+
+
+def count_cell_combos(df: pd.DataFrame) -> pd.DataFrame:
+    """Number of stars per (cell, class combo), with cell as grid_key and a missing combo as ''."""
+    stars = pd.DataFrame({
+        'cell': grid_key(df['grid_x'].to_numpy(), df['grid_y'].to_numpy()),
+        'combo': class_combo(df).fillna('').to_numpy(dtype=object),
+    })
+    return stars.groupby(['cell', 'combo'], sort=False).size().rename('n').reset_index()
+
+
+def select_unique_stars(df: pd.DataFrame, halo_counts=()) -> pd.DataFrame:
+    """Pick the locally rarest star of every base64_2D cell in O(N).
+
+    (cell, StarClass/Sub_Class) pairs are counted once, each count is added to
+    the 9 cells of its 3x3 neighbourhood by shifting the integer grid key, and the
+    summed counts are joined back to the stars. rarity_score is 1 / neighbourhood
+    count; the star kept per cell and the cell order are the same as the scan's.
+    halo_counts are count_cell_combos tables of neighbouring stars outside df.
+    """
+    combo = class_combo(df)
+    stars = pd.DataFrame({
+        'cell': grid_key(df['grid_x'].to_numpy(), df['grid_y'].to_numpy()),
+        'combo': combo.fillna('').to_numpy(dtype=object),
+    })
+
+    cell_counts = pd.concat(
+        [stars.groupby(['cell', 'combo'], sort=False).size().rename('n').reset_index(), *halo_counts],
+        ignore_index=True
+    )
+    spread = pd.concat(
+        [cell_counts.assign(cell=cell_counts['cell'] + offset) for offset in NEIGHBOR_OFFSETS],
+        ignore_index=True
     )
+    neighborhood = spread.groupby(['cell', 'combo'], sort=False)['n'].sum()
+    counts = neighborhood.reindex(pd.MultiIndex.from_frame(stars[['cell', 'combo']])).to_numpy()
+    rarity = 1 / counts.astype(float)
+
+    best = pick_rarest(pd.factorize(stars['cell'])[0], rarity)
+    unique_df = df.iloc[best].copy()
+    unique_df['class_combo'] = combo.iloc[best].to_numpy()
+    unique_df['rarity_score'] = rarity[best]
+    return unique_df
+
+
+def check_rarity_parity(input_path="GAIA_Plus.csv", max_rows=20000):
+    """Run the scan and select_unique_stars on the start of a catalogue and compare their CSV output."""
+    df = add_grid_columns(read_catalogue(input_path).head(max_rows).reset_index(drop=True))
+    expected = select_unique_stars_scan(df).to_csv(index=False)
+    actual = select_unique_stars(df).to_csv(index=False)
+    if expected == actual:
+        logger.info(f"Rarity parity OK on {len(df)} stars")
+        return True
+    logger.error(f"Rarity parity FAILED on {len(df)} stars")
+    return False
+
+
+# === Streaming mode ===
+def spill_strips(input_path: str, tmp_dir: str, strip_width: int, chunksize: int):
+    """Split the catalogue into one CSV per grid_x strip, tagging each row with its input row number.
+
+    Returns the sorted strip ids and the dtypes to read the strip files back with.
+    """
+    # Read every chunk with the dtypes a whole-file read would infer, so values and
+    # their CSV text come out exactly as in the in-memory path
+    dtypes = None if is_parquet(input_path) else scan_csv_dtypes(input_path, chunksize)
+    strip_ids = set()
+    row = 0
+    for chunk in iter_catalogue(input_path, chunksize, dtype=dtypes):
+        chunk = add_grid_columns(chunk)
+        chunk['_row'] = np.arange(row, row + len(chunk))
+        row += len(chunk)
+        for strip_id, part in chunk.groupby(chunk['grid_x'] // strip_width, sort=False):
+            part.to_csv(os.path.join(tmp_dir, f"strip_{strip_id}.csv"), mode='a',
+                        header=strip_id not in strip_ids, index=False)
+            strip_ids.add(strip_id)
+        strip_dtypes = {
+            col: (dtype.categories.dtype if isinstance(dtype, pd.CategoricalDtype) else dtype)
+            for col, dtype in chunk.dtypes.items()
+        }
+        logger.info(f"Spilled {row} stars into {len(strip_ids)} strips")
+    return sorted(strip_ids), (strip_dtypes if row else None)
+
+
+def read_strip(tmp_dir: str, strip_id: int, dtypes: dict) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(tmp_dir, f"strip_{strip_id}.csv"), dtype=dtypes,
+                       float_precision='round_trip')
+
+
+def stream_unique_stars(input_path: str, output_path: str,
+                        strip_width: int = STRIP_WIDTH, chunksize: int = CHUNK_ROWS) -> int:
+    """Out-of-core select_unique_stars, writing the same CSV as the in-memory path.
+
+    The input is spilled into grid_x strips, then each strip is thinned with the
+    edge columns of its neighbours as halo counts, holding at most two strips at
+    once. Each strip's result is written as it is done, keyed by the input row
+    where the cell first appears, and the results are merged in that order.
+    Returns the number of stars written.
+    """
+    with tempfile.TemporaryDirectory(prefix="gaia_thin_") as tmp_dir:
+        strip_ids, dtypes = spill_strips(input_path, tmp_dir, strip_width, chunksize)
+        parts = []
+        columns = None
+        written = 0
+        prev_edge = None
+        nxt = None
+        for i, strip_id in enumerate(strip_ids):
+            cur = nxt if nxt is not None else read_strip(tmp_dir, strip_id, dtypes)
+            nxt = None
+            halo = []
+            if prev_edge is not None and strip_ids[i - 1] == strip_id - 1:
+                halo.append(prev_edge)
+            if i + 1 < len(strip_ids) and strip_ids[i + 1] == strip_id + 1:
+                nxt = read_strip(tmp_dir, strip_id + 1, dtypes)
+                halo.append(count_cell_combos(nxt[nxt['grid_x'] == (strip_id + 1) * strip_width]))
+
+            unique_df = select_unique_stars(cur, halo)
+            first_rows = cur.groupby('base64_2D', sort=False)['_row'].first().to_numpy()
+            unique_df = unique_df.drop(columns='_row')
+            columns = unique_df.columns
+            unique_df.insert(0, '_first', first_rows)
+            part_path = os.path.join(tmp_dir, f"thinned_{strip_id}.csv")
+            unique_df.to_csv(part_path, header=False, index=False)
+            parts.append(part_path)
+            written += len(unique_df)
+
+            prev_edge = count_cell_combos(cur[cur['grid_x'] == (strip_id + 1) * strip_width - 1])
+            os.remove(os.path.join(tmp_dir, f"strip_{strip_id}.csv"))
+            logger.info(f"Strip {strip_id}: {len(unique_df)} unique stars from {len(cur)} stars")
+
+        merge_thinned_parts(parts, columns, output_path)
+    return written
+
+
+def merge_thinned_parts(parts: list, columns, output_path: str) -> None:
+    """k-way merge of the per-strip results on their leading first-row key, which is dropped."""
+    def keyed_lines(path):
+        with open(path, newline='') as f:
+            for line in f:
+                key, rest = line.split(',', 1)
+                yield int(key), rest
+
+    files = [keyed_lines(path) for path in parts]
+    with open(output_path, 'w', newline='') as out:
+        out.write(pd.DataFrame(columns=columns).to_csv(index=False))
+        for _, rest in heapq.merge(*files):
+            out.write(rest)
+
+
+def main():
+    # === Load Data ===
+    # Either the stage 1 CSV or its partitioned Parquet directory (GAIA_Plus_parquet)
+    input_path = "GAIA_Plus.csv"
+    output_path = "C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus_Thined.csv"
+
+    if stream:
+        written = stream_unique_stars(input_path, output_path)
+        print(f"\n✅ Saved {written} unique stars to:\n{output_path}")
+        return
+
+    df = read_catalogue(input_path)
+    logger.info(f"CSV imported to Dataframe")
+    # === Compute base64_2D if not already present ===
+    df = add_grid_columns(df)
+
+    # === Local Rarity Algorithm ===
+    unique_df = select_unique_stars(df.reset_index(drop=True))
+    logger.info(f"Selected {len(unique_df)} unique stars from {len(df)} stars")
 
-    if not local_df.empty:
-        most_unique_star = local_df.sort_values('rarity_score', ascending=False).iloc[0]
-        unique_stars.append((cube_key, most_unique_star))
+    # === Display Result ===
+    print("\n=== Most Unique Star per base64_2D Cube (Local Rarity) ===\n")
+    for _, star in unique_df.head(20).iterrows():
+        print(f"Cube: {star['base64_2D']}")
+        print(star[['source_id', 'StarClass', 'Sub_Class', 'rarity_score']])
+        print("-" * 60)
+    if len(unique_df) > 20:
+        print(f"... and {len(unique_df) - 20} more cubes")
 
-# === Display Result ===
-print("\n=== Most Unique Star per base64_2D Cube (Local Rarity) ===\n")
-for cube, star in unique_stars:
-    print(f"Cube: {cube}")
-    print(star[['source_id', 'StarClass', 'Sub_Class', 'rarity_score']])
-    print("-" * 60)
+    # Save to CSV
+    unique_df.to_csv(output_path, index=False)
 
-# Build a DataFrame of just the unique stars
-unique_df = pd.DataFrame([star for _, star in unique_stars])
+    print(f"\n✅ Saved {len(unique_df)} unique stars to:\n{output_path}")
 
-# Save to CSV
-output_path = "C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus_Thined.csv"
-unique_df.to_csv(output_path, index=False)
 
-print(f"\n✅ Saved {len(unique_df)} unique stars to:\n{output_path}")
+if __name__ == '__main__':
+    main()
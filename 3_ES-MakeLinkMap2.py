@@ -3,11 +3,13 @@ import numpy as np
 import logging
 import os
 import math
-import networkx as nx
-import matplotlib.pyplot as plt
+import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import base64
-import matplotlib
+from gaia_codec import decode_2d_array, grid_key
+from gaia_io import read_catalogue
+from gaia_graph import LinkGraph
+from gaia_routing import route_index_for
 
 # Set Matplotlib's logger to a higher level!
 matplotlib_logger = logging.getLogger('matplotlib')
@@ -27,128 +29,961 @@ logger = logging.getLogger(__name__)
 i = 0
 
 
-def decode_2d(b64: str) -> tuple[int, int]:
-    b64 += '=' * ((4 - len(b64) % 4) % 4)
-    val = int.from_bytes(base64.b64decode(b64), byteorder='big')
-    x = (val >> 64) & ((1 << 64) - 1)
-    y = val & ((1 << 64) - 1)
-    return x, y
+LINK_MAP_COLUMNS = ['base64_2D', 'StarClass', 'Sub_Class', 'quadrant', 'gravitational_force', 'rarity_score']
 
-def create_gravity_well_map(input_path: str, output_path: str) -> None:
+# === Rendering ===
+# The gravity well PNG is optional; batch runs that only need the edge CSV skip
+# matplotlib entirely
+render_map = False
+RENDER_DPI = 100
+RENDER_MAX_POINTS = 200000  # systems drawn in the scatter; larger inputs are sampled down
+
+# === Gravity field ===
+GRAV_GRID_SIZE = (300, 20)  # (x, y) nodes of the interpolated gravity map
+# Grid units; None weights every star, a radius only the stars within it. An unlimited
+# kernel needs FFTs twice the grid size per axis, so set a radius for grids like 4096x4096.
+# Incremental updates also need a radius: with None every system affects the whole
+# field, so each update rebuilds the map in full
+GRAV_KERNEL_RADIUS = None
+IDW_EPSILON = 1e-10
+# Stars within IDW_NEAR_CELLS steps (of the coarser axis) of a node are weighted exactly
+# instead of through the FFT; IDW_PAIR_BATCH bounds the star/node pairs held at once
+IDW_NEAR_CELLS = 2
+IDW_PAIR_BATCH = 1 << 20
+CIC_CORNERS = ((0, 0), (1, 0), (0, 1), (1, 1))
+
+
+def _grid_step(grid: np.ndarray) -> float:
+    step = (grid[-1] - grid[0]) / (len(grid) - 1) if len(grid) > 1 else 0.0
+    return step if step > 0 else 1.0
+
+
+def _fft_length(n: int) -> int:
+    """Smallest 2**a * 3**b >= n, a size numpy's FFT handles quickly."""
+    best = 1 << max(n - 1, 0).bit_length()
+    power3 = 1
+    while power3 < best:
+        length = power3
+        while length < n:
+            length *= 2
+        best = min(best, length)
+        power3 *= 3
+    return best
+
+
+def _convolve_same(images: list, kernel: np.ndarray) -> list:
+    """Linear 2D convolution of each image with kernel via rfft2, cropped to the image shape.
+
+    The kernel dims are odd and centred; its transform is computed once for all images.
+    """
+    ky, kx = kernel.shape[0] // 2, kernel.shape[1] // 2
+    height, width = images[0].shape
+    shape = (_fft_length(height + kernel.shape[0] - 1), _fft_length(width + kernel.shape[1] - 1))
+    kernel_fft = np.fft.rfft2(kernel, shape)
+    return [
+        np.fft.irfft2(np.fft.rfft2(image, shape) * kernel_fft, shape)[ky:ky + height, kx:kx + width]
+        for image in images
+    ]
+
+
+def nearest_grid_index(values, grid: np.ndarray) -> np.ndarray:
+    """Index of the nearest grid node for each value, like np.abs(grid - v).argmin() per value.
+
+    grid is ascending; only the nodes either side of the searchsorted position can be
+    nearest, and a tie goes to the lower one as argmin's does (also among repeated
+    grid values, as in a linspace over a zero-width range).
+    """
+    values = np.asarray(values)
+    upper = np.clip(np.searchsorted(grid, values), 0, len(grid) - 1)
+    lower = np.maximum(upper - 1, 0)
+    take_lower = np.abs(grid[lower] - values) <= np.abs(grid[upper] - values)
+    return np.searchsorted(grid, grid[np.where(take_lower, lower, upper)], 'left')
+
+
+def _near_offsets(dx: float, dy: float, kx: int, ky: int):
+    """Node offsets from a star's cell whose weights gravity_field computes exactly:
+    the box of IDW_NEAR_CELLS steps (of the coarser axis) around the cell, within the kernel."""
+    reach = IDW_NEAR_CELLS * max(dx, dy)
+    nkx, nky = min(math.ceil(reach / dx), kx + 1), min(math.ceil(reach / dy), ky + 1)
+    ox, oy = np.meshgrid(np.arange(-nkx, nkx + 2), np.arange(-nky, nky + 2))
+    return ox.ravel(), oy.ravel()
+
+
+def gravity_field(x, y, grav_force, x_grid: np.ndarray, y_grid: np.ndarray, radius=None,
+                  window=None) -> np.ndarray:
+    """Inverse-distance weighted gravitational force on the (y_grid, x_grid) nodes.
+
+    Each node gets sum(w * g) / sum(w) over the stars, w = 1 / (distance + IDW_EPSILON).
+    Each star is spread over the four nodes of its cell (cloud in cell), so the
+    weighted sums over all stars become two convolutions of those grids with the
+    1 / distance kernel, done with FFTs in O(M log M) for M nodes. That is only
+    accurate where the kernel is smooth across a cell, so the weights of the
+    nodes near each star are computed exactly and the grid's version of them
+    taken back out, as particle-particle/particle-mesh codes do.
+    With a radius only stars within it count, and nodes with none are NaN. The
+    cut-off is exact within the IDW_NEAR_CELLS box of a star's cell; beyond it, it
+    is quantised to the grid like the rest of the kernel: the star's weight at a
+    node is the cloud-in-cell mix, over its cell's corners, of the cut-off kernel
+    from each corner to the node, so the edge of its reach is smeared over a cell.
+    window = (x0, x1, y0, y1) computes only the nodes [y0:y1, x0:x1] of the map,
+    from the stars within the kernel's reach of them.
+    """
+    nx, ny = len(x_grid), len(y_grid)
+    dx, dy = _grid_step(x_grid), _grid_step(y_grid)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    grav_force = np.asarray(grav_force, dtype=float)
+    # Each star's cell (its lower-left node) and position within it
+    fx = np.clip((x - x_grid[0]) / dx, 0, nx - 1)
+    fy = np.clip((y - y_grid[0]) / dy, 0, ny - 1)
+    cx = np.minimum(np.floor(fx), max(nx - 2, 0)).astype(np.int64)
+    cy = np.minimum(np.floor(fy), max(ny - 2, 0)).astype(np.int64)
+
+    kx, ky = nx - 1, ny - 1
+    if radius is not None:
+        kx, ky = min(kx, int(radius // dx)), min(ky, int(radius // dy))
+    x0, x1, y0, y1 = window if window is not None else (0, nx, 0, ny)
+    # Nodes of the window plus the kernel's reach and a cell around it, clipped to the grid
+    px0, px1, py0, py1 = max(x0 - kx - 1, 0), min(x1 + kx + 1, nx), max(y0 - ky - 1, 0), min(y1 + ky + 1, ny)
+    inside = (cx + 1 >= px0) & (cx < px1) & (cy + 1 >= py0) & (cy < py1)
+    x, y, grav_force, fx, fy, cx, cy = (a[inside] for a in (x, y, grav_force, fx, fy, cx, cy))
+    tx, ty = fx - cx, fy - cy
+    width, height = px1 - px0, py1 - py0
+    size = width * height
+
+    corner_nodes, corner_weights = [], []
+    for ox, oy in CIC_CORNERS:
+        gx, gy = cx + ox - px0, cy + oy - py0
+        valid = (gx >= 0) & (gx < width) & (gy >= 0) & (gy < height)
+        corner_nodes.append(np.where(valid, gy * width + gx, 0))
+        corner_weights.append(np.where(valid, (tx if ox else 1 - tx) * (ty if oy else 1 - ty), 0.0))
+    corner_weights = np.stack(corner_weights, axis=1)
+    force_sum = sum(np.bincount(node, weights=corner_weights[:, c] * grav_force, minlength=size)
+                    for c, node in enumerate(corner_nodes)).reshape(height, width)
+    count = sum(np.bincount(node, weights=corner_weights[:, c], minlength=size)
+                for c, node in enumerate(corner_nodes)).reshape(height, width)
+
+    dist = np.hypot(np.arange(-kx, kx + 1)[None, :] * dx, np.arange(-ky, ky + 1)[:, None] * dy)
+    kernel = 1 / (dist + IDW_EPSILON)
+    if radius is not None:
+        kernel[dist > radius] = 0
+    # The zero-distance term is always near, and its 1 / IDW_EPSILON weight would
+    # swamp the rest of the FFT in rounding error
+    kernel[ky, kx] = 0
+    kernels = [kernel] if radius is None else [kernel, (dist <= radius).astype(float)]
+    weighted, weights = (grid.ravel() for grid in _convolve_same([force_sum, count], kernel))
+    in_reach = _convolve_same([count], kernels[1])[0].ravel() if radius is not None else None
+
+    # Near pairs: the exact weight, less what the cloud-in-cell grid gave that node
+    off_x, off_y = _near_offsets(dx, dy, kx, ky)
+    grid_terms = []
+    for k in kernels:
+        padded = np.pad(k, 2)  # offsets reach a node past the kernel either side
+        grid_terms.append(np.stack([padded[off_y - oy + ky + 2, off_x - ox + kx + 2] for ox, oy in CIC_CORNERS]))
+    batch = max(1, IDW_PAIR_BATCH // len(off_x))
+    for start in range(0, len(x), batch):
+        stars = slice(start, start + batch)
+        node_x, node_y = cx[stars, None] + off_x, cy[stars, None] + off_y
+        valid = (node_x >= px0) & (node_x < px1) & (node_y >= py0) & (node_y < py1)
+        d = np.hypot(x_grid[np.clip(node_x, 0, nx - 1)] - x[stars, None],
+                     y_grid[np.clip(node_y, 0, ny - 1)] - y[stars, None])[valid]
+        node = ((node_y - py0) * width + (node_x - px0))[valid]
+        exact = 1 / (d + IDW_EPSILON)
+        if radius is not None:
+            exact[d > radius] = 0
+        correction = exact - (corner_weights[stars] @ grid_terms[0])[valid]
+        weights += np.bincount(node, weights=correction, minlength=size)
+        weighted += np.bincount(node, weights=correction * np.broadcast_to(grav_force[stars, None], valid.shape)[valid],
+                                minlength=size)
+        if radius is not None:
+            in_reach += np.bincount(node, weights=(d <= radius) - (corner_weights[stars] @ grid_terms[1])[valid],
+                                    minlength=size)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grav_map = (weighted / weights).reshape(height, width)
+    if radius is not None:
+        grav_map[in_reach.reshape(height, width) < 0.5] = np.nan
+    return grav_map[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+
+
+# === Spatial index ===
+RIVER_LINK_DIST = 50  # river <-> river
+CREEK_LINK_DIST = 75  # creek -> nearest river
+BROOK_LINK_DIST = 100  # brook -> nearest creek or river
+
+# === Sharded linking ===
+# Link tiles of the plane in a process pool; each shard also sees a LINK_HALO margin
+# around its tile so links crossing the tile edge come out the same as in one process
+sharded = False
+shard_workers = os.cpu_count()
+SHARD_TILE_SIZE = 5000  # grid units, at least LINK_HALO
+LINK_HALO = max(RIVER_LINK_DIST, CREEK_LINK_DIST, BROOK_LINK_DIST)
+
+# === Incremental update ===
+# With incremental on, main() updates the previous link map in place of a full
+# run; see update_gravity_well_map. That needs a finite GRAV_KERNEL_RADIUS. The
+# previous run's classes and settings are kept in an .npz next to the edge CSV.
+incremental = False
+LINK_STATE_SUFFIX = '.state.npz'
+LINK_STATE_VERSION = 2
+# Updates keep the previous run's grid bounds and force thresholds until one has
+# drifted by more than this fraction (bounds relative to the grid's span); then
+# the map is rebuilt with fresh ones
+LINK_PARAM_DRIFT = 0.01
+SYSTEM_NONE, SYSTEM_RIVER, SYSTEM_CREEK, SYSTEM_BROOK = 0, 1, 2, 3
+
+# === Route index ===
+# Build gaia_routing's route/jump query index next to the edge CSV
+build_route_index = False
+
+# === Connectivity pass ===
+# Stitch isolated systems and islands into one network with the cheapest extra links
+connect_islands = False
+
+
+class GridIndex:
+    """Uniform grid hash over integer points for Manhattan-distance queries.
+
+    Points are bucketed into square cells of cell_size, so every point closer than
+    cell_size to a query lies in the 3x3 cells around it. Queries are answered
+    for whole arrays at once with searchsorted over the sorted cell keys.
+    """
+
+    def __init__(self, x, y, cell_size: int):
+        self.x = np.asarray(x, dtype=np.int64)
+        self.y = np.asarray(y, dtype=np.int64)
+        self.cell_size = cell_size
+        keys = grid_key(self.x // cell_size, self.y // cell_size)
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def within(self, qx, qy, radius: int):
+        """(query index, point index, distance) for every pair with Manhattan distance < radius."""
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds the index cell size {self.cell_size}")
+        qx = np.asarray(qx, dtype=np.int64)
+        qy = np.asarray(qy, dtype=np.int64)
+        qcx, qcy = qx // self.cell_size, qy // self.cell_size
+        query_idx, point_idx = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = grid_key(qcx + dx, qcy + dy)
+                lo = np.searchsorted(self.sorted_keys, keys, 'left')
+                hi = np.searchsorted(self.sorted_keys, keys, 'right')
+                counts = hi - lo
+                q = np.repeat(np.arange(len(qx)), counts)
+                # position of each match within its run, added to the run start
+                run_pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                query_idx.append(q)
+                point_idx.append(self.order[lo[q] + run_pos])
+        q = np.concatenate(query_idx)
+        p = np.concatenate(point_idx)
+        dist = np.abs(qx[q] - self.x[p]) + np.abs(qy[q] - self.y[p])
+        close = dist < radius
+        return q[close], p[close], dist[close]
+
+    def nearest(self, qx, qy, radius: int):
+        """Nearest point to each query by Manhattan distance, if closer than radius.
+
+        Returns (point index, distance) arrays, with -1 where no point is in range.
+        Equal distances go to the lowest point index.
+        """
+        q, p, dist = self.within(qx, qy, radius)
+        nearest_idx = np.full(len(qx), -1, dtype=np.int64)
+        nearest_dist = np.zeros(len(qx), dtype=np.int64)
+        order = np.lexsort((p, dist, q))
+        q, p, dist = q[order], p[order], dist[order]
+        first = np.ones(len(q), dtype=bool)
+        first[1:] = q[1:] != q[:-1]
+        nearest_idx[q[first]] = p[first]
+        nearest_dist[q[first]] = dist[first]
+        return nearest_idx, nearest_dist
+
+
+def link_indices(rivers, creeks, brooks):
+    """Index form of link_systems over an (x, y) pair of arrays per class.
+
+    Returns three (source, target, distance) array triples: river pairs with
+    source < target, sorted; creek -> river links; and brook links whose target
+    indexes creeks + rivers. Unlinked creeks and brooks are left out.
+    """
+    river_x, river_y = rivers
+    river_index = GridIndex(river_x, river_y, RIVER_LINK_DIST)
+    q, p, dist = river_index.within(river_x, river_y, RIVER_LINK_DIST)
+    pairs = q < p
+    q, p, dist = q[pairs], p[pairs], dist[pairs]
+    order = np.lexsort((p, q))
+    river_links = (q[order], p[order], dist[order])
+
+    creek_x, creek_y = creeks
+    nearest, dist = GridIndex(river_x, river_y, CREEK_LINK_DIST).nearest(creek_x, creek_y, CREEK_LINK_DIST)
+    linked = np.flatnonzero(nearest >= 0)
+    creek_links = (linked, nearest[linked], dist[linked])
+
+    brook_x, brook_y = brooks
+    target_index = GridIndex(np.concatenate([creek_x, river_x]), np.concatenate([creek_y, river_y]),
+                             BROOK_LINK_DIST)
+    nearest, dist = target_index.nearest(brook_x, brook_y, BROOK_LINK_DIST)
+    linked = np.flatnonzero(nearest >= 0)
+    brook_links = (linked, nearest[linked], dist[linked])
+    return river_links, creek_links, brook_links
+
+
+def _link_edges(river_codes, creek_codes, brook_codes, links) -> list:
+    """(source, target, distance) edges from link_indices output, rivers then creeks then brooks."""
+    river_links, creek_links, brook_links = links
+    target_codes = np.concatenate([creek_codes, river_codes])
+    edges = []
+    for source_codes, dest_codes, (source, target, dist) in (
+            (river_codes, river_codes, river_links),
+            (creek_codes, river_codes, creek_links),
+            (brook_codes, target_codes, brook_links)):
+        edges += zip(source_codes[source], dest_codes[target], dist.tolist())
+    return edges
+
+
+def link_systems(rivers, creeks, brooks) -> list:
+    """River/creek/brook link edges as (source, target, distance), in the order they are added.
+
+    Each class is a (codes, x, y) triple of arrays. Rivers link to every river closer
+    than RIVER_LINK_DIST, creeks to their nearest river closer than CREEK_LINK_DIST,
+    brooks to their nearest creek or river closer than BROOK_LINK_DIST, with ties
+    going to the first candidate in creeks + rivers order.
+    """
+    links = link_indices(rivers[1:], creeks[1:], brooks[1:])
+    return _link_edges(rivers[0], creeks[0], brooks[0], links)
+
+
+def _tile_buckets(x, y, tile_size: int) -> dict:
+    """Indices of the points in each (tile_x, tile_y) tile, ascending."""
+    tx, ty = np.asarray(x) // tile_size, np.asarray(y) // tile_size
+    if len(tx) == 0:
+        return {}
+    order = np.argsort(grid_key(tx, ty), kind='stable')
+    keys = grid_key(tx, ty)[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+    return {(int(tx[order[s]]), int(ty[order[s]])): order[s:e] for s, e in zip(starts, ends)}
+
+
+def _shard_members(x, y, buckets: dict, tile, tile_size: int):
+    """(global indices, x, y, in-core mask) of the points within LINK_HALO of a tile."""
+    tx, ty = tile
+    idx = [buckets[(tx + dx, ty + dy)] for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (tx + dx, ty + dy) in buckets]
+    idx = np.sort(np.concatenate(idx)) if idx else np.empty(0, dtype=np.int64)
+    px, py = x[idx], y[idx]
+    x0, y0 = tx * tile_size, ty * tile_size
+    near = ((px >= x0 - LINK_HALO) & (px < x0 + tile_size + LINK_HALO)
+            & (py >= y0 - LINK_HALO) & (py < y0 + tile_size + LINK_HALO))
+    idx, px, py = idx[near], px[near], py[near]
+    core = (px // tile_size == tx) & (py // tile_size == ty)
+    return idx, px, py, core
+
+
+def _link_shard(shard):
+    """Link one shard and return the links whose source lies in its tile, in global indices."""
+    (river_idx, river_x, river_y, river_core), (creek_idx, creek_x, creek_y, creek_core), \
+        (brook_idx, brook_x, brook_y, brook_core), n_creeks = shard
+    river_links, creek_links, brook_links = link_indices(
+        (river_x, river_y), (creek_x, creek_y), (brook_x, brook_y))
+    target_idx = np.concatenate([creek_idx, n_creeks + river_idx])
+    merged = []
+    for source_idx, dest_idx, core, (source, target, dist) in (
+            (river_idx, river_idx, river_core, river_links),
+            (creek_idx, river_idx, creek_core, creek_links),
+            (brook_idx, target_idx, brook_core, brook_links)):
+        owned = core[source]
+        merged.append((source_idx[source[owned]], dest_idx[target[owned]], dist[owned]))
+    return merged
+
+
+def link_systems_sharded(rivers, creeks, brooks, tile_size: int = SHARD_TILE_SIZE, workers=None) -> list:
+    """link_systems split over tiles of the plane and run in a process pool.
+
+    Each shard holds the systems of one tile plus everything within LINK_HALO of
+    it, enough to find every link of its own systems. A link is kept only by the
+    shard whose tile holds its source system, so links across tile edges are not
+    duplicated. The merged links are sorted back into the single-process order,
+    and the edges are identical to link_systems.
+    """
+    if tile_size < LINK_HALO:
+        raise ValueError(f"tile_size {tile_size} is smaller than the link halo {LINK_HALO}")
+    classes = [(np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)) for _, x, y in (rivers, creeks, brooks)]
+    buckets = [_tile_buckets(x, y, tile_size) for x, y in classes]
+    tiles = sorted(set().union(*buckets))
+    shards = [
+        tuple(_shard_members(x, y, b, tile, tile_size) for (x, y), b in zip(classes, buckets)) + (len(classes[1][0]),)
+        for tile in tiles
+    ]
+    logging.info(f"Linking {len(shards)} shards of {tile_size} grid units")
+
+    if workers is not None and workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_link_shard, shards))
+    else:
+        results = [_link_shard(shard) for shard in shards]
+
+    if not results:
+        return []
+    links = []
+    for part in zip(*results):
+        source, target, dist = (np.concatenate(a) for a in zip(*part))
+        order = np.lexsort((target, source))
+        links.append((source[order], target[order], dist[order]))
+    return _link_edges(rivers[0], creeks[0], brooks[0], links)
+
+
+def link_systems_scan(rivers, creeks, brooks) -> list:
+    """Original quadratic linking; kept as the reference for link_systems, with the same arguments."""
+    rivers, creeks, brooks = (list(zip(*systems)) for systems in (rivers, creeks, brooks))
+    edges = []
+    for i, (c1, x1, y1) in enumerate(rivers):
+        for j, (c2, x2, y2) in enumerate(rivers[i+1:], start=i+1):
+            dist = abs(x1 - x2) + abs(y1 - y2)
+            if dist < RIVER_LINK_DIST:
+                edges.append((c1, c2, dist))
+
+    for c1, x1, y1 in creeks:
+        min_dist = float('inf')
+        nearest_river = None
+        for c2, x2, y2 in rivers:
+            dist = abs(x1 - x2) + abs(y1 - y2)
+            if dist < min_dist:
+                min_dist = dist
+                nearest_river = c2
+        if nearest_river and min_dist < CREEK_LINK_DIST:
+            edges.append((c1, nearest_river, min_dist))
+
+    targets = creeks + rivers
+    for b1, x1, y1 in brooks:
+        min_dist = float('inf')
+        nearest = None
+        for c2, x2, y2 in targets:
+            dist = abs(x1 - x2) + abs(y1 - y2)
+            if dist < min_dist:
+                min_dist = dist
+                nearest = c2
+        if nearest and min_dist < BROOK_LINK_DIST:
+            edges.append((b1, nearest, min_dist))
+    return edges
+
+
+def _dominance_min(a, b, c) -> np.ndarray:
+    """For each point i, the j != i with a[j] >= a[i] and b[j] >= b[i] of smallest c[j], or -1.
+
+    Ties in c go to the lowest j. Sorted by (a, b) descending, every such j comes
+    before i, so this is a divide and conquer over that order with each level
+    done for all blocks at once: at level L the first half of every block of
+    2**(L+1) points hands the running minimum of its c, taken in b order, to the
+    second half. O(n log^2 n) for n points.
+    """
+    n = len(a)
+    index = np.arange(n)
+    order = np.lexsort((index, -b, -a))
+    by_c = np.lexsort((index, c))
+    c_rank = np.empty(n, dtype=np.int64)
+    c_rank[by_c] = index
+    b_rank = np.unique(b, return_inverse=True)[1]
+    n_b = int(b_rank.max()) + 1 if n else 0
+    c_rank, b_rank = c_rank[order], b_rank[order]
+    best = np.full(n, n, dtype=np.int64)  # n: no point dominates
+    level = 0
+    while (1 << level) < n:
+        block, half = index >> (level + 1), (index >> level) & 1
+        # b descending within a block, the first half before the second at equal b
+        sort = np.argsort((block * n_b + (n_b - 1 - b_rank)) * 2 + half, kind='stable')
+        block, half = block[sort], half[sort]
+        values = np.where(half == 0, c_rank[sort], n)
+        # Later blocks are shifted below earlier ones, so the running minimum restarts at each block
+        running = np.minimum.accumulate(values - block * (n + 1)) + block * (n + 1)
+        queries = sort[half == 1]
+        best[queries] = np.minimum(best[queries], running[half == 1])
+        level += 1
+    result = np.full(n, -1, dtype=np.int64)
+    found = best < n
+    result[order[found]] = by_c[best[found]]
+    return result
+
+
+def _octant_neighbors(x, y):
+    """Nearest node in each of four 45-degree octants of every node, as (node, other, distance) arrays.
+
+    A rectilinear minimum spanning tree needs no other links: for q in an
+    octant of p, with w the nearest node to p in that octant, |w - q| <= |p - q|,
+    so p-q is the longest link of the triangle p, w, q. Links are undirected, so
+    the octants of one half-plane suffice.
+    """
+    node, other = [], []
+    for u, v in ((x, y), (y, x), (-y, x), (x, -y)):
+        # Octant du >= dv >= 0 of (u, v), where the distance is du + dv
+        nearest = _dominance_min(u - v, v, u + v)
+        has = nearest >= 0
+        node.append(np.flatnonzero(has))
+        other.append(nearest[has])
+    node, other = np.concatenate(node), np.concatenate(other)
+    return node, other, np.abs(x[node] - x[other]) + np.abs(y[node] - y[other])
+
+
+def connect_components(G: LinkGraph) -> int:
+    """Link the components of G with the least total length of extra links.
+
+    That is a minimum spanning forest of all Manhattan-distance links (as the
+    other links), with the existing components taken as already joined. The
+    candidates are the octant nearest neighbours of every system, at most 4 per
+    system, which contain such a forest; Kruskal's algorithm over them, starting
+    from the existing components, adds the links. Returns the number of links added.
+    """
+    labels = G.components()
+    comp_ids = np.unique(labels, return_inverse=True)[1]
+    initial = int(comp_ids.max()) + 1 if len(comp_ids) else 0
+    added = []
+    if initial > 1:
+        x = G.node_attr('x').astype(np.int64)
+        y = G.node_attr('y').astype(np.int64)
+        q, p, dist = _octant_neighbors(x, y)
+        cross = comp_ids[q] != comp_ids[p]
+        q, p, dist = q[cross], p[cross], dist[cross]
+        # Cheapest first, ties to the lowest node ids
+        order = np.lexsort((np.maximum(q, p), np.minimum(q, p), dist))
+        root = list(range(initial))
+
+        def find(c):
+            while root[c] != c:
+                root[c] = root[root[c]]
+                c = root[c]
+            return c
+
+        joined = 1
+        for e in order.tolist():
+            a, b = find(comp_ids[q[e]]), find(comp_ids[p[e]])
+            if a != b:
+                root[max(a, b)] = min(a, b)
+                added.append(e)
+                joined += 1
+                if joined == initial:
+                    break
+    added = np.asarray(added, dtype=np.int64)
+    if len(added):
+        ids = np.asarray(G.node_ids, dtype=object)
+        G.add_edges(ids[q[added]], ids[p[added]], dist[added])
+    logging.info(f"Connectivity pass: {initial} components, added {len(added)} links, "
+                 f"{initial - len(added)} left")
+    return len(added)
+
+
+def enrich_edges(edges_df: pd.DataFrame, df: pd.DataFrame) -> pd.DataFrame:
+    """Add source_*/target_* metadata columns of both endpoints to a source/target edge list.
+
+    base64_2D is factorized once into a table with one row per key, and both
+    endpoint columns are gathered from it with take, the same columns a left merge
+    on source and then target gives. Repeated base64_2D keys are reported and
+    their first row is used, so they cannot multiply the edges.
+    """
+    metadata_cols = [col for col in LINK_MAP_COLUMNS if col in df.columns and col != 'base64_2D']
+    codes, keys = pd.factorize(df['base64_2D'])
+    _, first_rows = np.unique(codes, return_index=True)
+    if len(first_rows) < len(df):
+        logging.warning(f"{len(df) - len(first_rows)} rows share a base64_2D key with an earlier row; "
+                        f"the first row of each is used for the edge metadata")
+    table = df[metadata_cols].iloc[first_rows]
+    key_index = pd.Index(keys)
+
+    enriched = {col: edges_df[col] for col in edges_df.columns}
+    for end in ('source', 'target'):
+        rows = key_index.get_indexer(edges_df[end])
+        missing = rows < 0
+        if missing.any():
+            logging.warning(f"{missing.sum()} edge {end}s have no metadata row")
+        for col in metadata_cols:
+            enriched[f"{end}_{col}"] = pd.api.extensions.take(table[col].array, rows, allow_fill=True)
+    return pd.DataFrame(enriched, index=edges_df.index)
+
+
+def load_link_input(input_path: str):
+    """The link map columns of the thinned catalogue with decoded grid_x/grid_y, or None."""
     try:
-        # Read the thinned CSV
-        df = pd.read_csv(input_path)
+        # Read the thinned catalogue, only the columns the link map uses
+        df = read_catalogue(input_path, columns=LINK_MAP_COLUMNS)
         logging.info(f"Loaded thinned CSV with {len(df)} rows from {input_path}")
     except FileNotFoundError as e:
         logging.error(f"Input file not found: {e}")
-        return
+        return None
     except Exception as e:
         logging.error(f"Error reading CSV: {e}")
-        return
+        return None
 
     logger.info(f"CSV imported to Dataframe")
     # Decode base64_2D grid coordinates into integers
-    df[['grid_x', 'grid_y']] = df['base64_2D'].apply(
-        lambda b: pd.Series(decode_2d(b))
+    df['grid_x'], df['grid_y'] = decode_2d_array(df['base64_2D'])
+    return df
+
+
+def link_map_params(df: pd.DataFrame) -> dict:
+    """Grid bounds, field settings and force thresholds of a link map run over df."""
+    grav_force = df['gravitational_force'].values
+    return {
+        'x_min': int(df['grid_x'].min()), 'x_max': int(df['grid_x'].max()),
+        'y_min': int(df['grid_y'].min()), 'y_max': int(df['grid_y'].max()),
+        'grid_size': tuple(GRAV_GRID_SIZE), 'kernel_radius': GRAV_KERNEL_RADIUS,
+        'mean_force': float(np.mean(grav_force)),
+        'threshold_high': float(np.percentile(grav_force, 90)),
+        'threshold_med': float(np.percentile(grav_force, 50)),
+    }
+
+
+def param_grids(params: dict):
+    grid_size_x, grid_size_y = params['grid_size']
+    x_grid = np.linspace(params['x_min'], params['x_max'], grid_size_x)
+    y_grid = np.linspace(params['y_min'], params['y_max'], grid_size_y)
+    return x_grid, y_grid
+
+
+def classify_systems(node_force, grav_force, params: dict) -> np.ndarray:
+    """SYSTEM_RIVER/CREEK/BROOK for gravity well peaks (grid node above the mean force), SYSTEM_NONE otherwise."""
+    is_peak = node_force > params['mean_force']
+    classes = np.full(len(grav_force), SYSTEM_NONE, dtype=np.int8)
+    classes[is_peak & (grav_force < params['threshold_med'])] = SYSTEM_BROOK
+    classes[is_peak & (params['threshold_med'] <= grav_force) & (grav_force < params['threshold_high'])] = SYSTEM_CREEK
+    classes[is_peak & (grav_force >= params['threshold_high'])] = SYSTEM_RIVER
+    return classes
+
+
+def _class_arrays(df: pd.DataFrame, classes: np.ndarray):
+    """(codes, x, y) triples of the rivers, creeks and brooks, in file order."""
+    base64_2D, x_coords, y_coords = df['base64_2D'].values, df['grid_x'].values, df['grid_y'].values
+    return tuple(
+        (base64_2D[classes == c], x_coords[classes == c], y_coords[classes == c])
+        for c in (SYSTEM_RIVER, SYSTEM_CREEK, SYSTEM_BROOK)
     )
+
+
+def build_link_graph(df: pd.DataFrame, classes: np.ndarray, link_edges: list) -> LinkGraph:
+    """LinkGraph of the gravity well peaks, in file order, with the given (source, target, distance) edges."""
+    is_peak = classes != SYSTEM_NONE
+    G = LinkGraph()
+    G.add_nodes(df['base64_2D'].values[is_peak], x=df['grid_x'].values[is_peak],
+                y=df['grid_y'].values[is_peak], grav=df['gravitational_force'].values[is_peak])
+    if link_edges:
+        G.add_edges(*zip(*link_edges))
+    return G
+
+
+def write_link_map(G: LinkGraph, df: pd.DataFrame, classes: np.ndarray, params: dict, output_path: str) -> None:
+    """Write the edge CSV, and the state update_gravity_well_map starts from next to it."""
+    csv_path = output_path.replace('.png', '.csv')
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    if G.number_of_edges():
+        # Build initial edge list
+        edges_df = G.edges_frame()
+
+        # Add metadata for source and target
+        edges_df = enrich_edges(edges_df, df)
+
+        edges_df.to_csv(csv_path, index=False)
+        logging.info(f"Wrote {G.number_of_edges()} linkages to {csv_path}")
+        if build_route_index:
+            route_index_for(csv_path)
+    save_link_state(csv_path + LINK_STATE_SUFFIX, df, classes, params)
+
+
+def create_gravity_well_map(input_path: str, output_path: str, params=None) -> None:
+    """Build the link map of a thinned catalogue; params defaults to link_map_params of it."""
+    df = load_link_input(input_path)
+    if df is None:
+        return
     x_coords = df['grid_x'].values
     y_coords = df['grid_y'].values
     grav_force = df['gravitational_force'].values
-    base64_2D = df['base64_2D'].values
 
     # Determine grid bounds and resolution
-    x_min, x_max = min(x_coords), max(x_coords)
-    y_min, y_max = min(y_coords), max(y_coords)
-    grid_size_x, grid_size_y = 300, 20
-    x_grid = np.linspace(x_min, x_max, grid_size_x)
-    y_grid = np.linspace(y_min, y_max, grid_size_y)
+    if params is None:
+        params = link_map_params(df)
+    x_grid, y_grid = param_grids(params)
+    grid_size_x, grid_size_y = params['grid_size']
 
     # Create a 2D interpolation of gravitational force
-    X, Y = np.meshgrid(x_grid, y_grid)
-    grav_map = np.zeros_like(X, dtype=float)
-    for i in range(len(x_coords)):
-        dist = np.sqrt((X - x_coords[i])**2 + (Y - y_coords[i])**2)
-        weight = 1 / (dist + 1e-10)
-        grav_map += weight * grav_force[i]
-    grav_map /= np.sum(weight, axis=0)
-
-    # Identify gravity well peaks
-    peaks = []
-    for i in range(len(x_coords)):
-        grid_x_idx = np.abs(x_grid - x_coords[i]).argmin()
-        grid_y_idx = np.abs(y_grid - y_coords[i]).argmin()
-        if grav_map[grid_y_idx, grid_x_idx] > np.mean(grav_force):
-            peaks.append((base64_2D[i], x_coords[i], y_coords[i], grav_force[i]))
-    logging.info(f"Identified {len(peaks)} gravity well peaks")
-
-    # Categorize systems
-    threshold_high = np.percentile(grav_force, 90)
-    threshold_med = np.percentile(grav_force, 50)
-    rivers = [(c, x, y, g) for c, x, y, g in peaks if g >= threshold_high]
-    creeks = [(c, x, y, g) for c, x, y, g in peaks if threshold_med <= g < threshold_high]
-    brooks = [(c, x, y, g) for c, x, y, g in peaks if g < threshold_med]
-    logging.info(f"Classified: {len(rivers)} rivers, {len(creeks)} creeks, {len(brooks)} brooks")
-
-    # Create graph
-    G = nx.Graph()
-    for cube, x, y, g in peaks:
-        G.add_node(cube, pos=(x, y), grav=g)
-
-    # Connect rivers
-    for i, (c1, x1, y1, g1) in enumerate(rivers):
-        for j, (c2, x2, y2, g2) in enumerate(rivers[i+1:], start=i+1):
-            dist = abs(x1 - x2) + abs(y1 - y2)
-            if dist < 50:
-                G.add_edge(c1, c2, weight=dist)
+    grav_map = gravity_field(x_coords, y_coords, grav_force, x_grid, y_grid, GRAV_KERNEL_RADIUS)
+    logging.info(f"Interpolated gravity field on a {grid_size_x}x{grid_size_y} grid")
 
-    # Connect creeks to rivers
-    for c1, x1, y1, g1 in creeks:
-        min_dist = float('inf')
-        nearest_river = None
-        for c2, x2, y2, g2 in rivers:
-            dist = abs(x1 - x2) + abs(y1 - y2)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_river = c2
-        if nearest_river and min_dist < 75:
-            G.add_edge(c1, nearest_river, weight=min_dist)
+    # Identify gravity well peaks (systems whose grid node is above the mean force) and categorize them
+    node_force = grav_map[nearest_grid_index(y_coords, y_grid), nearest_grid_index(x_coords, x_grid)]
+    classes = classify_systems(node_force, grav_force, params)
+    logging.info(f"Identified {np.count_nonzero(classes)} gravity well peaks")
+    rivers, creeks, brooks = _class_arrays(df, classes)
+    logging.info(f"Classified: {len(rivers[0])} rivers, {len(creeks[0])} creeks, {len(brooks[0])} brooks")
 
-    # Connect brooks to creeks or rivers
-    for b1, x1, y1, g1 in brooks:
-        min_dist = float('inf')
-        nearest = None
-        targets = creeks + rivers
-        for c2, x2, y2, g2 in targets:
-            dist = abs(x1 - x2) + abs(y1 - y2)
-            if dist < min_dist:
-                min_dist = dist
-                nearest = c2
-        if nearest and min_dist < 100:
-            G.add_edge(b1, nearest, weight=min_dist)
+    # Connect rivers to rivers, creeks to rivers and brooks to creeks or rivers
+    if sharded:
+        link_edges = link_systems_sharded(rivers, creeks, brooks, workers=shard_workers)
+    else:
+        link_edges = link_systems(rivers, creeks, brooks)
+
+    # Create graph (LinkGraph.to_networkx() gives an nx.Graph for analysis)
+    G = build_link_graph(df, classes, link_edges)
+    if connect_islands and G.number_of_nodes():
+        connect_components(G)
 
     # Output linkages to CSV
     if i % 100 == 0:
         logger.info(f"Processed {i} cubes")
-    edges = [(u, v, d['weight']) for u, v, d in G.edges(data=True)]
-    if edges:
-        # Build initial edge list
-        edges_df = pd.DataFrame(edges , columns=['source' , 'target' , 'distance'])
+    write_link_map(G, df, classes, params, output_path)
 
-        # Merge metadata for source and target
-        metadata_cols = ['base64_2D' , 'StarClass' , 'Sub_Class' , 'quadrant' , 'gravitational_force' , 'rarity_score']
-        metadata_cols = [col for col in metadata_cols if col in df.columns]
+    # Save gravity well map
+    if render_map:
+        render_gravity_map(x_grid, y_grid, grav_map, x_coords, y_coords, grav_force, output_path)
 
-        source_metadata = df[metadata_cols].rename(columns=lambda c: f"source_{c}" if c != 'base64_2D' else 'source')
-        target_metadata = df[metadata_cols].rename(columns=lambda c: f"target_{c}" if c != 'base64_2D' else 'target')
 
-        edges_df = edges_df.merge(source_metadata , on='source' , how='left')
-        edges_df = edges_df.merge(target_metadata , on='target' , how='left')
+# === Incremental update ===
+def _row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """A hash of each system's LINK_MAP_COLUMNS, to tell edited rows apart."""
+    return pd.util.hash_pandas_object(df[LINK_MAP_COLUMNS], index=False).to_numpy(dtype=np.uint64)
 
-        os.makedirs(os.path.dirname(output_path.replace('.png', '.csv')), exist_ok=True)
-        edges_df.to_csv(output_path.replace('.png', '.csv'), index=False)
-        logging.info(f"Wrote {len(edges)} linkages to {output_path.replace('.png', '.csv')}")
 
-    # Save gravity well map
+def save_link_state(state_path: str, df: pd.DataFrame, classes: np.ndarray, params: dict) -> None:
+    """Write the systems' keys, forces, row hashes and classes and the run's params as .npz."""
+    with open(state_path, 'wb') as f:
+        np.savez(f, version=np.int64(LINK_STATE_VERSION), params=np.array(json.dumps(params)),
+                 base64_2D=df['base64_2D'].to_numpy(dtype=str),
+                 gravitational_force=df['gravitational_force'].to_numpy(dtype=np.float64),
+                 row_hash=_row_hashes(df), system_class=np.asarray(classes, dtype=np.int8))
+
+
+def load_link_state(state_path: str):
+    """The state save_link_state wrote as {'params', 'systems'}, or None if missing or of another version."""
+    try:
+        with np.load(state_path, allow_pickle=False) as data:
+            if int(data['version']) != LINK_STATE_VERSION:
+                logging.info(f"Link map state at {state_path} is version {int(data['version'])}, "
+                             f"not {LINK_STATE_VERSION}")
+                return None
+            params = json.loads(str(data['params']))
+            systems = pd.DataFrame({col: data[col] for col in
+                                    ('base64_2D', 'gravitational_force', 'row_hash', 'system_class')})
+    except (OSError, ValueError, KeyError) as e:
+        logging.info(f"No usable link map state at {state_path}: {e}")
+        return None
+    params['grid_size'] = tuple(params['grid_size'])
+    return {'params': params, 'systems': systems}
+
+
+def _diff_systems(df: pd.DataFrame, previous: pd.DataFrame):
+    """Diff a run's systems against the previous run's by base64_2D.
+
+    Returns (codes of systems added, removed or with a changed gravitational_force,
+    whether any column changed at all, whether the common systems kept their order).
+    """
+    old_rows = pd.Index(previous['base64_2D']).get_indexer(df['base64_2D'])
+    common = old_rows >= 0
+    old = previous.iloc[old_rows[common]].reset_index(drop=True)
+    new = df[common].reset_index(drop=True)
+
+    moved_force = old['gravitational_force'].to_numpy() != new['gravitational_force'].to_numpy()
+    moved_force &= ~(old['gravitational_force'].isna().to_numpy() & new['gravitational_force'].isna().to_numpy())
+    edited = moved_force | (old['row_hash'].to_numpy() != _row_hashes(new))
+
+    added = df['base64_2D'].values[~common]
+    removed = previous['base64_2D'].values[~previous['base64_2D'].isin(df['base64_2D']).values]
+    changed = np.concatenate([added, removed, new['base64_2D'].values[moved_force]])
+    any_change = len(added) > 0 or len(removed) > 0 or bool(edited.any())
+    same_order = bool(np.all(np.diff(old_rows[common]) > 0))
+    return changed, any_change, same_order
+
+
+def _param_drift(saved: dict, params: dict) -> dict:
+    """Relative drift of each force threshold and grid bound from the saved params to params."""
+    drift = {}
+    for k in ('mean_force', 'threshold_high', 'threshold_med'):
+        scale = abs(saved[k])
+        drift[k] = abs(params[k] - saved[k]) / scale if scale else (0.0 if params[k] == saved[k] else np.inf)
+    for axis in ('x', 'y'):
+        span = max(saved[f'{axis}_max'] - saved[f'{axis}_min'], 1)
+        for k in (f'{axis}_min', f'{axis}_max'):
+            drift[k] = abs(params[k] - saved[k]) / span
+    return drift
+
+
+def _full_run_reason(state, df: pd.DataFrame, params: dict, csv_path: str):
+    """Why an update cannot be incremental, or None.
+
+    params are the current catalogue's; the grid settings must match the saved
+    ones, and the bounds and thresholds be within LINK_PARAM_DRIFT of them.
+    """
+    if state is None:
+        return "no previous run state"
+    if GRAV_KERNEL_RADIUS is None:
+        return "GRAV_KERNEL_RADIUS is None, so every system affects the whole field"
+    if connect_islands:
+        return "connect_islands links across the whole map"
+    if not df['base64_2D'].is_unique or not state['systems']['base64_2D'].is_unique:
+        return "base64_2D keys repeat"
+    if state['systems']['system_class'].ne(SYSTEM_NONE).any() and not os.path.exists(csv_path):
+        return "no previous edge CSV"
+    saved = state['params']
+    changed = [k for k in ('grid_size', 'kernel_radius') if params[k] != saved.get(k)]
+    if changed:
+        return f"{', '.join(changed)} changed"
+    drifted = [f"{k} by {d:.2%}" for k, d in _param_drift(saved, params).items() if d > LINK_PARAM_DRIFT]
+    if drifted:
+        return f"{', '.join(drifted)} drifted past LINK_PARAM_DRIFT ({LINK_PARAM_DRIFT:.2%})"
+    return None
+
+
+def _dirty_tiles(x, y, margin: int) -> set:
+    """SHARD_TILE_SIZE tiles within margin tiles of the given points."""
+    tiles = set(zip((np.asarray(x) // SHARD_TILE_SIZE).tolist(), (np.asarray(y) // SHARD_TILE_SIZE).tolist()))
+    return {(tx + mx, ty + my) for tx, ty in tiles
+            for mx in range(-margin, margin + 1) for my in range(-margin, margin + 1)}
+
+
+def _previous_links(csv_path: str, codes: np.ndarray, classes: np.ndarray):
+    """The previous edge CSV as link_indices output over the given systems and classes.
+
+    Returns the three (source, target, distance) triples and, for each, the
+    system row of every source. Edges that are no longer a river/creek/brook link
+    under the classes are dropped.
+    """
+    if not os.path.exists(csv_path):
+        edges = pd.DataFrame({'source': [], 'target': [], 'distance': []})
+    else:
+        edges = pd.read_csv(csv_path, usecols=['source', 'target', 'distance'])
+    rows = pd.Index(codes)
+    a, b = rows.get_indexer(edges['source']), rows.get_indexer(edges['target'])
+    dist = edges['distance'].to_numpy(dtype=np.int64)
+    known = (a >= 0) & (b >= 0)
+    a, b, dist = a[known], b[known], dist[known]
+
+    # Index of each system within its class, in file order
+    class_pos = np.zeros(len(classes), dtype=np.int64)
+    for c in (SYSTEM_RIVER, SYSTEM_CREEK, SYSTEM_BROOK):
+        members = classes == c
+        class_pos[members] = np.arange(np.count_nonzero(members))
+    n_creeks = np.count_nonzero(classes == SYSTEM_CREEK)
+
+    # River pairs, with the earlier river as source
+    pair = (classes[a] == SYSTEM_RIVER) & (classes[b] == SYSTEM_RIVER)
+    river_source, river_target = np.minimum(a[pair], b[pair]), np.maximum(a[pair], b[pair])
+    # Creek -> river
+    creek = np.where(classes[a] == SYSTEM_CREEK, a, b)
+    river = np.where(classes[a] == SYSTEM_CREEK, b, a)
+    creek_link = (classes[creek] == SYSTEM_CREEK) & (classes[river] == SYSTEM_RIVER)
+    # Brook -> creek or river, with targets indexed over creeks + rivers
+    brook = np.where(classes[a] == SYSTEM_BROOK, a, b)
+    target = np.where(classes[a] == SYSTEM_BROOK, b, a)
+    brook_link = (classes[brook] == SYSTEM_BROOK) & np.isin(classes[target], (SYSTEM_CREEK, SYSTEM_RIVER))
+    target = target[brook_link]
+    target_pos = np.where(classes[target] == SYSTEM_CREEK, class_pos[target], n_creeks + class_pos[target])
+
+    links = [
+        (class_pos[river_source], class_pos[river_target], dist[pair]),
+        (class_pos[creek[creek_link]], class_pos[river[creek_link]], dist[creek_link]),
+        (class_pos[brook[brook_link]], target_pos, dist[brook_link]),
+    ]
+    return links, [river_source, creek[creek_link], brook[brook_link]]
+
+
+def update_gravity_well_map(input_path: str, output_path: str) -> None:
+    """Bring the link map up to date with an edited thinned catalogue, relinking only around the edits.
+
+    The systems are diffed by base64_2D against the state the previous run saved
+    next to its CSV. The SHARD_TILE_SIZE tiles within the kernel radius plus
+    LINK_HALO of a system that was added, removed or changed force are dirty:
+    the systems in and around them are reclassified from windows of the gravity
+    field and relinked shard by shard, and the previous links whose source lies
+    outside them are kept. The grid bounds and force thresholds stay those of the
+    previous run, so only the edits can change a class, and the CSV is the one
+    create_gravity_well_map would write with those params. This needs a finite
+    GRAV_KERNEL_RADIUS and the current bounds and thresholds within
+    LINK_PARAM_DRIFT of the saved ones; otherwise the map is rebuilt in full.
+    """
+    csv_path = output_path.replace('.png', '.csv')
+    df = load_link_input(input_path)
+    if df is None:
+        return
+    state = load_link_state(csv_path + LINK_STATE_SUFFIX)
+    reason = _full_run_reason(state, df, link_map_params(df), csv_path)
+    if reason is None:
+        previous = state['systems']
+        changed, any_change, same_order = _diff_systems(df, previous)
+        if not same_order:
+            reason = "systems were reordered"
+    if reason is not None:
+        if GRAV_KERNEL_RADIUS is None:
+            logging.warning(f"Rebuilding the link map: {reason}; set GRAV_KERNEL_RADIUS for incremental updates")
+        else:
+            logging.info(f"Rebuilding the link map: {reason}")
+        create_gravity_well_map(input_path, output_path)
+        return
+    if not any_change:
+        logging.info(f"No changes since the link map at {csv_path}")
+        return
+    params = state['params']
+
+    x_coords, y_coords = df['grid_x'].values, df['grid_y'].values
+    grav_force = df['gravitational_force'].values
+    x_grid, y_grid = param_grids(params)
+
+    # A system's class can only change within the kernel radius (plus binning) of a change
+    reach = GRAV_KERNEL_RADIUS + _grid_step(x_grid) + _grid_step(y_grid)
+    changed_x, changed_y = decode_2d_array(changed)
+    dirty = _dirty_tiles(changed_x, changed_y, int(math.ceil((reach + LINK_HALO) / SHARD_TILE_SIZE)))
+    logging.info(f"{len(changed)} systems changed; relinking {len(dirty)} tiles")
+
+    # Reclassify the systems in and within LINK_HALO of the dirty tiles
+    classes = np.array(previous.set_index('base64_2D')['system_class']
+                       .reindex(df['base64_2D']).fillna(SYSTEM_NONE), dtype=np.int8)
+    ix, iy = nearest_grid_index(x_coords, x_grid), nearest_grid_index(y_coords, y_grid)
+    for tx, ty in dirty:
+        x0, y0 = tx * SHARD_TILE_SIZE - LINK_HALO, ty * SHARD_TILE_SIZE - LINK_HALO
+        x1, y1 = x0 + SHARD_TILE_SIZE + 2 * LINK_HALO, y0 + SHARD_TILE_SIZE + 2 * LINK_HALO
+        members = np.flatnonzero((x_coords >= x0) & (x_coords < x1) & (y_coords >= y0) & (y_coords < y1))
+        if not len(members):
+            continue
+        window = (ix[members].min(), ix[members].max() + 1, iy[members].min(), iy[members].max() + 1)
+        field = gravity_field(x_coords, y_coords, grav_force, x_grid, y_grid, GRAV_KERNEL_RADIUS, window)
+        node_force = field[iy[members] - window[2], ix[members] - window[0]]
+        classes[members] = classify_systems(node_force, grav_force[members], params)
+
+    # Relink the dirty tiles as shards, and keep the previous links of the other tiles
+    rivers, creeks, brooks = _class_arrays(df, classes)
+    class_xy = [(x, y) for _, x, y in (rivers, creeks, brooks)]
+    buckets = [_tile_buckets(x, y, SHARD_TILE_SIZE) for x, y in class_xy]
+    results = [
+        _link_shard(tuple(_shard_members(x, y, b, tile, SHARD_TILE_SIZE) for (x, y), b in zip(class_xy, buckets))
+                    + (len(creeks[0]),))
+        for tile in sorted(dirty)
+    ]
+    dirty_keys = np.array([grid_key(tx, ty) for tx, ty in dirty], dtype=np.int64)
+    kept = []
+    for (source, target, dist), rows in zip(*_previous_links(csv_path, df['base64_2D'].values, classes)):
+        clean = ~np.isin(grid_key(x_coords[rows] // SHARD_TILE_SIZE, y_coords[rows] // SHARD_TILE_SIZE), dirty_keys)
+        kept.append((source[clean], target[clean], dist[clean]))
+    results.append(kept)
+
+    links = []
+    for part in zip(*results):
+        source, target, dist = (np.concatenate(a).astype(np.int64) for a in zip(*part))
+        order = np.lexsort((target, source))
+        links.append((source[order], target[order], dist[order]))
+    G = build_link_graph(df, classes, _link_edges(rivers[0], creeks[0], brooks[0], links))
+    write_link_map(G, df, classes, params, output_path)
+
+
+def render_gravity_map(x_grid, y_grid, grav_map, x_coords, y_coords, grav_force, output_path: str) -> str:
+    """Draw the gravity field with the systems on top and save it as a PNG.
+
+    matplotlib is imported here, on the non-interactive Agg backend. Above
+    RENDER_MAX_POINTS systems, a fixed random sample of them is drawn so the
+    scatter cost stays bounded; the contour is already on the grid.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    if len(x_coords) > RENDER_MAX_POINTS:
+        shown = np.sort(np.random.default_rng(0).choice(len(x_coords), RENDER_MAX_POINTS, replace=False))
+        logging.info(f"Drawing {RENDER_MAX_POINTS} of {len(x_coords)} systems")
+        x_coords, y_coords, grav_force = x_coords[shown], y_coords[shown], grav_force[shown]
+
+    X, Y = np.meshgrid(x_grid, y_grid)
     plt.figure(figsize=(10, 5))
     plt.contourf(X, Y, grav_map, levels=20, cmap='terrain')
     plt.colorbar(label='Gravitational Force')
@@ -159,15 +994,19 @@ def create_gravity_well_map(input_path: str, output_path: str) -> None:
     date_code = datetime.now().strftime('%Y%m%d_%H%M')
     image_output_path = output_path.replace('[datecode]', date_code)
     os.makedirs(os.path.dirname(image_output_path), exist_ok=True)
-    plt.savefig(image_output_path)
+    plt.savefig(image_output_path, dpi=RENDER_DPI)
     plt.close()
     logging.info(f"Saved gravity well map to {image_output_path}")
+    return image_output_path
 
 def main():
     input_path = r"C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus_Thined.csv"
     output_path = r"C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus_Thin_Map.png"
     logging.info(f"Starting gravity well map generation at {input_path} to {output_path}")
-    create_gravity_well_map(input_path, output_path)
+    if incremental:
+        update_gravity_well_map(input_path, output_path)
+    else:
+        create_gravity_well_map(input_path, output_path)
 
 if __name__ == '__main__':
     main()
@@ -7,6 +7,11 @@ import numpy as np
 import logging
 import os
 import logging
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from functools import lru_cache
+from gaia_io import read_catalogue, iter_catalogue, open_text_output
 
 # Set up logging
 logging.basicConfig(
@@ -48,6 +53,55 @@ except ImportError as e:
     logging.error(f"Failed to import endless_sky_data: {e}")
     raise
 
+# === Zone tables ===
+# Built once from endless_sky_data. Which planet classes fit a zone only depends
+# on the zone's distance range scaled by the star's base_habitability, so the
+# per-star zone plans are memoized by that value.
+TERRESTRIAL_CLASSES = ('A', 'B', 'C', 'D', 'F', 'G', 'H', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R',
+                       'S', 'U', 'V', 'W', 'Y', 'Z')
+GAS_GIANT_CLASSES = ('J1', 'J2', 'T1')
+ICE_GIANT_CLASSES = ('I',)
+# (zone name, zone data) in processing order, without the asteroid belt
+PLANET_ZONES = [(zone_name, z_data) for zone_name, z_data in
+                sorted(planetary_zones.items(), key=lambda x: x[1]['processing_order'])
+                if zone_name != 'asteroid_belt_zone']
+
+
+def _class_table(kind_classes) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """The planet_classes of one kind, in planet_classes order, with their orbital range bounds."""
+    names = [p_class for p_class in planet_classes if p_class in kind_classes]
+    bounds = np.array([planet_classes[p_class]['orbital_range'] for p_class in names], dtype=float).reshape(-1, 2)
+    return names, bounds[:, 0], bounds[:, 1]
+
+
+# (class names, orbital minimum, orbital maximum, zone limit key) per planet kind
+PLANET_KIND_TABLES = [
+    _class_table(TERRESTRIAL_CLASSES) + ('max_terrestrial_planets',),
+    _class_table(GAS_GIANT_CLASSES) + ('max_gas_giants',),
+    _class_table(ICE_GIANT_CLASSES) + ('max_ice_giants',),
+]
+
+
+@lru_cache(maxsize=None)
+def zone_plan(star_habitability) -> tuple:
+    """Per zone, (name, min_dist, max_dist, ((classes, max count), ...) per planet kind) for a star.
+
+    The classes of a kind are those whose orbital range overlaps the scaled zone,
+    if the zone allows that kind at all; the count is capped by both.
+    """
+    scale = math.sqrt(1000 / max(1.0, star_habitability))  # Scale distances by star
+    plan = []
+    for zone_name, z_data in PLANET_ZONES:
+        min_dist = z_data['distance_range_au'][0] * scale
+        max_dist = z_data['distance_range_au'][1] * scale
+        kinds = []
+        for names, p_min, p_max, limit_key in PLANET_KIND_TABLES:
+            fits = (p_min <= max_dist) & (p_max >= min_dist)
+            classes = [p_class for p_class, ok in zip(names, fits.tolist()) if ok] if z_data[limit_key] > 0 else []
+            kinds.append((classes, min(z_data[limit_key], len(classes))))
+        plan.append((zone_name, min_dist, max_dist, tuple(kinds)))
+    return tuple(plan)
+
 
 def to_roman(num: int) -> str:
     """Convert integer to Roman numeral."""
@@ -70,9 +124,14 @@ def sanitize_name(name: str , max_len: int = 20) -> str:
 
 def get_system_name(row: pd.Series) -> Tuple[str, str]:
     """Get system name using sinbad_name, then Name_two, else fall back to 2D_sector-counter."""
-    sinbad = str(row.get('sinbad_name', '')).strip()
-    name_two = str(row.get('Name_two', '')).strip()
-    sector = str(row.get('2D_sector', 'S000')).strip()
+    return system_name_from(row.get('sinbad_name', ''), row.get('Name_two', ''), row.get('2D_sector', 'S000'))
+
+
+def system_name_from(sinbad, name_two, sector) -> Tuple[str, str]:
+    """get_system_name from the three column values."""
+    sinbad = str(sinbad).strip()
+    name_two = str(name_two).strip()
+    sector = str(sector).strip()
 
     if sinbad and len(sinbad) <= 20 and not re.match(r'^Gaia\sDR3\s\d+', sinbad):
         return sanitize_name(sinbad), sinbad
@@ -87,12 +146,12 @@ def get_system_name(row: pd.Series) -> Tuple[str, str]:
     return fallback_name, fallback_name
 
 
-def get_star_attributes(star_class: str , star_type: str) -> str:
+def get_star_attributes(star_class: str , star_type: str, rng=random) -> str:
     """Get descriptive attributes for star."""
     if star_type == 'giant':
         return 'giant star' if star_class in ['O' , 'B' , 'F' , 'G' , 'K' , 'M'] else 'supergiant star'
     elif star_type == 'dwarf':
-        return random.choice(['dwarf star' , 'small star'])
+        return rng.choice(['dwarf star' , 'small star'])
     elif star_class == 'G':
         return 'sun-like star'
     elif star_class in ['O' , 'B']:
@@ -102,32 +161,51 @@ def get_star_attributes(star_class: str , star_type: str) -> str:
     return 'star'
 
 
-def get_star_params(star_type: str) -> Tuple[float , float , float]:
+def get_star_params(star_type: str, rng=random) -> Tuple[float , float , float]:
     """Generate star orbital parameters."""
     if star_type == 'giant':
-        distance = random.uniform(10 , 100)
-        period = random.uniform(200 , 1000)
+        distance = rng.uniform(10 , 100)
+        period = rng.uniform(200 , 1000)
     elif star_type == 'dwarf':
-        distance = random.uniform(0 , 20)
-        period = random.uniform(30 , 200)
+        distance = rng.uniform(0 , 20)
+        period = rng.uniform(30 , 200)
     else:
-        distance = random.uniform(0 , 50)
-        period = random.uniform(50 , 500)
-    offset = random.uniform(0 , 360)
+        distance = rng.uniform(0 , 50)
+        period = rng.uniform(50 , 500)
+    offset = rng.uniform(0 , 360)
     return distance , period , offset
 
 
-def get_star_data(star_class: str) -> Dict:
+def get_star_data(star_class: str, rng=random) -> Dict:
     """Select random star data."""
     matching_stars = [s for s in star_image if s['class'] == star_class]
     if matching_stars:
-        return random.choice(matching_stars)
+        return rng.choice(matching_stars)
     logging.warning(f"No matching star class {star_class}, using fallback O-giant")
     return star_image[0]  # Fallback to O-giant
 
 
-def generate_planets_from_zones(star_habitability: int) -> List[Dict]:
-    """Generate planets based on planetary zones."""
+def generate_planets_from_zones(star_habitability: int, rng=random) -> List[Dict]:
+    """Generate planets based on planetary zones.
+
+    Uses the memoized zone_plan of the star and makes the same random draws, in
+    the same order, as generate_planets_from_zones_scan.
+    """
+    logging.debug(f"Generating planets with star_habitability: {star_habitability}")
+    planets = []
+    for zone_name, min_dist, max_dist, kinds in zone_plan(star_habitability):
+        logging.debug(f"Processing zone {zone_name}: min_dist={min_dist}, max_dist={max_dist}")
+        logging.debug(f"Zone {zone_name}: n_terrestrial={kinds[0][1]}, n_gas={kinds[1][1]}, n_ice={kinds[2][1]}")
+        for classes, n_max in kinds:
+            for _ in range(rng.randint(0, n_max)):
+                planets.append({'class': rng.choice(classes), 'distance': rng.uniform(min_dist, max_dist)})
+
+    logging.debug(f"Generated {len(planets)} planets")
+    return planets
+
+
+def generate_planets_from_zones_scan(star_habitability: int) -> List[Dict]:
+    """Original per-call zone scan; kept as the reference for generate_planets_from_zones."""
     logging.debug(f"Generating planets with star_habitability: {star_habitability}")
     planets = []
     scale = math.sqrt(1000 / max(1.0 , star_habitability))  # Scale distances by star
@@ -337,10 +415,23 @@ def generate_system_old(row: pd.Series) -> str:
     return '\n'.join(output) + '\n'
 
 
-def generate_system(row: pd.Series) -> str:
-    system_name, _ = get_system_name(row)
-    star_class = str(row.get('star_image_key', 'G'))
-    binary = float(row.get('binary_candidate', 0.0))
+def generate_system(row: pd.Series, rng=random, np_rng=np.random, system_name=None) -> str:
+    """Endless Sky system block for a catalogue row.
+
+    rng (random.Random-like) and np_rng (numpy Generator-like) make all the
+    random draws; by default the global random and np.random states. A
+    system_name given is used in place of get_system_name's.
+    """
+    if system_name is None:
+        system_name, _ = get_system_name(row)
+    return system_block(system_name, row.get('star_image_key', 'G'), row.get('binary_candidate', 0.0),
+                        row.get('flat_x', 0.0), row.get('flat_y', 0.0), rng, np_rng)
+
+
+def system_block(system_name: str, star_class, binary, flat_x, flat_y, rng=random, np_rng=np.random) -> str:
+    """generate_system from plain column values."""
+    star_class = str(star_class)
+    binary = float(binary)
 
     total_habitability = 0
     system_minables = set()
@@ -348,33 +439,33 @@ def generate_system(row: pd.Series) -> str:
     object_lines = []
 
     # Primary star
-    primary_star = get_star_data(star_class)
-    primary_sprite = random.choice(primary_star['sprites'])
+    primary_star = get_star_data(star_class, rng)
+    primary_sprite = rng.choice(primary_star['sprites'])
     primary_type = primary_star['type']
     total_habitability += primary_star['base_habitability']
-    attributes = get_star_attributes(star_class, primary_type)
+    attributes = get_star_attributes(star_class, primary_type, rng)
 
     object_lines.append('\tobject')
     object_lines.append(f'\t\tsprite "{primary_sprite}"')
-    distance, period, offset = get_star_params(primary_type)
+    distance, period, offset = get_star_params(primary_type, rng)
     object_lines.append(f'\t\tdistance {distance:.2f}')
     object_lines.append(f'\t\tperiod {period:.2f}')
     object_lines.append(f'\t\toffset {offset:.0f}')
 
     # Binary star
     if binary > 0.5:
-        secondary_star = random.choice(star_image)
-        secondary_sprite = random.choice(secondary_star['sprites'])
+        secondary_star = rng.choice(star_image)
+        secondary_sprite = rng.choice(secondary_star['sprites'])
         secondary_type = secondary_star['type']
         object_lines.append('\tobject')
         object_lines.append(f'\t\tsprite "{secondary_sprite}"')
-        distance, period, offset = get_star_params(secondary_type)
-        object_lines.append(f'\t\tdistance {distance + random.uniform(10, 50):.2f}')
+        distance, period, offset = get_star_params(secondary_type, rng)
+        object_lines.append(f'\t\tdistance {distance + rng.uniform(10, 50):.2f}')
         object_lines.append(f'\t\tperiod {period * 2:.2f}')
-        object_lines.append(f'\t\toffset {offset + random.uniform(0, 180):.0f}')
+        object_lines.append(f'\t\toffset {offset + rng.uniform(0, 180):.0f}')
 
     # Generate planets
-    planets_data = generate_planets_from_zones(primary_star['base_habitability'])
+    planets_data = generate_planets_from_zones(primary_star['base_habitability'], rng)
 
     # Filter landables
     landable_planets = []
@@ -406,22 +497,22 @@ def generate_system(row: pd.Series) -> str:
         # Begin planet block
         planet_block = []
         planet_block.append(f'\tobject {planet_name}' if planet_name else '\tobject')
-        planet_block.append(f'\t\tsprite "{random.choice(p_data["planet_sprites"])}"')
+        planet_block.append(f'\t\tsprite "{rng.choice(p_data["planet_sprites"])}"')
         orbital_dist = planet['distance'] * 100
         planet_block.append(f'\t\tdistance {orbital_dist:.2f}')
-        planet_block.append(f'\t\tperiod {random.uniform(100, 1000):.2f}')
+        planet_block.append(f'\t\tperiod {rng.uniform(100, 1000):.2f}')
 
         # Add moons (properly nested)
         scale = math.sqrt(1000 / max(1.0, primary_star['base_habitability']))
         zone_name = next((z for z, z_data in planetary_zones.items()
                           if z_data['distance_range_au'][0] * scale <= planet['distance'] <=
                           z_data['distance_range_au'][1] * scale), None)
-        moon_count = np.random.poisson(planetary_zones[zone_name]['average_major_moons']) if zone_name else 0
+        moon_count = np_rng.poisson(planetary_zones[zone_name]['average_major_moons']) if zone_name else 0
         for _ in range(moon_count):
             planet_block.append(f'\t\tobject')
-            planet_block.append(f'\t\t\tsprite "planet/moon{random.randint(0, 3)}"')
-            planet_block.append(f'\t\t\tdistance {random.uniform(0.1, 0.5):.2f}')
-            planet_block.append(f'\t\t\tperiod {random.uniform(10, 50):.2f}')
+            planet_block.append(f'\t\t\tsprite "planet/moon{rng.randint(0, 3)}"')
+            planet_block.append(f'\t\t\tdistance {rng.uniform(0.1, 0.5):.2f}')
+            planet_block.append(f'\t\t\tperiod {rng.uniform(10, 50):.2f}')
 
         object_lines.extend(planet_block)
         planet_idx += 1
@@ -429,33 +520,33 @@ def generate_system(row: pd.Series) -> str:
     # Add station
     landable_count += 1
     object_lines.append(f'\tobject "{system_name}-Station"')
-    object_lines.append(f'\t\tsprite "planet/station/station{random.randint(0, 2)}"')
-    object_lines.append(f'\t\tdistance {random.uniform(500, 1000):.0f}')
-    object_lines.append(f'\t\tperiod {random.uniform(500, 1500):.0f}')
+    object_lines.append(f'\t\tsprite "planet/station/station{rng.randint(0, 2)}"')
+    object_lines.append(f'\t\tdistance {rng.uniform(500, 1000):.0f}')
+    object_lines.append(f'\t\tperiod {rng.uniform(500, 1500):.0f}')
 
     # System header
     scale = math.sqrt(1000 / max(1.0, primary_star['base_habitability']))
     output = [
         f'system "{system_name}"',
-        f'\tpos {row.get("flat_x", 0.0):.1f} {row.get("flat_y", 0.0):.1f}',
+        f'\tpos {flat_x:.1f} {flat_y:.1f}',
         '\tgovernment Republic',
         f'\tattributes "{attributes}"',
         '\tarrival none',
         '\tlink none',
         f'\thabitable {total_habitability:.1f}',
-        f'\tbelt {random.randint(1000, 3000) * scale:.0f}'
+        f'\tbelt {rng.randint(1000, 3000) * scale:.0f}'
     ]
 
     # Asteroids
-    asteroid_count = random.randint(2, 5)
+    asteroid_count = rng.randint(2, 5)
     if any(z for z in planets_data if
            planetary_zones['asteroid_belt_zone']['distance_range_au'][0] * scale <= z['distance'] <=
            planetary_zones['asteroid_belt_zone']['distance_range_au'][1] * scale):
-        asteroid_count += random.randint(1, 3)
+        asteroid_count += rng.randint(1, 3)
     for _ in range(asteroid_count):
-        a_type = random.choice(asteroid_types)
-        count = random.randint(1, 50)
-        speed = random.uniform(1.0, 6.0)
+        a_type = rng.choice(asteroid_types)
+        count = rng.randint(1, 50)
+        speed = rng.uniform(1.0, 6.0)
         output.append(f'\tasteroids "{a_type}" {count} {speed:.2f}')
 
     # Minables
@@ -463,13 +554,13 @@ def generate_system(row: pd.Series) -> str:
         system_minables.update([m for m in z_data['dominant_materials'] if m in valid_minables])
     system_minables = sorted([m for m in system_minables if m in valid_minables])
     for minable in system_minables:
-        count = random.randint(1, 20)
-        speed = random.uniform(2.0, 6.0)
+        count = rng.randint(1, 20)
+        speed = rng.uniform(2.0, 6.0)
         output.append(f'\tminables {minable} {count} {speed:.2f}')
 
     # Trade
     for trade_item in sorted(all_trade_goods):
-        value = random.randint(200, 600)
+        value = rng.randint(200, 600)
         trade_name = f'"{trade_item}"' if ' ' in trade_item else trade_item
         output.append(f'\ttrade {trade_name} {value}')
 
@@ -485,14 +576,535 @@ def generate_system(row: pd.Series) -> str:
 
     return '\n'.join(output) + '\n'
 
+# Catalogue columns read by generate_system
+SYSTEM_COLUMNS = ['source_id', 'sinbad_name', 'Name_two', '2D_sector', 'star_image_key', 'binary_candidate', 'flat_x', 'flat_y']
+# (column, default when the catalogue lacks it) of the system_block arguments
+SYSTEM_BLOCK_COLUMNS = [('star_image_key', 'G'), ('binary_candidate', 0.0), ('flat_x', 0.0), ('flat_y', 0.0)]
+SYSTEM_NAME_COLUMNS = [('sinbad_name', ''), ('Name_two', ''), ('2D_sector', 'S000')]
+
+
+# === Batch generation ===
+def _column_values(columns, name: str, default, n: int) -> list:
+    """A column as a list of Python values, or n defaults when it is missing."""
+    if name not in columns:
+        return [default] * n
+    values = columns[name]
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+def system_names_batch(columns, n: int) -> List[str]:
+    """get_system_name of every row of a DataFrame or a mapping of column arrays, in row order."""
+    sinbad, name_two, sector = (_column_values(columns, name, default, n) for name, default in SYSTEM_NAME_COLUMNS)
+    return [system_name_from(*values)[0] for values in zip(sinbad, name_two, sector)]
+
+
+def generate_systems_batch(columns, n=None, system_names=None, rngs=None) -> List[str]:
+    """generate_system for every row of a DataFrame or a mapping of column arrays.
+
+    The columns are turned into plain lists once and the rows are zipped from
+    them, so no Series is built per row. rngs is a list of (rng, np_rng) per
+    row; by default all rows draw from the global random and np.random states.
+    """
+    if n is None:
+        n = len(columns) if isinstance(columns, pd.DataFrame) else len(next(iter(columns.values())))
+    if system_names is None:
+        system_names = system_names_batch(columns, n)
+    if rngs is None:
+        rngs = [(random, np.random)] * n
+    block_values = [_column_values(columns, name, default, n) for name, default in SYSTEM_BLOCK_COLUMNS]
+    return [system_block(system_name, *values, *row_rngs)
+            for system_name, row_rngs, *values in zip(system_names, rngs, *block_values)]
+
+
+# === Vectorized sampling ===
+# With vectorized on, each chunk of systems draws all its random values (star
+# picks, orbits, planets, moons, asteroids, minables, trade prices) with a few
+# array operations, and only the text is built per system. The values follow the
+# same distributions as system_block's draws but come from SystemStreams, one
+# counter-based stream per system keyed by (GEN_SEED, source_id): the map depends
+# on the seed only, not on the chunk sizes or the number of workers.
+vectorized = False
+
+STAR_TYPE_RANGES = {'giant': ((10, 100), (200, 1000)), 'dwarf': ((0, 20), (30, 200))}  # distance, period
+DEFAULT_STAR_RANGES = ((0, 50), (50, 500))
+DWARF_ATTRIBUTES = ['dwarf star', 'small star']
+STAR_SPRITE_COUNT = np.array([len(s['sprites']) for s in star_image])
+STAR_HABITABILITY = np.array([s['base_habitability'] for s in star_image])
+STAR_RANGES = np.array([STAR_TYPE_RANGES.get(s['type'], DEFAULT_STAR_RANGES) for s in star_image], dtype=float)
+STARS_BY_CLASS = {star_class: [k for k, s in enumerate(star_image) if s['class'] == star_class]
+                  for star_class in dict.fromkeys(s['class'] for s in star_image)}
+PLANET_CLASS_NAMES = list(planet_classes)
+CLASS_SPRITE_COUNT = np.array([len(planet_classes[c]['planet_sprites']) for c in PLANET_CLASS_NAMES])
+CLASS_HABITABILITY = np.array([planet_classes[c]['base_habitability'] for c in PLANET_CLASS_NAMES])
+CLASS_LANDABLE = np.array([planet_classes[c]['base_habitability'] >= 3000 or c in ['M', 'G', 'L']
+                           for c in PLANET_CLASS_NAMES])
+# Minables as bits, in sorted order: those of every zone, and those each planet class adds
+MINABLE_NAMES = sorted(set(valid_minables))
+ZONE_MINABLE_MASK = sum(1 << k for k, m in enumerate(MINABLE_NAMES)
+                        if any(m in z_data['dominant_materials'] for z_data in planetary_zones.values()))
+CLASS_MINABLE_MASK = np.array([sum(1 << k for k, m in enumerate(MINABLE_NAMES)
+                                   if m in planet_classes[c]['dominant_materials']) for c in PLANET_CLASS_NAMES],
+                              dtype=np.int64)
+TRADE_GOODS = sorted(all_trade_goods)
+
+
+def _plan_tables(habitabilities):
+    """Per star habitability, the (zone, planet kind) slots of its zone_plan as arrays.
+
+    Returns n_max, min_dist, max_dist of shape (H, K), the slot classes as
+    PLANET_CLASS_NAMES indices padded to (H, K, C), and their counts (H, K).
+    """
+    plans = [[(min_dist, max_dist, classes, n)
+              for _, min_dist, max_dist, kinds in zone_plan(h) for classes, n in kinds] for h in habitabilities]
+    width = max([len(classes) for plan in plans for _, _, classes, _ in plan] + [1])
+    n_max = np.array([[n for _, _, _, n in plan] for plan in plans], dtype=np.int64)
+    min_dist = np.array([[lo for lo, _, _, _ in plan] for plan in plans])
+    max_dist = np.array([[hi for _, hi, _, _ in plan] for plan in plans])
+    n_classes = np.array([[len(classes) for _, _, classes, _ in plan] for plan in plans], dtype=np.int64)
+    class_idx = np.zeros(n_max.shape + (width,), dtype=np.int64)
+    for g, plan in enumerate(plans):
+        for k, (_, _, classes, _) in enumerate(plan):
+            class_idx[g, k, :len(classes)] = [PLANET_CLASS_NAMES.index(c) for c in classes]
+    return n_max, min_dist, max_dist, class_idx, n_classes
+
+
+def _offsets(counts) -> np.ndarray:
+    """Start of each group in a flat array of groups of the given sizes, plus the total at the end."""
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def _members(start) -> Tuple[np.ndarray, np.ndarray]:
+    """For a flat array grouped by offsets, the group of each element and its position in the group."""
+    start = np.asarray(start, dtype=np.int64)
+    group = np.repeat(np.arange(len(start) - 1), np.diff(start))
+    return group, np.arange(start[-1]) - start[group]
+
+
+SPLITMIX_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix64(z: np.ndarray) -> np.ndarray:
+    """splitmix64's output function over uint64 arrays (wrapping arithmetic)."""
+    z = np.asarray(z, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class SystemStreams:
+    """Independent random streams of a batch of systems, drawn for all of them at once.
+
+    Each system has a 64-bit key. Draw `index` at a named draw site is splitmix64
+    of the key at counter (site << 32) + index, so every value depends only on
+    the system's key, the site and the index, and not on which other systems
+    are drawn with it or in what order. owner picks the system of each value
+    (all of them, once each, by default) and index its number at the site.
+    """
+
+    def __init__(self, keys):
+        self.keys = np.asarray(keys, dtype=np.uint64)
+
+    @classmethod
+    def from_ids(cls, seed: int, source_ids) -> 'SystemStreams':
+        """Streams keyed by (seed, source_id), like system_rngs."""
+        ids = np.asarray(source_ids, dtype=np.int64).view(np.uint64)
+        seed_key = _mix64(np.uint64(seed % (1 << 64)) + SPLITMIX_GAMMA)
+        return cls(_mix64(_mix64(ids + SPLITMIX_GAMMA) ^ seed_key))
+
+    @classmethod
+    def unseeded(cls, n: int) -> 'SystemStreams':
+        return cls(np.random.default_rng().integers(0, np.iinfo(np.uint64).max, n, dtype=np.uint64, endpoint=True))
+
+    def _bits(self, site: str, owner, index) -> np.ndarray:
+        owner = np.arange(len(self.keys)) if owner is None else np.asarray(owner)
+        index = np.zeros(owner.shape, dtype=np.uint64) if index is None else np.asarray(index).astype(np.uint64)
+        counter = (np.uint64(zlib.crc32(site.encode())) << np.uint64(32)) + index
+        return _mix64(self.keys[owner] + counter * SPLITMIX_GAMMA)
+
+    def random(self, site: str, owner=None, index=None) -> np.ndarray:
+        """Uniform floats in [0, 1)."""
+        return (self._bits(site, owner, index) >> np.uint64(11)) * (1.0 / (1 << 53))
+
+    def uniform(self, site: str, low, high, owner=None, index=None) -> np.ndarray:
+        return low + (np.asarray(high) - low) * self.random(site, owner, index)
+
+    def integers(self, site: str, low, high=None, owner=None, index=None) -> np.ndarray:
+        """Integers in [low, high), or [0, low) without high, like Generator.integers."""
+        if high is None:
+            low, high = 0, low
+        span = np.asarray(high) - np.asarray(low)
+        return (np.asarray(low) + np.floor(span * self.random(site, owner, index))).astype(np.int64)
+
+    def poisson(self, site: str, lam, owner=None, index=None) -> np.ndarray:
+        """Poisson counts of mean lam by inversion of the CDF."""
+        lam = np.asarray(lam, dtype=float)
+        u = self.random(site, owner, index)
+        count = np.zeros(u.shape, dtype=np.int64)
+        term = np.exp(-lam)
+        cdf = term.copy()
+        active = u >= cdf
+        while active.any():
+            count[active] += 1
+            term[active] *= lam[active] / count[active]
+            cdf[active] += term[active]
+            active &= (u >= cdf) & (term > 0)
+        return count
+
+
+def sample_systems(star_classes, binary, streams: SystemStreams) -> dict:
+    """Draw the random values of len(star_classes) systems at once.
+
+    Per-planet, per-moon, per-asteroid and per-minable values are flat arrays
+    with *_start offsets per system (or per planet, for moons).
+    """
+    n = len(star_classes)
+    star_classes = np.asarray(star_classes, dtype=object)
+
+    # Stars: primary by class (the O-giant fallback for unknown ones) and a secondary for binaries
+    star = np.zeros(n, dtype=np.int64)
+    pick = streams.random('star')
+    for star_class in sorted(set(star_classes.tolist())):
+        members = np.flatnonzero(star_classes == star_class)
+        options = STARS_BY_CLASS.get(star_class)
+        if options is None:
+            logging.warning(f"No matching star class {star_class}, using fallback O-giant for {len(members)} systems")
+            continue
+        star[members] = np.asarray(options)[(pick[members] * len(options)).astype(np.int64)]
+    secondary = streams.integers('secondary', len(star_image))
+    s = {'star': star, 'binary': np.asarray(binary, dtype=float) > 0.5, 'secondary': secondary}
+    for prefix, which in (('primary', star), ('secondary', secondary)):
+        ranges = STAR_RANGES[which]
+        s[f'{prefix}_sprite'] = streams.integers(f'{prefix}_sprite', STAR_SPRITE_COUNT[which])
+        s[f'{prefix}_distance'] = streams.uniform(f'{prefix}_distance', ranges[:, 0, 0], ranges[:, 0, 1])
+        s[f'{prefix}_period'] = streams.uniform(f'{prefix}_period', ranges[:, 1, 0], ranges[:, 1, 1])
+        s[f'{prefix}_offset'] = streams.uniform(f'{prefix}_offset', 0, 360)
+    s['dwarf_word'] = streams.integers('dwarf_word', len(DWARF_ATTRIBUTES))
+    s['secondary_extra_distance'] = streams.uniform('secondary_extra_distance', 10, 50)
+    s['secondary_extra_offset'] = streams.uniform('secondary_extra_offset', 0, 180)
+
+    # Planets: a count per (zone, kind) slot, then a class and distance per planet
+    habitability = STAR_HABITABILITY[star]
+    scale = np.sqrt(1000 / np.maximum(1.0, habitability))
+    habitabilities, group = np.unique(habitability, return_inverse=True)
+    n_max, min_dist, max_dist, class_idx, n_classes = _plan_tables(habitabilities.tolist())
+    n_slots = n_max.shape[1]
+    slot_counts = streams.integers('slot_count', 0, n_max[group] + 1, owner=np.repeat(np.arange(n), n_slots)
+                                   .reshape(n, n_slots), index=np.tile(np.arange(n_slots), (n, 1)))
+    flat_slot = np.repeat(np.arange(slot_counts.size), slot_counts.ravel())
+    planet_system, slot = np.divmod(flat_slot, n_slots)
+    planet_group = group[planet_system]
+    planet_start = _offsets(slot_counts.sum(axis=1))
+    planet = dict(owner=planet_system, index=np.arange(len(planet_system)) - planet_start[planet_system])
+    pick = streams.integers('planet_class', np.maximum(n_classes[planet_group, slot], 1), **planet)
+    planet_class = class_idx[planet_group, slot, pick]
+    planet_distance = streams.uniform('planet_distance', min_dist[planet_group, slot], max_dist[planet_group, slot],
+                                      **planet)
+    n_planets = len(planet_class)
+    s.update(planet_start=planet_start, planet_class=planet_class, planet_distance=planet_distance,
+             planet_sprite=streams.integers('planet_sprite', CLASS_SPRITE_COUNT[planet_class], **planet),
+             planet_period=streams.uniform('planet_period', 100, 1000, **planet))
+
+    # Moons, from the first zone (in table order) whose scaled range holds the planet
+    planet_scale = scale[planet_system]
+    moon_mean = np.zeros(n_planets)
+    placed = np.zeros(n_planets, dtype=bool)
+    for z_data in planetary_zones.values():
+        lo, hi = z_data['distance_range_au']
+        inside = ~placed & (lo * planet_scale <= planet_distance) & (planet_distance <= hi * planet_scale)
+        moon_mean[inside] = z_data['average_major_moons']
+        placed |= inside
+    moon_count = streams.poisson('moon_count', moon_mean, **planet)
+    moon_start = _offsets(moon_count)
+    moon_system = planet_system[_members(moon_start)[0]]
+    moon = dict(owner=moon_system, index=np.arange(moon_start[-1]) - moon_start[planet_start[moon_system]])
+    s.update(moon_start=moon_start, moon_sprite=streams.integers('moon_sprite', 0, 4, **moon),
+             moon_distance=streams.uniform('moon_distance', 0.1, 0.5, **moon),
+             moon_period=streams.uniform('moon_period', 10, 50, **moon))
+
+    # Landable planets (at least the first one) and the system's habitability
+    landable = CLASS_LANDABLE[planet_class]
+    has_landable = np.bincount(planet_system, weights=landable, minlength=n) > 0
+    first = s['planet_start'][:-1]
+    needs_one = ~has_landable & (s['planet_start'][1:] > first)
+    landable[first[needs_one]] = True
+    s['landable'] = landable
+    s['habitability'] = habitability + np.bincount(planet_system, weights=CLASS_HABITABILITY[planet_class] * landable,
+                                                   minlength=n)
+
+    # Station and belt
+    s.update(station_sprite=streams.integers('station_sprite', 0, 3),
+             station_distance=streams.uniform('station_distance', 500, 1000),
+             station_period=streams.uniform('station_period', 500, 1500),
+             belt=streams.integers('belt', 1000, 3001) * scale)
+
+    # Asteroids, with extra ones when a planet orbits in the asteroid belt zone
+    lo, hi = planetary_zones['asteroid_belt_zone']['distance_range_au']
+    in_belt = (lo * planet_scale <= planet_distance) & (planet_distance <= hi * planet_scale)
+    asteroid_count = streams.integers('asteroid_count', 2, 6) + np.where(
+        np.bincount(planet_system, weights=in_belt, minlength=n) > 0, streams.integers('belt_asteroids', 1, 4), 0)
+    asteroid_start = _offsets(asteroid_count)
+    asteroid = dict(zip(('owner', 'index'), _members(asteroid_start)))
+    s.update(asteroid_start=asteroid_start,
+             asteroid_type=streams.integers('asteroid_type', len(asteroid_types), **asteroid),
+             asteroid_amount=streams.integers('asteroid_amount', 1, 51, **asteroid),
+             asteroid_speed=streams.uniform('asteroid_speed', 1.0, 6.0, **asteroid))
+
+    # Minables of the zones and of the planets
+    minable_mask = np.full(n, ZONE_MINABLE_MASK, dtype=np.int64)
+    np.bitwise_or.at(minable_mask, planet_system, CLASS_MINABLE_MASK[planet_class])
+    minable_bits = (minable_mask[:, None] >> np.arange(len(MINABLE_NAMES))) & 1
+    minable_start = _offsets(minable_bits.sum(axis=1))
+    minable = dict(zip(('owner', 'index'), _members(minable_start)))
+    s.update(minable_bits=minable_bits, minable_start=minable_start,
+             minable_amount=streams.integers('minable_amount', 1, 21, **minable),
+             minable_speed=streams.uniform('minable_speed', 2.0, 6.0, **minable))
+
+    n_goods = len(TRADE_GOODS)
+    s['trade'] = streams.integers('trade', 200, 601, owner=np.repeat(np.arange(n), n_goods).reshape(n, n_goods),
+                                  index=np.tile(np.arange(n_goods), (n, 1)))
+    return s
+
+
+FLEET_LINES = ['\tfleet "Small Northern Planets" 300',
+               '\tfleet "Small Republic Planets" 600',
+               '\tfleet "Small Fields Merchants" 400']
+TRADE_NAMES = [f'"{trade_item}"' if ' ' in trade_item else trade_item for trade_item in TRADE_GOODS]
+
+
+def _split(lines: list, start: list) -> list:
+    """Flat lines grouped by offsets: the lines of group g are lines[start[g]:start[g + 1]]."""
+    return [lines[a:b] for a, b in zip(start[:-1], start[1:])]
+
+
+def format_sampled_systems(s: dict, system_names, star_classes, flat_x, flat_y) -> List[str]:
+    """The system_block text of every system of a sample_systems draw.
+
+    Each kind of line is formatted in one pass over its flat value lists, then
+    every system is joined from its slices of them.
+    """
+    s = {key: values.tolist() for key, values in s.items()}
+    n = len(system_names)
+
+    moon_text = [f'\t\tobject\n\t\t\tsprite "planet/moon{sprite}"\n\t\t\tdistance {distance:.2f}\n\t\t\tperiod {period:.2f}'
+                 for sprite, distance, period in zip(s['moon_sprite'], s['moon_distance'], s['moon_period'])]
+    planet_moons = _split(moon_text, s['moon_start'])
+    planet_text = []
+    for i, (p0, p1) in enumerate(zip(s['planet_start'][:-1], s['planet_start'][1:])):
+        for p in range(p0, p1):
+            p_data = planet_classes[PLANET_CLASS_NAMES[s['planet_class'][p]]]
+            lines = [f'\tobject {system_names[i]}-{to_roman(p - p0 + 1)}' if s['landable'][p] else '\tobject',
+                     f'\t\tsprite "{p_data["planet_sprites"][s["planet_sprite"][p]]}"',
+                     f'\t\tdistance {s["planet_distance"][p] * 100:.2f}',
+                     f'\t\tperiod {s["planet_period"][p]:.2f}']
+            planet_text.append('\n'.join(lines + planet_moons[p]))
+    system_planets = _split(planet_text, s['planet_start'])
+
+    asteroid_text = _split([f'\tasteroids "{asteroid_types[a_type]}" {amount} {speed:.2f}' for a_type, amount, speed in
+                            zip(s['asteroid_type'], s['asteroid_amount'], s['asteroid_speed'])], s['asteroid_start'])
+    _, minable_bit = np.nonzero(np.asarray(s['minable_bits']))
+    minable_text = _split([f'\tminables {MINABLE_NAMES[bit]} {amount} {speed:.2f}' for bit, amount, speed in
+                           zip(minable_bit.tolist(), s['minable_amount'], s['minable_speed'])], s['minable_start'])
+    trade_text = ['\n'.join([f'\ttrade {name} {value}' for name, value in zip(TRADE_NAMES, values)])
+                  for values in s['trade']]
+
+    systems = []
+    for i in range(n):
+        system_name = system_names[i]
+        star_class = str(star_classes[i])
+        primary_star = star_image[s['star'][i]]
+        primary_type = primary_star['type']
+        if primary_type == 'dwarf':
+            attributes = DWARF_ATTRIBUTES[s['dwarf_word'][i]]
+        else:
+            attributes = get_star_attributes(star_class, primary_type)
+        output = [
+            f'system "{system_name}"',
+            f'\tpos {flat_x[i]:.1f} {flat_y[i]:.1f}',
+            '\tgovernment Republic',
+            f'\tattributes "{attributes}"',
+            '\tarrival none',
+            '\tlink none',
+            f'\thabitable {s["habitability"][i]:.1f}',
+            f'\tbelt {s["belt"][i]:.0f}',
+            *asteroid_text[i],
+            *minable_text[i],
+            trade_text[i],
+            *FLEET_LINES,
+            '\tobject',
+            f'\t\tsprite "{primary_star["sprites"][s["primary_sprite"][i]]}"',
+            f'\t\tdistance {s["primary_distance"][i]:.2f}',
+            f'\t\tperiod {s["primary_period"][i]:.2f}',
+            f'\t\toffset {s["primary_offset"][i]:.0f}',
+        ]
+        if s['binary'][i]:
+            secondary_star = star_image[s['secondary'][i]]
+            output += [
+                '\tobject',
+                f'\t\tsprite "{secondary_star["sprites"][s["secondary_sprite"][i]]}"',
+                f'\t\tdistance {s["secondary_distance"][i] + s["secondary_extra_distance"][i]:.2f}',
+                f'\t\tperiod {s["secondary_period"][i] * 2:.2f}',
+                f'\t\toffset {s["secondary_offset"][i] + s["secondary_extra_offset"][i]:.0f}',
+            ]
+        output += system_planets[i]
+        output += [f'\tobject "{system_name}-Station"',
+                   f'\t\tsprite "planet/station/station{s["station_sprite"][i]}"',
+                   f'\t\tdistance {s["station_distance"][i]:.0f}',
+                   f'\t\tperiod {s["station_period"][i]:.0f}']
+        systems.append('\n'.join(output) + '\n')
+    return systems
+
+
+def generate_systems_vectorized(columns, n=None, system_names=None, streams=None) -> List[str]:
+    """generate_systems_batch with all random values drawn up front by sample_systems.
+
+    streams is a SystemStreams over the rows; by default each row gets an unseeded stream.
+    """
+    if n is None:
+        n = len(columns) if isinstance(columns, pd.DataFrame) else len(next(iter(columns.values())))
+    if system_names is None:
+        system_names = system_names_batch(columns, n)
+    if streams is None:
+        streams = SystemStreams.unseeded(n)
+    star_class, binary, flat_x, flat_y = (_column_values(columns, name, default, n)
+                                          for name, default in SYSTEM_BLOCK_COLUMNS)
+    star_class = [str(c) for c in star_class]
+    s = sample_systems(star_class, [float(b) for b in binary], streams)
+    return format_sampled_systems(s, system_names, star_class, flat_x, flat_y)
+
+# === Seeded parallel generation ===
+# With seeded on, every system draws from its own RNG streams derived from
+# (GEN_SEED, source_id), so a map is reproducible and the output does not depend
+# on row chunking or on how many worker processes generate it.
+seeded = False
+GEN_SEED = 0
+gen_workers = os.cpu_count()
+GEN_CHUNK_ROWS = 5000
+
+
+def system_rngs(seed: int, source_id: int):
+    """(random.Random, numpy Generator) pair for one system, each seeded from its own
+    child of SeedSequence([seed, source_id]) so the two streams are independent."""
+    py_seq, np_seq = np.random.SeedSequence([seed, source_id]).spawn(2)
+    rng = random.Random(int.from_bytes(py_seq.generate_state(4, np.uint64).tobytes(), 'little'))
+    return rng, np.random.default_rng(np_seq)
+
+
+def _generate_chunk(chunk) -> List[str]:
+    """System blocks of one chunk: the seed, column lists, system names and source_ids of its
+    rows, and whether to sample them vectorized."""
+    seed, columns, system_names, source_ids, sample_vectorized = chunk
+    if sample_vectorized:
+        return generate_systems_vectorized(columns, len(source_ids), system_names,
+                                           SystemStreams.from_ids(seed, source_ids))
+    rngs = [system_rngs(seed, source_id) for source_id in source_ids]
+    return generate_systems_batch(columns, len(source_ids), system_names, rngs)
+
+
+def _seeded_chunks(frames, seed: int, chunk_rows: int, sample_vectorized: bool = False):
+    """_generate_chunk work items of at most chunk_rows rows over DataFrames in row order.
+
+    System names are assigned here, in row order, because the sector fallback
+    names count up across rows. Rows are keyed by source_id, or by their
+    position when the catalogue has none.
+    """
+    position = 0
+    for df in frames:
+        if 'source_id' in df.columns:
+            source_ids = df['source_id'].astype(np.int64).tolist()
+        else:
+            if position == 0:
+                logging.warning("No source_id column, seeding systems by row position")
+            source_ids = list(range(position, position + len(df)))
+        columns = {name: df[name].tolist() for name, _ in SYSTEM_BLOCK_COLUMNS if name in df.columns}
+        names = system_names_batch(df, len(df))
+        for start in range(0, len(df), chunk_rows):
+            stop = start + chunk_rows
+            yield (seed, {name: values[start:stop] for name, values in columns.items()},
+                   names[start:stop], source_ids[start:stop], sample_vectorized)
+        position += len(df)
+
+
+def generate_systems_seeded(df, seed: int = GEN_SEED, workers=None, chunk_rows: int = GEN_CHUNK_ROWS,
+                            sample_vectorized: bool = False):
+    """Yield the system block of every row, in row order, with per-system seeded RNGs.
+
+    df is a DataFrame or an iterable of DataFrames (catalogue chunks). Chunks of
+    rows go to a process pool, with at most two per worker in flight, so
+    memory stays bounded for a streamed catalogue. With sample_vectorized, each
+    chunk is drawn by generate_systems_vectorized from SystemStreams keyed by
+    (seed, source_id) instead.
+    """
+    frames = [df] if isinstance(df, pd.DataFrame) else df
+    chunks = _seeded_chunks(frames, seed, chunk_rows, sample_vectorized)
+    logging.info(f"Generating systems in chunks of {chunk_rows} rows with seed {seed}")
+    if workers is None or workers <= 1:
+        for chunk in chunks:
+            yield from _generate_chunk(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_generate_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+# === Streaming output ===
+# With stream on, main() reads the catalogue in CHUNK_ROWS chunks and writes each
+# system as it is generated, so memory does not grow with the catalogue. An
+# output name ending in .gz or .zst is compressed (zstd needs zstandard).
+stream = False
+CHUNK_ROWS = 50000
+OUTPUT_COMPRESSION = 'infer'
+
+
+def iter_systems(frames):
+    """System blocks of every row of a sequence of catalogue DataFrames, as main() generates them."""
+    if seeded or vectorized:
+        yield from generate_systems_seeded(frames, GEN_SEED, gen_workers, sample_vectorized=vectorized)
+        return
+    for df in frames:
+        logging.debug(f"Processing rows {df.index[0]} to {df.index[-1]}" if len(df) else "Empty chunk")
+        yield from generate_systems_batch(df)
+
+
+def write_systems(systems, output_file: str, compression=OUTPUT_COMPRESSION) -> int:
+    """Write system blocks separated by blank lines as they come; returns how many were written."""
+    count = 0
+    with open_text_output(output_file, compression) as f:
+        for system_output in systems:
+            if count:
+                f.write('\n\n')
+            f.write(system_output)
+            count += 1
+    return count
+
+
 def main():
     """Generate systems from CSV."""
     logging.info("Starting script execution")
     csv_path = r"C:/Users/luser/OneDrive/Python_script/GAIA/GAIA_Plus.csv"
     logging.info(f"Attempting to read CSV: {os.path.abspath(csv_path)}")
+    output_file = r'C:\Apps\Scripted\GAIA\GAIA_Plus_map_systems_new.txt'
+
+    if stream:
+        try:
+            count = write_systems(iter_systems(iter_catalogue(csv_path, CHUNK_ROWS, columns=SYSTEM_COLUMNS)),
+                                  output_file)
+        except FileNotFoundError as e:
+            logging.error(f"CSV file not found: {e}")
+            return
+        except Exception as e:
+            logging.error(f"Failed to generate systems: {e}")
+            return
+        logging.info(f"Generated {count} systems, written to {os.path.abspath(output_file)}")
+        return
 
     try:
-        df = pd.read_csv(csv_path)
+        df = read_catalogue(csv_path, columns=SYSTEM_COLUMNS)
         logging.info(f"CSV loaded successfully, {len(df)} rows")
     except FileNotFoundError as e:
         logging.error(f"CSV file not found: {e}")
@@ -508,18 +1120,10 @@ def main():
         logging.warning("CSV is empty, no systems will be generated")
         return
 
-    systems = []
-    for idx , row in df.iterrows():
-        logging.debug(f"Processing row {idx}: sinbad_name={row.get('sinbad_name' , 'N/A')}")
-        system_output = generate_system(row)
-        if system_output.strip():
-            systems.append(system_output)
-        else:
-            logging.warning(f"No output generated for row {idx}")
+    systems = list(iter_systems([df]))
 
     logging.info(f"Generated {len(systems)} systems")
 
-    output_file = r'C:\Apps\Scripted\GAIA\GAIA_Plus_map_systems_new.txt'
     try:
         with open(output_file , 'w' , encoding='utf-8') as f:
             f.write('\n\n'.join(systems))
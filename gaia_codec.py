@@ -0,0 +1,130 @@
+# Base64 cube / 2D grid codec shared by the GAIA_Plus pipeline stages.
+#
+# The scalar functions define the string formats. The *_array functions produce
+# exactly the same strings for whole columns at once, by packing the bytes into
+# one contiguous uint8 buffer and running a single b64encode/b64decode over it.
+# grid_key packs (grid_x, grid_y) into one int64 ((grid_x << 32) + grid_y), a
+# cheaper key than the 22-character base64_2D string for joins and groupbys.
+# Like the 128-bit value behind base64_2D it is a sum, so moving a cell by
+# (dx, dy) adds (dx << 32) + dy to its key. Both are signed: a negative
+# coordinate borrows from the one above it, and decoding reads the low part as
+# signed and gives the borrow back, so negative coordinates round-trip.
+
+import base64
+import numpy as np
+
+AXIS_MAX = 262143  # 18-bit range of one cube axis
+GRID_KEY_SHIFT = 32
+GRID_KEY_MASK = (1 << GRID_KEY_SHIFT) - 1
+
+
+# === Scalar codec ===
+def encode_axis(n) -> str:
+    """Encodes an integer 0–262,143 into 3-character Base64."""
+    n = max(0, min(int(n), AXIS_MAX))  # Clip to 18-bit range
+    b = bytes([(n >> 12) & 0x3F, (n >> 6) & 0x3F, n & 0x3F])
+    return base64.b64encode(b).decode('ascii')[:3]
+
+
+def encode_cube(x, y, z) -> str:
+    """Encodes 3D coordinates into a 9-character Base64 string."""
+    return encode_axis(x) + encode_axis(y) + encode_axis(z)
+
+
+def encode_2d(x: int, y: int) -> str:
+    x = int(x)
+    y = int(y)
+    val = (x << 64) + y  # 128-bit total
+    b = val.to_bytes(16, byteorder='big', signed=True)  # 16 bytes = 128 bits
+    return base64.b64encode(b).decode('ascii').rstrip('=')  # typically 22 chars
+
+
+def decode_2d(b64: str) -> tuple[int, int]:
+    b64 += '=' * ((4 - len(b64) % 4) % 4)  # Pad to multiple of 4
+    val = int.from_bytes(base64.b64decode(b64), byteorder='big', signed=True)
+    y = ((val + (1 << 63)) & ((1 << 64) - 1)) - (1 << 63)  # signed low 64 bits
+    x = (val - y) >> 64
+    return x, y
+
+
+# === Column codec ===
+def _b64_records(records: np.ndarray, chars_per_record: int) -> np.ndarray:
+    """Base64-encode each row of a (N, k*3) uint8 array, returning a (N, k*4) array of single bytes."""
+    encoded = base64.b64encode(np.ascontiguousarray(records).tobytes())
+    return np.frombuffer(encoded, dtype='S1').reshape(len(records), chars_per_record)
+
+
+def _join_chars(chars: np.ndarray) -> np.ndarray:
+    """Turn a (N, k) array of single bytes into an object array of k-character str."""
+    width = chars.shape[1]
+    joined = np.ascontiguousarray(chars).view(f'S{width}').ravel()
+    return joined.astype(f'U{width}').astype(object)
+
+
+def encode_cube_array(x, y, z) -> np.ndarray:
+    """Vectorized encode_cube over integer (or truncatable float) columns."""
+    axes = [np.clip(np.asarray(a).astype(np.int64), 0, AXIS_MAX) for a in (x, y, z)]
+    records = np.empty((len(axes[0]), 9), dtype=np.uint8)
+    for i, n in enumerate(axes):
+        records[:, 3 * i] = (n >> 12) & 0x3F
+        records[:, 3 * i + 1] = (n >> 6) & 0x3F
+        records[:, 3 * i + 2] = n & 0x3F
+    chars = _b64_records(records, 12)
+    return _join_chars(chars[:, [0, 1, 2, 4, 5, 6, 8, 9, 10]])
+
+
+def encode_2d_array(x, y) -> np.ndarray:
+    """Vectorized encode_2d for int64 coordinates.
+
+    Each 16-byte value is padded to 18 bytes so the records line up on base64's
+    3-byte groups; the first 22 characters of every 24 are the unpadded encoding.
+    """
+    x = np.asarray(x).astype(np.int64)
+    y = np.asarray(y).astype(np.int64)
+    high = x - (y < 0)  # the borrow of a negative y, as in (x << 64) + y
+    records = np.zeros((len(x), 18), dtype=np.uint8)
+    records[:, 0:8] = high.astype('>i8').view(np.uint8).reshape(-1, 8)
+    records[:, 8:16] = y.astype('>i8').view(np.uint8).reshape(-1, 8)
+    return _join_chars(_b64_records(records, 24)[:, :22])
+
+
+def decode_2d_array(b64_values) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorized decode_2d, returning signed int64 (grid_x, grid_y) arrays."""
+    values = np.asarray(b64_values, dtype=object)
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    fixed = values.astype('S22')
+    if not all(len(v) == 22 for v in values):
+        decoded = [decode_2d(v) for v in values]
+        return (np.array([d[0] for d in decoded], dtype=np.int64),
+                np.array([d[1] for d in decoded], dtype=np.int64))
+    # 'AA' supplies zero bits in place of the '==' padding so the strings can be decoded as one buffer
+    chars = np.empty((len(fixed), 24), dtype='S1')
+    chars[:, :22] = fixed.view('S1').reshape(-1, 22)
+    chars[:, 22:] = b'A'
+    raw = np.frombuffer(base64.b64decode(chars.tobytes()), dtype=np.uint8).reshape(-1, 18)
+    y = np.ascontiguousarray(raw[:, 8:16]).view('>i8').ravel().astype(np.int64)
+    x = np.ascontiguousarray(raw[:, 0:8]).view('>i8').ravel().astype(np.int64) + (y < 0)
+    return x, y
+
+
+# === Integer grid key ===
+def grid_key(x, y):
+    """Pack grid coordinates into one int64 key, (grid_x << 32) + grid_y.
+
+    For 0 <= grid_y < 2**32 this equals grid_x << 32 | grid_y; grid_key_to_xy
+    inverts it for -2**31 <= grid_y < 2**31.
+    """
+    return (np.asarray(x).astype(np.int64) << GRID_KEY_SHIFT) + np.asarray(y).astype(np.int64)
+
+
+def grid_key_to_xy(key) -> tuple[np.ndarray, np.ndarray]:
+    key = np.asarray(key).astype(np.int64)
+    half = 1 << (GRID_KEY_SHIFT - 1)
+    y = ((key + half) & GRID_KEY_MASK) - half  # signed low 32 bits
+    return (key - y) >> GRID_KEY_SHIFT, y
+
+
+def grid_key_from_2d(b64_values) -> np.ndarray:
+    """Integer grid keys straight from base64_2D strings."""
+    return grid_key(*decode_2d_array(b64_values))
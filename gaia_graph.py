@@ -0,0 +1,141 @@
+# Compact undirected graph for the stage 3 link map.
+#
+# Nodes are int32 ids into a table of string ids (base64_2D codes), edges are
+# parallel int32/int32/float32 arrays. Adding an edge that already exists, in
+# either direction, updates its weight like networkx.Graph.add_edge, and edges
+# are exported in the order networkx.Graph.edges() would list them, so the
+# link map CSV is the same as when the graph was an nx.Graph.
+
+import numpy as np
+import pandas as pd
+
+
+class LinkGraph:
+    def __init__(self):
+        self.node_ids = []  # string id of each node, by node id
+        self._index = {}
+        self._attrs = {'x': [], 'y': [], 'grav': []}
+        self._edge_parts = []
+        self._edges = None
+
+    # === Nodes ===
+    def add_nodes(self, ids, x=None, y=None, grav=None) -> np.ndarray:
+        """Add nodes (existing ids are kept) and return the int32 node id of each."""
+        for node_id in ids:
+            if node_id not in self._index:
+                self._index[node_id] = len(self.node_ids)
+                self.node_ids.append(node_id)
+                for values in self._attrs.values():
+                    values.append(np.nan)
+        nodes = self.lookup(ids)
+        for name, values in (('x', x), ('y', y), ('grav', grav)):
+            if values is not None:
+                column = self._attrs[name]
+                for node, value in zip(nodes.tolist(), values):
+                    column[node] = value
+        return nodes
+
+    def lookup(self, ids) -> np.ndarray:
+        """int32 node ids of string ids, -1 for unknown ones."""
+        return np.fromiter((self._index.get(node_id, -1) for node_id in ids), dtype=np.int32, count=len(ids))
+
+    def node_attr(self, name: str) -> np.ndarray:
+        return np.asarray(self._attrs[name])
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    # === Edges ===
+    def add_edges(self, sources, targets, weights) -> None:
+        """Add undirected edges between string ids; endpoints not yet in the graph are added."""
+        # Interleaved so new endpoints get ids in the order networkx would add them
+        endpoints = np.empty(2 * len(sources), dtype=object)
+        endpoints[0::2], endpoints[1::2] = list(sources), list(targets)
+        nodes = self.add_nodes(endpoints)
+        src, dst = nodes[0::2], nodes[1::2]
+        self._edge_parts.append((src, dst, np.asarray(weights, dtype=np.float32)))
+        self._edges = None
+
+    def edges(self):
+        """De-duplicated (source, target, weight) arrays in networkx edge order.
+
+        networkx lists an edge under whichever endpoint was added first, after
+        that node's earlier edges; a repeated edge keeps its first position and
+        its last weight.
+        """
+        if self._edges is None:
+            if self._edge_parts:
+                src, dst, weight = (np.concatenate(a) for a in zip(*self._edge_parts))
+            else:
+                src = dst = np.empty(0, dtype=np.int32)
+                weight = np.empty(0, dtype=np.float32)
+            low, high = np.minimum(src, dst), np.maximum(src, dst)
+            pair = low.astype(np.int64) * max(len(self.node_ids), 1) + high
+            _, first = np.unique(pair, return_index=True)
+            _, last_rev = np.unique(pair[::-1], return_index=True)
+            last = len(pair) - 1 - last_rev
+            by_node = np.lexsort((first, low[first]))
+            first, last = first[by_node], last[by_node]
+            self._edges = (low[first], high[first], weight[last])
+            self._edge_parts = [self._edges]
+        return self._edges
+
+    def number_of_edges(self) -> int:
+        return len(self.edges()[0])
+
+    def to_csr(self):
+        """Symmetric adjacency as (indptr, indices, weights) arrays."""
+        src, dst, weight = self.edges()
+        n = len(self.node_ids)
+        rows = np.concatenate([src, dst])
+        cols = np.concatenate([dst, src])
+        weights = np.concatenate([weight, weight])
+        order = np.argsort(rows, kind='stable')
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return indptr, cols[order].astype(np.int32), weights[order]
+
+    def components(self) -> np.ndarray:
+        """Connected component label of every node: the smallest node id in its component.
+
+        Roots are hooked onto the smaller root across every edge and the parent
+        pointers compressed, repeated until no edge joins two roots.
+        """
+        src, dst, _ = self.edges()
+        parent = np.arange(len(self.node_ids), dtype=np.int64)
+        while True:
+            root_src, root_dst = parent[src], parent[dst]
+            joins = root_src != root_dst
+            if not joins.any():
+                return parent
+            low = np.minimum(root_src[joins], root_dst[joins])
+            high = np.maximum(root_src[joins], root_dst[joins])
+            np.minimum.at(parent, high, low)
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+
+    # === Export ===
+    def edges_frame(self) -> pd.DataFrame:
+        """Edges as a source/target/distance DataFrame of string ids.
+
+        Link distances are whole grid units and are written as integers, as before.
+        """
+        src, dst, weight = self.edges()
+        ids = np.asarray(self.node_ids, dtype=object)
+        distance = weight.astype(np.int64) if np.array_equal(weight, np.round(weight)) else weight
+        return pd.DataFrame({'source': ids[src], 'target': ids[dst], 'distance': distance})
+
+    def to_networkx(self):
+        """The graph as a networkx.Graph with pos/grav node attributes, for analysis."""
+        import networkx as nx
+        G = nx.Graph()
+        x, y, grav = (self.node_attr(name) for name in ('x', 'y', 'grav'))
+        for node, node_id in enumerate(self.node_ids):
+            G.add_node(node_id, pos=(x[node], y[node]), grav=grav[node])
+        src, dst, weight = self.edges()
+        ids = self.node_ids
+        G.add_weighted_edges_from((ids[u], ids[v], w) for u, v, w in zip(src.tolist(), dst.tolist(), weight.tolist()))
+        return G
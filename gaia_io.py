@@ -0,0 +1,218 @@
+# Catalogue readers and writers shared by the GAIA_Plus pipeline stages.
+# The catalogue is either a CSV file or a Parquet dataset directory partitioned
+# by quadrant and 2D_sector (hive layout: quadrant=4/2D_sector=S400/...).
+# Partitioning moves those two columns into the directory names and groups the
+# rows by them, so the writer records the CSV column order in the schema
+# metadata and a _row_order column, and read_catalogue uses both to hand back
+# the frame the CSV would give.
+
+import gzip
+import io
+import json
+import os
+import operator
+import numpy as np
+import pandas as pd
+
+PARTITION_COLS = ['quadrant', '2D_sector']
+CATEGORICAL_COLS = ['StarClass', 'Sub_Class', 'Sys_Icons', 'planet_types']
+ROW_ORDER_COL = '_row_order'
+COLUMNS_METADATA_KEY = b'gaia_plus.columns'
+
+_FILTER_OPS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def _require_pyarrow():
+    """Import pyarrow lazily, it is only needed for Parquet catalogues."""
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet catalogue support needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.isdir(path) or str(path).endswith('.parquet')
+
+
+def _apply_filters(df: pd.DataFrame, filters) -> pd.DataFrame:
+    """Apply (column, op, value) filters to a DataFrame, with the same ops pyarrow accepts."""
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op == 'in':
+            mask &= df[col].isin(value)
+        elif op == 'not in':
+            mask &= ~df[col].isin(value)
+        else:
+            mask &= _FILTER_OPS[op](df[col], value)
+    return df[mask]
+
+
+def _csv_typed(values: pd.Series) -> pd.Series:
+    """Partition values as read_csv would type them, e.g. quadrant '4' back to int64."""
+    codes, uniques = pd.factorize(values.astype(str))
+    parsed = pd.read_csv(io.StringIO('\n'.join(['value', *uniques])))['value']
+    return parsed.iloc[codes].set_axis(values.index)
+
+
+def _open_dataset(path: str, columns):
+    """The hive-partitioned dataset at path, the columns to read from it and the CSV column order."""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format='parquet', partitioning='hive')
+    metadata = dataset.schema.metadata or {}
+    order = json.loads(metadata[COLUMNS_METADATA_KEY]) if COLUMNS_METADATA_KEY in metadata else None
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+        if ROW_ORDER_COL in dataset.schema.names:
+            columns.append(ROW_ORDER_COL)
+    return dataset, columns, order
+
+
+def _csv_layout(df: pd.DataFrame, order) -> pd.DataFrame:
+    """Give Parquet rows the CSV's partition column dtypes and column order."""
+    df = df.drop(columns=[ROW_ORDER_COL], errors='ignore')
+    for col in PARTITION_COLS:
+        if col in df.columns:
+            df[col] = _csv_typed(df[col])
+    if order is not None:
+        known = [c for c in order if c in df.columns]
+        df = df[known + [c for c in df.columns if c not in known]]
+    return df
+
+
+def read_catalogue(path: str, columns=None, filters=None) -> pd.DataFrame:
+    """Load the catalogue from a CSV file or a partitioned Parquet directory.
+
+    columns limits the columns read; requested names missing from the file are
+    skipped. filters is a list of (column, op, value) tuples. On Parquet, filters
+    on the partition columns skip whole directories without opening them, and
+    the rows come back in CSV order (by source_id for datasets written without
+    a _row_order column).
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        dataset, columns, order = _open_dataset(path, columns)
+        expression = pq.filters_to_expression(filters) if filters else None
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        sort_key = ROW_ORDER_COL if ROW_ORDER_COL in df.columns else 'source_id'
+        if sort_key in df.columns:
+            df = df.sort_values(sort_key, kind='stable', ignore_index=True)
+        return _csv_layout(df, order)
+
+    filter_cols = [col for col, _, _ in filters] if filters else []
+    usecols = (lambda c: c in columns or c in filter_cols) if columns is not None else None
+    df = pd.read_csv(path, usecols=usecols)
+    if filters:
+        df = _apply_filters(df, filters)
+        if columns is not None:
+            df = df.drop(columns=[c for c in filter_cols if c not in columns])
+    return df
+
+
+def write_catalogue_parquet(df: pd.DataFrame, root_path: str, basename_template: str, row_order=None) -> None:
+    """Write rows into the partitioned Parquet dataset at root_path.
+
+    Class-like string columns are stored as dictionary-encoded categoricals.
+    basename_template (e.g. 'tile-00042-{i}.parquet') names the files of one
+    write, so writing the same tile again replaces its files instead of adding to them.
+    row_order gives each row's place in the CSV copy of the catalogue (any
+    increasing int64 key); read_catalogue sorts on it.
+    """
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+    columns = list(df.columns)
+    df = df.copy()
+    if row_order is not None:
+        df[ROW_ORDER_COL] = np.asarray(row_order, dtype=np.int64)
+    for col in CATEGORICAL_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in PARTITION_COLS:
+        df[col] = df[col].astype(str)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           COLUMNS_METADATA_KEY: json.dumps(columns).encode()})
+    pq.write_to_dataset(
+        table, root_path,
+        partition_cols=PARTITION_COLS,
+        basename_template=basename_template,
+        existing_data_behavior='overwrite_or_ignore'
+    )
+
+
+def scan_csv_dtypes(path: str, chunksize: int) -> dict:
+    """Column dtypes a single read_csv of the whole file would infer, found one chunk at a time.
+
+    Chunks are inferred separately, so a column can come out int64 in one chunk
+    and float64 (with NaN) in another. The chunk dtypes are combined the way the
+    full read would combine them, so every chunk can then be read with the same dtypes.
+    """
+    dtypes = {}
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        for col, dtype in chunk.dtypes.items():
+            seen = dtypes.get(col)
+            if seen is None or seen == dtype:
+                dtypes[col] = dtype
+            elif seen.kind in 'iuf' and dtype.kind in 'iuf':
+                dtypes[col] = np.result_type(seen, dtype)
+            elif isinstance(seen, pd.StringDtype) and dtype.kind == 'f':
+                pass  # an all-empty chunk of a string column
+            elif isinstance(dtype, pd.StringDtype) and seen.kind == 'f':
+                dtypes[col] = dtype
+            else:
+                dtypes[col] = np.dtype(object)
+    return dtypes
+
+
+def iter_catalogue(path: str, chunksize: int, columns=None, dtype=None):
+    """Yield the catalogue as DataFrames of at most chunksize rows, in file order.
+
+    Parquet batches get the CSV column order and partition dtypes, but come in
+    partition order; use read_catalogue where the row order matters.
+    """
+    if is_parquet(path):
+        dataset, columns, order = _open_dataset(path, columns)
+        for batch in dataset.to_batches(columns=columns, batch_size=chunksize):
+            yield _csv_layout(batch.to_pandas(), order)
+        return
+
+    usecols = (lambda c: c in columns) if columns is not None else None
+    yield from pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+
+
+# === Compressed text output ===
+TEXT_BUFFER_SIZE = 1 << 20
+
+
+def _require_zstandard():
+    """Import zstandard lazily, it is only needed for .zst output."""
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd output needs zstandard (pip install zstandard)") from e
+    return zstandard
+
+
+def open_text_output(path: str, compression='infer'):
+    """Open a UTF-8 text file for writing through a TEXT_BUFFER_SIZE buffer.
+
+    compression is None, 'gzip', 'zstd', or 'infer' to pick it from a .gz or
+    .zst suffix.
+    """
+    if compression == 'infer':
+        compression = {'.gz': 'gzip', '.zst': 'zstd'}.get(os.path.splitext(str(path))[1])
+    if compression is None:
+        return open(path, 'w', encoding='utf-8', buffering=TEXT_BUFFER_SIZE)
+    if compression == 'gzip':
+        raw = gzip.open(path, 'wb')
+    elif compression == 'zstd':
+        raw = _require_zstandard().open(path, 'wb')
+    else:
+        raise ValueError(f"Unknown compression {compression!r}")
+    return io.TextIOWrapper(io.BufferedWriter(raw, TEXT_BUFFER_SIZE), encoding='utf-8')
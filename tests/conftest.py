@@ -0,0 +1,23 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The pipeline scripts and shared modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def import_script(name, log_dir):
+    """Import a pipeline script whose module-level logging setup writes log files to the working directory."""
+    cwd = os.getcwd()
+    os.chdir(log_dir)
+    try:
+        return importlib.import_module(name)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture(scope='session')
+def link_map(tmp_path_factory):
+    return import_script('3_ES-MakeLinkMap2', tmp_path_factory.mktemp('logs'))
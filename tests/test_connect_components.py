@@ -0,0 +1,75 @@
+# The stage 3 connectivity pass against a brute-force minimum spanning forest.
+
+import numpy as np
+import pytest
+
+from gaia_graph import LinkGraph
+
+
+def brute_dominance_min(a, b, c):
+    result = np.full(len(a), -1)
+    for i in range(len(a)):
+        others = np.flatnonzero((a >= a[i]) & (b >= b[i]) & (np.arange(len(a)) != i))
+        if len(others):
+            result[i] = others[np.lexsort((others, c[others]))[0]]
+    return result
+
+
+def islands(seed):
+    """Distinct integer points with some short links among them, so several components."""
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(2, 150))
+    xy = np.unique(rng.integers(0, 60, (n, 2)), axis=0)
+    x, y = xy[rng.permutation(len(xy))].T
+    ids = np.array([f"s{i}" for i in range(len(x))], dtype=object)
+    G = LinkGraph()
+    G.add_nodes(ids, x=x, y=y)
+    dist = np.abs(x[:, None] - x) + np.abs(y[:, None] - y)
+    i, j = np.nonzero(np.triu(dist <= 4, 1) & (rng.random(dist.shape) < 0.5))
+    if len(i):
+        G.add_edges(ids[i], ids[j], dist[i, j])
+    return G, x, y
+
+
+def forest_length(x, y, labels):
+    """Prim's algorithm over the components, joined by their closest pair of systems."""
+    comp = np.unique(labels, return_inverse=True)[1]
+    k = comp.max() + 1
+    dist = np.abs(x[:, None] - x) + np.abs(y[:, None] - y)
+    between = np.array([[dist[np.ix_(comp == a, comp == b)].min() for b in range(k)] for a in range(k)], dtype=float)
+    joined = np.zeros(k, dtype=bool)
+    joined[0] = True
+    best, total = between[0].copy(), 0.0
+    for _ in range(k - 1):
+        best[joined] = np.inf
+        nearest = int(np.argmin(best))
+        total += best[nearest]
+        joined[nearest] = True
+        best = np.minimum(best, between[nearest])
+    return total
+
+
+def edge_lengths(G):
+    src, dst, weights = G.edges()
+    return {(min(a, b), max(a, b)): float(w) for a, b, w in zip(src.tolist(), dst.tolist(), weights.tolist())}
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_dominance_min(link_map, seed):
+    rng = np.random.default_rng(seed)
+    ab = np.unique(rng.integers(0, 10, (80, 2)), axis=0)
+    a, b = ab[rng.permutation(len(ab))].T
+    c = rng.integers(0, 10, len(a))
+    np.testing.assert_array_equal(link_map._dominance_min(a, b, c), brute_dominance_min(a, b, c))
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_adds_a_minimum_spanning_forest(link_map, seed):
+    G, x, y = islands(seed)
+    labels = G.components()
+    before = edge_lengths(G)
+    added = link_map.connect_components(G)
+    new_links = {edge: w for edge, w in edge_lengths(G).items() if edge not in before}
+    assert len(np.unique(G.components())) == 1
+    assert added == len(new_links) == len(np.unique(labels)) - 1
+    assert sum(new_links.values()) == forest_length(x, y, labels)
@@ -0,0 +1,36 @@
+# Round trips of the base64_2D codec and the integer grid key, negative coordinates included.
+
+import numpy as np
+
+from gaia_codec import (decode_2d, decode_2d_array, encode_2d, encode_2d_array, grid_key, grid_key_from_2d,
+                        grid_key_to_xy)
+
+
+def coordinates(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(-300000, 300000, n)
+    y = rng.integers(-300000, 300000, n)
+    edges = np.array([0, -1, 1, 75000, -75000, (1 << 31) - 1, -(1 << 31)])
+    x = np.concatenate([x, np.repeat(edges, len(edges))])
+    y = np.concatenate([y, np.tile(edges, len(edges))])
+    return x, y
+
+
+def test_scalar_and_column_codec_agree():
+    x, y = coordinates()
+    encoded = encode_2d_array(x, y)
+    assert encoded.tolist() == [encode_2d(a, b) for a, b in zip(x.tolist(), y.tolist())]
+    assert [decode_2d(v) for v in encoded] == list(zip(x.tolist(), y.tolist()))
+    dx, dy = decode_2d_array(encoded)
+    assert dx.dtype == dy.dtype == np.int64
+    np.testing.assert_array_equal(dx, x)
+    np.testing.assert_array_equal(dy, y)
+
+
+def test_grid_key_round_trip():
+    x, y = coordinates()
+    keys = grid_key(x, y)
+    np.testing.assert_array_equal(grid_key_from_2d(encode_2d_array(x, y)), keys)
+    kx, ky = grid_key_to_xy(keys)
+    np.testing.assert_array_equal(kx, x)
+    np.testing.assert_array_equal(ky, y)
@@ -0,0 +1,62 @@
+# The Parquet copy of the catalogue reads back like its CSV.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+from gaia_io import CATEGORICAL_COLS, iter_catalogue, read_catalogue, write_catalogue_parquet
+
+
+def catalogue_tiles(n_tiles=3, rows=40, seed=0):
+    rng = np.random.default_rng(seed)
+    for tile in range(n_tiles):
+        quadrant = rng.choice(['1', '2', '3', '4'], rows)
+        yield pd.DataFrame({
+            'source_id': rng.integers(0, 1 << 60, rows),
+            'ra': rng.uniform(0, 360, rows),
+            'quadrant': quadrant,
+            'StarClass': rng.choice(['G', 'K', 'M'], rows),
+            'Name_two': [f"S{q}{tile:04d}-{i:04d}" for i, q in enumerate(quadrant)],
+            '2D_sector': ['S' + q + f"{s:02d}" for q, s in zip(quadrant, rng.integers(0, 30, rows))],
+            'mass': rng.uniform(0.1, 10, rows),
+        })
+
+
+@pytest.fixture
+def catalogue(tmp_path):
+    """The same tiles written the way stage 1 writes them, as CSV and as Parquet."""
+    csv_path, parquet_path = tmp_path / 'GAIA_Plus.csv', tmp_path / 'GAIA_Plus_parquet'
+    for tile, df in enumerate(catalogue_tiles()):
+        csv_start = csv_path.stat().st_size if tile else 0
+        df.to_csv(csv_path, mode='a' if tile else 'w', header=not tile, index=False)
+        write_catalogue_parquet(df, str(parquet_path), f"tile-{tile:05d}-{{i}}.parquet",
+                                row_order=csv_start + np.arange(len(df)))
+    return str(csv_path), str(parquet_path)
+
+
+def as_csv_types(df):
+    return df.astype({col: str for col in CATEGORICAL_COLS if col in df.columns})
+
+
+@pytest.mark.parametrize('columns, filters', [
+    (None, None),
+    (['mass', '2D_sector', 'source_id', 'quadrant'], None),
+    (None, [('quadrant', 'in', [2, 3]), ('mass', '>', 2.0)]),
+])
+def test_parquet_reads_like_csv(catalogue, columns, filters):
+    csv_path, parquet_path = catalogue
+    expected = read_catalogue(csv_path, columns=columns, filters=filters).reset_index(drop=True)
+    actual = read_catalogue(parquet_path, columns=columns, filters=filters)
+    pd.testing.assert_frame_equal(as_csv_types(actual), expected)
+
+
+def test_parquet_batches_have_csv_columns(catalogue):
+    csv_path, parquet_path = catalogue
+    expected = read_catalogue(csv_path)
+    batches = list(iter_catalogue(parquet_path, 25))
+    assert all(list(batch.columns) == list(expected.columns) for batch in batches)
+    assert all((batch.dtypes['quadrant'], batch.dtypes['2D_sector']) ==
+               (expected.dtypes['quadrant'], expected.dtypes['2D_sector']) for batch in batches)
+    combined = as_csv_types(pd.concat(batches)).sort_values('Name_two', ignore_index=True)
+    pd.testing.assert_frame_equal(combined, expected.sort_values('Name_two', ignore_index=True))
@@ -0,0 +1,102 @@
+# The FFT gravity field of stage 3 against inverse-distance weighting summed star by star.
+
+import numpy as np
+import pytest
+
+
+def stars(n=1500, seed=0):
+    """Integer grid positions like stage 3's, in a band much wider than it is tall."""
+    rng = np.random.default_rng(seed)
+    x = rng.integers(74900, 75100, n).astype(float)
+    y = rng.integers(74920, 75070, n).astype(float)
+    return x, y, rng.lognormal(-2, 1.5, n)
+
+
+def exact_idw(x, y, grav_force, x_grid, y_grid, epsilon, radius=None):
+    X, Y = np.meshgrid(x_grid, y_grid)
+    num, den = np.zeros_like(X), np.zeros_like(X)
+    for xs, ys, g in zip(x, y, grav_force):
+        d = np.hypot(X - xs, Y - ys)
+        w = 1 / (d + epsilon)
+        if radius is not None:
+            w[d > radius] = 0
+        num += w * g
+        den += w
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return num / den
+
+
+def quantised_idw(link_map, x, y, grav_force, x_grid, y_grid, radius):
+    """IDW with gravity_field's cut-off: exact within the IDW_NEAR_CELLS box of a star's
+    cell, and beyond it the cloud-in-cell mix over the cell's corners of the cut-off kernel."""
+    nx, ny = len(x_grid), len(y_grid)
+    dx, dy = link_map._grid_step(x_grid), link_map._grid_step(y_grid)
+    kx, ky = min(nx - 1, int(radius // dx)), min(ny - 1, int(radius // dy))
+    off_x, off_y = link_map._near_offsets(dx, dy, kx, ky)
+    NX, NY = np.meshgrid(np.arange(nx), np.arange(ny))
+    num, den, reach = np.zeros(NX.shape), np.zeros(NX.shape), np.zeros(NX.shape)
+    for xs, ys, g in zip(x, y, grav_force):
+        fx = min(max((xs - x_grid[0]) / dx, 0), nx - 1)
+        fy = min(max((ys - y_grid[0]) / dy, 0), ny - 1)
+        cx, cy = min(int(fx), nx - 2), min(int(fy), ny - 2)
+        tx, ty = fx - cx, fy - cy
+        d = np.hypot(x_grid[NX] - xs, y_grid[NY] - ys)
+        w = np.where(d <= radius, 1 / (d + link_map.IDW_EPSILON), 0)
+        inside = (d <= radius).astype(float)
+        grid_w, grid_inside = np.zeros(NX.shape), np.zeros(NX.shape)
+        for ox, oy in link_map.CIC_CORNERS:
+            corner = (tx if ox else 1 - tx) * (ty if oy else 1 - ty)
+            dc = np.hypot((NX - cx - ox) * dx, (NY - cy - oy) * dy)
+            grid_w += corner * np.where(dc <= radius, 1 / (dc + link_map.IDW_EPSILON), 0)
+            grid_inside += corner * (dc <= radius)
+        near = ((NX - cx >= off_x.min()) & (NX - cx <= off_x.max())
+                & (NY - cy >= off_y.min()) & (NY - cy <= off_y.max()))
+        w, inside = np.where(near, w, grid_w), np.where(near, inside, grid_inside)
+        num += w * g
+        den += w
+        reach += inside
+    with np.errstate(invalid='ignore', divide='ignore'):
+        field = num / den
+    field[reach < 0.5] = np.nan
+    return field
+
+
+@pytest.mark.parametrize('radius, rtol', [(None, 1e-2), (6, 1e-9)])
+def test_matches_exact_idw_at_every_node(link_map, radius, rtol):
+    x, y, grav_force = stars()
+    x_grid, y_grid = np.linspace(x.min(), x.max(), 300), np.linspace(y.min(), y.max(), 20)
+    expected = exact_idw(x, y, grav_force, x_grid, y_grid, link_map.IDW_EPSILON, radius)
+    field = link_map.gravity_field(x, y, grav_force, x_grid, y_grid, radius)
+    np.testing.assert_array_equal(np.isnan(field), np.isnan(expected))
+    np.testing.assert_allclose(field, expected, rtol=rtol, equal_nan=True)
+
+
+def test_cut_off_beyond_the_near_box_is_quantised(link_map):
+    x, y, grav_force = stars(600)
+    x_grid, y_grid = np.linspace(x.min(), x.max(), 300), np.linspace(y.min(), y.max(), 20)
+    expected = quantised_idw(link_map, x, y, grav_force, x_grid, y_grid, 40)
+    field = link_map.gravity_field(x, y, grav_force, x_grid, y_grid, 40)
+    np.testing.assert_array_equal(np.isnan(field), np.isnan(expected))
+    np.testing.assert_allclose(field, expected, rtol=1e-9, equal_nan=True)
+    # The smearing shrinks with the cells: on a finer grid it is close to plain IDW
+    y_grid = np.linspace(y.min(), y.max(), 150)
+    field = link_map.gravity_field(x, y, grav_force, x_grid, y_grid, 40)
+    exact = exact_idw(x, y, grav_force, x_grid, y_grid, link_map.IDW_EPSILON, 40)
+    both = ~np.isnan(field) & ~np.isnan(exact)
+    assert np.median(np.abs(field[both] / exact[both] - 1)) < 5e-3
+
+
+def test_star_on_a_node_sets_it(link_map):
+    x, y, grav_force = stars(200)
+    x_grid, y_grid = np.linspace(x.min(), x.max(), 50), np.linspace(y.min(), y.max(), 10)
+    x, y, grav_force = np.append(x, x_grid[7]), np.append(y, y_grid[4]), np.append(grav_force, 5.0)
+    field = link_map.gravity_field(x, y, grav_force, x_grid, y_grid)
+    assert field[4, 7] == pytest.approx(5.0, rel=1e-6)
+
+
+def test_window_matches_full_map(link_map):
+    x, y, grav_force = stars()
+    x_grid, y_grid = np.linspace(x.min(), x.max(), 300), np.linspace(y.min(), y.max(), 20)
+    full = link_map.gravity_field(x, y, grav_force, x_grid, y_grid, 40)
+    window = link_map.gravity_field(x, y, grav_force, x_grid, y_grid, 40, window=(40, 120, 3, 11))
+    np.testing.assert_allclose(window, full[3:11, 40:120], rtol=1e-12, equal_nan=True)
@@ -0,0 +1,79 @@
+import logging
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gaia_codec import encode_2d_array
+
+
+@pytest.fixture
+def catalogue(link_map, monkeypatch):
+    monkeypatch.setattr(link_map, 'GRAV_KERNEL_RADIUS', 600.0)
+    monkeypatch.setattr(link_map, 'connect_islands', False)
+    rng = np.random.default_rng(3)
+    n = 600
+    x, y = rng.integers(0, 20000, n), rng.integers(0, 4000, n)
+    keep = np.unique(x * 4000 + y, return_index=True)[1]
+    x, y = x[np.sort(keep)], y[np.sort(keep)]
+    return pd.DataFrame({
+        'base64_2D': encode_2d_array(x, y),
+        'StarClass': rng.choice(['G', 'K', 'M'], len(x)),
+        'Sub_Class': rng.integers(0, 10, len(x)),
+        'quadrant': 'Q1',
+        'gravitational_force': rng.lognormal(0, 1, len(x)),
+        'rarity_score': rng.random(len(x)),
+    })
+
+
+def _build(link_map, df, tmp_path):
+    df.to_csv(tmp_path / 'in0.csv', index=False)
+    output = str(tmp_path / 'inc' / 'map.png')
+    link_map.create_gravity_well_map(str(tmp_path / 'in0.csv'), output)
+    return output
+
+
+def test_small_edit_is_incremental_and_matches_full_run(link_map, catalogue, tmp_path, caplog):
+    output = _build(link_map, catalogue, tmp_path)
+    state_path = output.replace('.png', '.csv') + link_map.LINK_STATE_SUFFIX
+    saved = link_map.load_link_state(state_path)['params']
+
+    edited = catalogue.copy()
+    g = edited['gravitational_force'].to_numpy().copy()
+    g[[10, 20]] = g[[20, 10]]
+    edited['gravitational_force'] = g
+    edited.to_csv(tmp_path / 'in1.csv', index=False)
+    with caplog.at_level(logging.INFO):
+        link_map.update_gravity_well_map(str(tmp_path / 'in1.csv'), output)
+    assert 'relinking' in caplog.text
+    assert 'Rebuilding' not in caplog.text
+
+    full = str(tmp_path / 'full' / 'map.png')
+    link_map.create_gravity_well_map(str(tmp_path / 'in1.csv'), full, params=saved)
+    assert (tmp_path / 'inc' / 'map.csv').read_bytes() == (tmp_path / 'full' / 'map.csv').read_bytes()
+    assert link_map.load_link_state(state_path)['params'] == saved
+
+
+def test_drift_past_tolerance_rebuilds(link_map, catalogue, tmp_path, caplog):
+    output = _build(link_map, catalogue, tmp_path)
+    edited = catalogue.assign(gravitational_force=catalogue['gravitational_force'] * 1.5)
+    edited.to_csv(tmp_path / 'in1.csv', index=False)
+    with caplog.at_level(logging.INFO):
+        link_map.update_gravity_well_map(str(tmp_path / 'in1.csv'), output)
+    assert 'drifted past LINK_PARAM_DRIFT' in caplog.text
+
+
+def test_pickled_state_is_not_loaded(link_map, tmp_path):
+    state_path = tmp_path / 'map.csv.state.npz'
+    state_path.write_bytes(pickle.dumps({'version': link_map.LINK_STATE_VERSION}))
+    assert link_map.load_link_state(str(state_path)) is None
+
+
+def test_unlimited_kernel_warns_and_rebuilds(link_map, catalogue, tmp_path, caplog, monkeypatch):
+    monkeypatch.setattr(link_map, 'GRAV_KERNEL_RADIUS', None)
+    output = _build(link_map, catalogue, tmp_path)
+    with caplog.at_level(logging.INFO):
+        link_map.update_gravity_well_map(str(tmp_path / 'in0.csv'), output)
+    warnings = [r.getMessage() for r in caplog.records if r.levelno == logging.WARNING]
+    assert any('GRAV_KERNEL_RADIUS' in message for message in warnings)
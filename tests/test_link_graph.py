@@ -0,0 +1,62 @@
+# LinkGraph against networkx.Graph, whose edge order and de-duplication stage 3's CSV relies on.
+
+import numpy as np
+import pytest
+
+from gaia_graph import LinkGraph
+
+nx = pytest.importorskip("networkx")
+
+
+def random_parts(rng, n_nodes, n_parts=3):
+    """Batches of (sources, targets, weights) over string ids, with repeats in both directions and self-loops."""
+    ids = [f"s{i}" for i in rng.permutation(n_nodes)]
+    parts = []
+    n_edges = int(rng.integers(3, n_nodes))
+    for _ in range(n_parts):
+        a = rng.integers(0, n_nodes, n_edges)
+        b = np.where(rng.random(n_edges) < 0.1, a, rng.integers(0, n_nodes, n_edges))
+        weights = rng.integers(1, 100, n_edges).astype(float)
+        parts.append(([ids[i] for i in a], [ids[i] for i in b], weights))
+    return ids, parts
+
+
+def both_graphs(seed, pre_added=0):
+    rng = np.random.default_rng(seed)
+    ids, parts = random_parts(rng, int(rng.integers(5, 40)))
+    G, H = LinkGraph(), nx.Graph()
+    G.add_nodes(ids[:pre_added])
+    H.add_nodes_from(ids[:pre_added])
+    for sources, targets, weights in parts:
+        G.add_edges(sources, targets, weights)
+        H.add_weighted_edges_from(zip(sources, targets, weights))
+    return G, H
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('pre_added', [0, 5])
+def test_edges_match_networkx(seed, pre_added):
+    G, H = both_graphs(seed, pre_added)
+    assert G.node_ids == list(H.nodes)
+    src, dst, weight = G.edges()
+    ids = G.node_ids
+    assert [(ids[u], ids[v]) for u, v in zip(src.tolist(), dst.tolist())] == list(H.edges())
+    assert weight.tolist() == [np.float32(w) for _, _, w in H.edges(data='weight')]
+    assert G.number_of_edges() == H.number_of_edges()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_components_match_networkx(seed):
+    G, H = both_graphs(seed, pre_added=5)
+    labels = G.components()
+    index = {node_id: node for node, node_id in enumerate(G.node_ids)}
+    for component in nx.connected_components(H):
+        nodes = sorted(index[node_id] for node_id in component)
+        assert set(labels[nodes].tolist()) == {nodes[0]}
+
+
+def test_edges_frame_writes_whole_distances_as_integers():
+    G = LinkGraph()
+    G.add_edges(['a', 'b', 'b'], ['b', 'c', 'a'], [3.0, 4.0, 5.0])
+    frame = G.edges_frame()
+    assert frame.values.tolist() == [['a', 'b', 5], ['b', 'c', 4]]
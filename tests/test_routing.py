@@ -0,0 +1,98 @@
+# gaia_routing's RouteIndex against networkx shortest paths.
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from gaia_graph import LinkGraph
+from gaia_routing import ROUTE_INDEX_SUFFIX, RouteIndex, check_route_parity, route_index_for
+
+nx = pytest.importorskip("networkx")
+
+
+def random_edges(seed, n=60, m=60):
+    """source/target/distance frame of a sparse random graph, usually in several islands."""
+    rng = np.random.default_rng(seed)
+    a, b = rng.integers(0, n, m), rng.integers(0, n, m)
+    keep = a != b
+    return pd.DataFrame({'source': [f"s{i}" for i in a[keep]], 'target': [f"s{i}" for i in b[keep]],
+                         'distance': rng.integers(1, 100, keep.sum())})
+
+
+def both_graphs(edges):
+    G, H = LinkGraph(), nx.Graph()
+    G.add_edges(edges['source'].to_numpy(dtype=object), edges['target'].to_numpy(dtype=object),
+                edges['distance'].to_numpy())
+    H.add_weighted_edges_from(edges.itertuples(index=False), weight='distance')
+    return RouteIndex.from_graph(G, n_landmarks=4), H
+
+
+def path_length(H, path):
+    return sum(H[u][v]['distance'] for u, v in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_routes_match_networkx(seed):
+    index, H = both_graphs(random_edges(seed))
+    nodes = list(H.nodes)
+    rng = np.random.default_rng(seed)
+    for s, t in rng.integers(0, len(nodes), size=(40, 2)).tolist():
+        source, target = nodes[s], nodes[t]
+        path, length = index.route(source, target)
+        hop_path, hops = index.route(source, target, by='hops')
+        if not nx.has_path(H, source, target):
+            assert (path, length) == (None, np.inf)
+            assert (hop_path, hops) == (None, np.inf)
+            assert index.jumps(source, target) == -1
+            continue
+        assert length == nx.shortest_path_length(H, source, target, weight='distance')
+        assert path[0] == source and path[-1] == target and path_length(H, path) == length
+        expected_hops = nx.shortest_path_length(H, source, target)
+        assert hops == expected_hops and len(hop_path) == expected_hops + 1
+        assert index.jumps(source, target) == expected_hops
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_within_jumps_matches_networkx(seed):
+    index, H = both_graphs(random_edges(seed))
+    for source in list(H.nodes)[:10]:
+        for k in (0, 1, 3):
+            expected = nx.single_source_shortest_path_length(H, source, cutoff=k)
+            reached = index.within_jumps(source, k)
+            assert reached.to_dict() == expected
+            assert reached.is_monotonic_increasing
+
+
+def test_source_is_target():
+    index, H = both_graphs(random_edges(0))
+    source = next(iter(H.nodes))
+    assert index.route(source, source) == ([source], 0.0)
+    assert index.jumps(source, source) == 0
+
+
+def test_unknown_system_raises():
+    index, _ = both_graphs(random_edges(0))
+    with pytest.raises(KeyError):
+        index.route('s0', 'nowhere')
+
+
+def test_index_is_rebuilt_when_the_csv_changes(tmp_path):
+    csv_path = str(tmp_path / 'map.csv')
+    random_edges(0).to_csv(csv_path, index=False)
+    first = route_index_for(csv_path)
+    assert os.path.exists(csv_path + ROUTE_INDEX_SUFFIX)
+    assert route_index_for(csv_path).node_ids.tolist() == first.node_ids.tolist()
+
+    edges = random_edges(1, n=80, m=150)
+    edges.to_csv(csv_path, index=False)
+    rebuilt = route_index_for(csv_path)
+    _, H = both_graphs(edges)
+    assert rebuilt.node_ids.tolist() == list(H.nodes)
+    assert RouteIndex.load(csv_path + ROUTE_INDEX_SUFFIX).node_ids.tolist() == list(H.nodes)
+
+
+def test_check_route_parity():
+    index, _ = both_graphs(random_edges(2))
+    assert check_route_parity(index, n_queries=200)
@@ -0,0 +1,101 @@
+# Stage 4's vectorized sampling: per-system streams and the distributions they draw.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import import_script
+
+
+@pytest.fixture(scope='module')
+def make_sys(tmp_path_factory):
+    return import_script('4_ES_Make_SYS_FromCustomCsv', tmp_path_factory.mktemp('logs'))
+
+
+def catalogue(make_sys, n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    classes = sorted(make_sys.STARS_BY_CLASS)
+    return pd.DataFrame({
+        'source_id': rng.integers(1, 2 ** 62, n),
+        'star_image_key': rng.choice(classes, n),
+        'binary_candidate': rng.random(n).round(),
+        'flat_x': rng.integers(0, 20000, n),
+        'flat_y': rng.integers(0, 4000, n),
+        'Name_two': [f"Test {i}" for i in range(n)],
+    })
+
+
+def generate(make_sys, df, **kwargs):
+    return list(make_sys.generate_systems_seeded(df, seed=11, sample_vectorized=True, **kwargs))
+
+
+def test_output_does_not_depend_on_chunks_or_workers(make_sys):
+    df = catalogue(make_sys)
+    reference = generate(make_sys, df, chunk_rows=1000)
+    assert len(reference) == len(df)
+    for chunk_rows in (7, 64):
+        assert generate(make_sys, df, chunk_rows=chunk_rows) == reference
+    assert generate(make_sys, df, chunk_rows=50, workers=2) == reference
+    # Streamed catalogue chunks that do not line up with the generator's
+    assert generate(make_sys, [df[:130], df[130:]], chunk_rows=64) == reference
+
+
+def test_system_values_do_not_depend_on_neighbours(make_sys):
+    df = catalogue(make_sys)
+    alone = generate(make_sys, df.iloc[[5]].reset_index(drop=True))
+    assert alone[0] == generate(make_sys, df)[5]
+
+
+def test_seed_changes_output(make_sys):
+    df = catalogue(make_sys, n=20)
+    other = list(make_sys.generate_systems_seeded(df, seed=12, sample_vectorized=True))
+    assert other != generate(make_sys, df)
+
+
+def test_streams_draw_in_range(make_sys):
+    streams = make_sys.SystemStreams.from_ids(3, np.arange(10000))
+    u = streams.random('test')
+    assert 0 <= u.min() and u.max() < 1 and abs(u.mean() - 0.5) < 0.01
+    k = streams.integers('test', 2, 6)
+    assert np.array_equal(np.unique(k), [2, 3, 4, 5])
+    assert not np.array_equal(u, streams.random('other'))
+    counts = streams.poisson('test', np.full(10000, 2.5))
+    assert abs(counts.mean() - 2.5) < 0.05 and abs(counts.var() - 2.5) < 0.15
+
+
+def test_star_class_mix(make_sys):
+    n = 40000
+    star_classes = np.array(['M'] * (n // 2) + ['G'] * (n // 2), dtype=object)
+    s = make_sys.sample_systems(star_classes, np.ones(n), make_sys.SystemStreams.from_ids(5, np.arange(n)))
+    for star_class in ('M', 'G'):
+        options = make_sys.STARS_BY_CLASS[star_class]
+        picked = s['star'][star_classes == star_class]
+        assert set(picked.tolist()) <= set(options)
+        freq = np.array([(picked == k).mean() for k in options])
+        assert np.abs(freq - 1 / len(options)).max() < 0.02
+    secondary = np.bincount(s['secondary'], minlength=len(make_sys.star_image)) / n
+    assert np.abs(secondary - 1 / len(make_sys.star_image)).max() < 0.02
+
+
+def test_planet_and_moon_counts(make_sys):
+    n = 20000
+    star_classes = np.array(['G'] * n, dtype=object)
+    s = make_sys.sample_systems(star_classes, np.zeros(n), make_sys.SystemStreams.from_ids(5, np.arange(n)))
+    habitability = make_sys.STAR_HABITABILITY[s['star']]
+    n_max = make_sys._plan_tables(sorted(set(habitability.tolist())))[0]
+    groups = np.searchsorted(sorted(set(habitability.tolist())), habitability)
+    # Each zone slot holds 0..n_max planets, uniformly
+    expected = n_max[groups].sum(axis=1) / 2
+    planets = np.diff(s['planet_start'])
+    assert abs(planets.mean() - expected.mean()) < 0.05 * expected.mean()
+    # Moons are Poisson with the average of the first zone holding the planet
+    moons = np.diff(s['moon_start'])
+    assert len(moons) == s['planet_start'][-1]
+    system = np.repeat(np.arange(n), planets)
+    scaled = s['planet_distance'] / np.sqrt(1000 / np.maximum(1.0, habitability[system]))
+    moon_mean = np.zeros(len(moons))
+    for z_data in reversed(list(make_sys.planetary_zones.values())):
+        lo, hi = z_data['distance_range_au']
+        moon_mean[(lo <= scaled) & (scaled <= hi)] = z_data['average_major_moons']
+    assert moon_mean.mean() > 0
+    assert abs(moons.mean() - moon_mean.mean()) < 0.03 * moon_mean.mean()
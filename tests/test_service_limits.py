@@ -0,0 +1,151 @@
+# Stage 1's per-service limits and tile pipeline, with the Gaia and SIMBAD clients stubbed out.
+
+import importlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("astroquery")
+from astropy.table import Table
+
+ingest = importlib.import_module('1_GAIA_Plus_Create_CSV')
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'GAIA_Plus_Thined.csv')
+RAW_GAIA_COLUMNS = [
+    'source_id', 'ra', 'dec', 'parallax', 'phot_g_mean_mag', 'phot_bp_mean_mag', 'phot_rp_mean_mag',
+    'bp_rp', 'bp_g', 'g_rp', 'radial_velocity', 'l', 'b', 'ecl_lon', 'ecl_lat', 'teff_gspphot', 'radius_gspphot',
+]
+
+
+class Recorder:
+    """Counts calls in flight and records when each one started."""
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.active = self.peak = 0
+        self.starts = []
+
+    def __call__(self, result=None, duration=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.starts.append(time.monotonic())
+        time.sleep(self.duration if duration is None else duration)
+        with self.lock:
+            self.active -= 1
+        return result
+
+
+def test_concurrency_cap():
+    limiter = ingest.ServiceLimiter("Stub", max_concurrent=2)
+    recorder = Recorder(duration=0.05)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: limiter.call(recorder, i), range(12)))
+    assert results == list(range(12))
+    assert recorder.peak == 2
+
+
+def test_rate_limit_spaces_call_starts():
+    limiter = ingest.ServiceLimiter("Stub", max_concurrent=4, min_interval=0.05)
+    recorder = Recorder()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda i: limiter.call(recorder), range(6)))
+    starts = sorted(recorder.starts)
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.045
+
+
+def test_retries_transient_errors_with_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ingest.time, 'sleep', sleeps.append)
+    limiter = ingest.ServiceLimiter("Stub", max_concurrent=1, max_retries=3, retry_delay=1.0)
+    failures = iter([ConnectionError("reset"), TimeoutError("timed out")])
+
+    def flaky():
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return 'ok'
+
+    assert limiter.call(flaky) == 'ok'
+    assert sleeps == [1.0, 2.0]
+
+    sleeps.clear()
+    with pytest.raises(ConnectionError):
+        limiter.call(lambda: (_ for _ in ()).throw(ConnectionError("down")))
+    assert sleeps == [1.0, 2.0]
+
+
+def test_run_tiles_writes_in_tile_order():
+    tiles = [ingest.Tile(i, i, i + 1, 0, 1) for i in range(12)]
+    finished, written, failed = [], [], []
+
+    def process(tile):
+        # Later tiles finish first
+        time.sleep(0.01 * (12 - tile.index))
+        finished.append(tile.index)
+        if tile.index == 5:
+            raise RuntimeError("tile failed")
+        return tile.index
+
+    ingest.run_tiles(tiles, process, lambda tile, result: written.append(result), workers=4,
+                     on_error=lambda tile, e: failed.append(tile.index))
+    assert finished != sorted(finished)
+    assert written == [i for i in range(12) if i != 5]
+    assert failed == [5]
+
+
+class StubGaia:
+    """Answers a tile query from the sample catalogue, slower for earlier tiles."""
+    sample = pd.read_csv(SAMPLE, usecols=RAW_GAIA_COLUMNS)[RAW_GAIA_COLUMNS]
+    recorder = None
+
+    class Job:
+        def __init__(self, table):
+            self.table = table
+
+        def get_results(self):
+            return self.table
+
+    @classmethod
+    def launch_job(cls, query):
+        ra_start, ra_end = map(float, re.search(r"gs\.ra >= (\S+) AND gs\.ra < (\S+)", query).groups())
+        dec_start, dec_end = map(float, re.search(r"gs\.dec >= (\S+) AND gs\.dec <=? (\S+)", query).groups())
+        rows = cls.sample[cls.sample['ra'].between(ra_start, ra_end, inclusive='left')
+                          & cls.sample['dec'].between(dec_start, dec_end)]
+        return cls.Job(Table.from_pandas(cls.recorder(rows.reset_index(drop=True), duration=0.1 * (1 - ra_start))))
+
+
+class StubSimbad:
+    recorder = None
+
+    def query_tap(self, query, maxrec=None, **uploads):
+        upload = uploads['tile']
+        return self.recorder(Table({'source_id': upload['source_id'][:1], 'main_id': ['* stub'],
+                                    'dist_arcsec': [1.0]}))
+
+
+def test_tiles_through_stub_clients(monkeypatch):
+    StubGaia.recorder, StubSimbad.recorder = Recorder(), Recorder(duration=0.02)
+    monkeypatch.setattr(ingest, 'Gaia', StubGaia)
+    monkeypatch.setattr(ingest, 'Simbad', StubSimbad)
+    monkeypatch.setattr(ingest, 'simbad_tap_url', None)
+    monkeypatch.setattr(ingest, 'simbad_bulk_match', True)
+    monkeypatch.setattr(ingest, 'adaptive_tiling', False)
+    monkeypatch.setattr(ingest, 'gaia_limiter', ingest.ServiceLimiter("Gaia", 2))
+    monkeypatch.setattr(ingest, 'simbad_limiter', ingest.ServiceLimiter("SIMBAD", 1))
+
+    tiles = [ingest.Tile(i, i / 4, (i + 1) / 4, -90, -89) for i in range(4)]
+    written = []
+    ingest.run_tiles(tiles, ingest.process_tile, lambda tile, stars: written.append((tile.index, stars)), workers=4)
+
+    assert [index for index, _ in written] == [0, 1, 2, 3]
+    source_ids = pd.concat([stars['source_id'] for _, stars in written])
+    assert sorted(source_ids) == sorted(StubGaia.sample['source_id'])
+    assert all((stars['simbad_names'] == '* stub').sum() == 1 for _, stars in written)
+    assert StubGaia.recorder.peak <= 2 and StubSimbad.recorder.peak == 1
@@ -0,0 +1,122 @@
+# SIMBAD name resolution of stage 1, with the SIMBAD service stubbed out.
+
+import importlib
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("astroquery")
+from astropy.coordinates import SkyCoord
+from astropy.table import Table
+import astropy.units as u
+
+ingest = importlib.import_module('1_GAIA_Plus_Create_CSV')
+
+# What the TAP cross-match returns: source 1 has a nearer galaxy and a farther
+# star, source 2 only non-star objects, source 3 nothing within the radius.
+TAP_ROWS = Table(rows=[
+    (1, 'NAME Some Galaxy', 2.0),
+    (1, '* alf Test', 9.0),
+    (1, '* bet Test', 14.0),
+    (2, 'IRAS 12345+6789', 20.0),
+    (2, 'NAME Nearer Cloud', 5.0),
+], names=['source_id', 'main_id', 'dist_arcsec'])
+
+
+class StubSimbad:
+    queries = []
+
+    def query_tap(self, query, maxrec=None, **uploads):
+        self.queries.append(uploads)
+        return TAP_ROWS.copy()
+
+
+@pytest.fixture
+def stub_simbad(monkeypatch):
+    StubSimbad.queries = []
+    monkeypatch.setattr(ingest, 'Simbad', StubSimbad)
+    monkeypatch.setattr(ingest, 'simbad_tap_url', None)
+    monkeypatch.setattr(ingest, 'simbad_bulk_match', True)
+    return StubSimbad
+
+
+def tile_frame():
+    return pd.DataFrame({'source_id': [1, 2, 3], 'ra': [10.0, 20.0, 30.0], 'dec': [5.0, -5.0, 60.0]})
+
+
+def test_bulk_match_prefers_stars_then_nearest(stub_simbad):
+    best = ingest.query_simbad_bulk(tile_frame())
+    names = dict(zip(best['source_id'], best['main_id']))
+    assert names == {1: '* alf Test', 2: 'NAME Nearer Cloud'}
+    assert dict(zip(best['source_id'], best['dist_arcsec'])) == {1: 9.0, 2: 5.0}
+    assert list(stub_simbad.queries[0]['tile'].colnames) == ['source_id', 'ra', 'dec']
+
+
+def test_per_star_match_agrees_with_bulk():
+    centre = SkyCoord(ra=10 * u.degree, dec=5 * u.degree, frame='icrs')
+    offsets = [2.0, 9.0, 14.0]
+    result = Table({'main_id': ['NAME Some Galaxy', '* alf Test', '* bet Test'],
+                    'ra': [10.0] * 3, 'dec': [5 + d / 3600 for d in offsets]})
+    name, distance = ingest.best_simbad_match(result, centre)
+    assert name == '* alf Test' and distance == pytest.approx(9.0)
+
+    result = Table({'main_id': ['IRAS 12345+6789', 'NAME Nearer Cloud'],
+                    'ra': [10.0] * 2, 'dec': [5 + 20 / 3600, 5 + 5 / 3600]})
+    name, distance = ingest.best_simbad_match(result, centre)
+    assert name == 'NAME Nearer Cloud' and distance == pytest.approx(5.0)
+
+
+def test_resolve_names_and_cache_misses(stub_simbad, tmp_path):
+    defaults = {1: 'Gaia 1', 2: 'Gaia 2', 3: 'Gaia 3'}
+    cache = ingest.SimbadNameCache(str(tmp_path / 'simbad.sqlite'))
+    try:
+        names = ingest.resolve_simbad_names(tile_frame(), defaults, cache)
+        assert names == {1: '* alf Test', 2: 'NAME Nearer Cloud', 3: 'Gaia 3'}
+        assert cache.lookup([1, 2, 3]) == {1: '* alf Test', 2: 'NAME Nearer Cloud', 3: None}
+
+        # A second pass is answered from the cache, including the no-match
+        assert ingest.resolve_simbad_names(tile_frame(), defaults, cache) == names
+        assert len(stub_simbad.queries) == 1
+    finally:
+        cache.close()
+
+
+class FailingTapSimbad(StubSimbad):
+    """Bulk cross-match unavailable; cone searches answer per star."""
+    cones = {
+        (10.0, 5.0): Table({'main_id': ['NAME Some Galaxy', '* alf Test'],
+                            'ra': [10.0, 10.0], 'dec': [5 + 2 / 3600, 5 + 9 / 3600]}),
+        (20.0, -5.0): Table({'main_id': ['NAME Nearer Cloud'], 'ra': [20.0], 'dec': [-5 + 5 / 3600]}),
+    }
+
+    def query_tap(self, query, maxrec=None, **uploads):
+        raise ConnectionError("TAP service unavailable")
+
+    def add_votable_fields(self, *fields):
+        pass
+
+    def query_region(self, coord, radius=None):
+        key = (round(coord.ra.degree, 6), round(coord.dec.degree, 6))
+        if key == (30.0, 60.0):
+            return Table({'main_id': [], 'ra': [], 'dec': []})
+        return self.cones[key]
+
+
+def test_per_star_fallback_caches_misses_and_distances(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, 'Simbad', FailingTapSimbad)
+    monkeypatch.setattr(ingest, 'simbad_tap_url', None)
+    monkeypatch.setattr(ingest, 'simbad_bulk_match', True)
+    monkeypatch.setattr(ingest, 'simbad_limiter', ingest.ServiceLimiter("SIMBAD", 1, max_retries=1))
+    monkeypatch.setattr(ingest.time, 'sleep', lambda seconds: None)
+    defaults = {1: 'Gaia 1', 2: 'Gaia 2', 3: 'Gaia 3'}
+    cache = ingest.SimbadNameCache(str(tmp_path / 'simbad.sqlite'))
+    try:
+        names = ingest.resolve_simbad_names(tile_frame(), defaults, cache)
+        assert names == {1: '* alf Test', 2: 'NAME Nearer Cloud', 3: 'Gaia 3'}
+        rows = {sid: (name, distance) for sid, name, distance in cache.conn.execute(
+            "SELECT source_id, name, distance_arcsec FROM simbad_names")}
+        assert rows[1][0] == '* alf Test' and rows[1][1] == pytest.approx(9.0)
+        assert rows[2][0] == 'NAME Nearer Cloud' and rows[2][1] == pytest.approx(5.0)
+        assert rows[3] == (None, None)
+    finally:
+        cache.close()
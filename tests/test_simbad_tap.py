@@ -0,0 +1,169 @@
+# Stage 1's bulk SIMBAD cross-match run through pyvo against a local TAP stand-in.
+#
+# The stand-in serves /sync over HTTP and runs the ADQL it receives, unchanged,
+# on sqlite: the upload becomes the table TAP_UPLOAD.<name> of an attached
+# database and POINT/CIRCLE/CONTAINS/DISTANCE are sqlite functions.
+
+import email
+import email.policy
+import importlib
+import io
+import json
+import math
+import sqlite3
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+import pytest
+
+pytest.importorskip("astroquery")
+pytest.importorskip("pyvo")
+from astropy.coordinates import SkyCoord
+from astropy.io.votable import from_table, parse_single_table
+from astropy.io.votable.tree import Info
+from astropy.table import Table
+import astropy.units as u
+import pandas as pd
+
+ingest = importlib.import_module('1_GAIA_Plus_Create_CSV')
+
+# SIMBAD objects around the tile's stars, as (main_id, ra, dec)
+ARCSEC = 1 / 3600
+BASIC = [
+    ('NAME Some Galaxy', 10.0, 5 + 2 * ARCSEC),
+    ('* alf Test', 10.0, 5 + 9 * ARCSEC),
+    ('* bet Test', 10.0 + 14 * ARCSEC / math.cos(math.radians(5)), 5.0),
+    ('* far Test', 10.0, 5 + 40 * ARCSEC),
+    ('IRAS 12345+6789', 20.0, -5 + 20 * ARCSEC),
+    ('NAME Nearer Cloud', 20.0, -5 - 5 * ARCSEC),
+    ('* lonely Test', 30.0, 60 + 45 * ARCSEC),
+    ('* wrap Test', 0.0005, 0.0),
+]
+TILE = pd.DataFrame({'source_id': [1, 2, 3, 4], 'ra': [10.0, 20.0, 30.0, 359.9995], 'dec': [5.0, -5.0, 60.0, 0.0]})
+
+
+def _separation(ra1, dec1, ra2, dec2):
+    """Angular separation in degrees (Vincenty, as astropy computes it)."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    dlon = lon2 - lon1
+    num1 = math.cos(lat2) * math.sin(dlon)
+    num2 = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)
+    denominator = math.sin(lat1) * math.sin(lat2) + math.cos(lat1) * math.cos(lat2) * math.cos(dlon)
+    return math.degrees(math.atan2(math.hypot(num1, num2), denominator))
+
+
+def _connect(upload_name, upload):
+    conn = sqlite3.connect(':memory:')
+    conn.create_function('POINT', 3, lambda frame, ra, dec: json.dumps([ra, dec]))
+    conn.create_function('CIRCLE', 4, lambda frame, ra, dec, radius: json.dumps([ra, dec, radius]))
+    conn.create_function('CONTAINS', 2, lambda point, circle: int(
+        _separation(*json.loads(point), *json.loads(circle)[:2]) <= json.loads(circle)[2]))
+    conn.create_function('DISTANCE', 2, lambda p, q: _separation(*json.loads(p), *json.loads(q)))
+    conn.execute("CREATE TABLE basic (main_id TEXT, ra REAL, dec REAL)")
+    conn.executemany("INSERT INTO basic VALUES (?, ?, ?)", BASIC)
+    if upload_name:
+        conn.execute("ATTACH ':memory:' AS TAP_UPLOAD")
+        conn.execute(f"CREATE TABLE TAP_UPLOAD.{upload_name} ({', '.join(upload.colnames)})")
+        conn.executemany(f"INSERT INTO TAP_UPLOAD.{upload_name} VALUES ({', '.join('?' * len(upload.colnames))})",
+                         [tuple(v.item() for v in row) for row in upload])
+    return conn
+
+
+class TapStandIn(BaseHTTPRequestHandler):
+    queries = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        fields, files = {}, {}
+        if self.headers['Content-Type'].startswith('multipart/'):
+            message = email.message_from_bytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body, policy=email.policy.HTTP)
+            for part in message.iter_parts():
+                content = part.get_payload(decode=True)
+                if part.get_filename():
+                    files[part.get_param('name', header='content-disposition')] = content
+                else:
+                    fields[part.get_param('name', header='content-disposition')] = content.decode()
+        else:
+            fields = dict(parse_qsl(body.decode()))
+        self.queries.append(fields)
+
+        upload_name, upload = None, None
+        if fields.get('UPLOAD'):
+            upload_name, ref = fields['UPLOAD'].split(',')
+            upload = parse_single_table(io.BytesIO(files[ref.split(':', 1)[1]])).to_table()
+        rows = _connect(upload_name, upload).execute(fields['QUERY'])
+        names = [column[0] for column in rows.description]
+        table = Table(rows=rows.fetchall() or None, names=names)
+        votable = from_table(table)
+        votable.resources[0].type = 'results'
+        votable.resources[0].infos.append(Info(name='QUERY_STATUS', value='OK'))
+        out = io.BytesIO()
+        votable.to_xml(out)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-votable+xml')
+        self.end_headers()
+        self.wfile.write(out.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def tap_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TapStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/tap"
+    server.shutdown()
+
+
+def cone(tap_url, ra, dec):
+    """The objects within the match radius of one star, from the stand-in."""
+    query = (f"SELECT main_id, ra, dec FROM basic WHERE 1 = CONTAINS(POINT('ICRS', ra, dec), "
+             f"CIRCLE('ICRS', {ra}, {dec}, {ingest.SIMBAD_MATCH_RADIUS_ARCSEC} / 3600.))")
+    return ingest._tap_service(tap_url).run_sync(query).to_table()
+
+
+def test_bulk_cross_match_runs_on_tap(tap_url):
+    TapStandIn.queries = []
+    best = ingest.query_simbad_bulk(TILE, tap_url=tap_url)
+    names = dict(zip(best['source_id'], best['main_id']))
+    assert names == {1: '* alf Test', 2: 'NAME Nearer Cloud', 4: '* wrap Test'}
+    distances = dict(zip(best['source_id'], best['dist_arcsec']))
+    assert distances[1] == pytest.approx(9.0) and distances[2] == pytest.approx(5.0)
+    assert distances[4] == pytest.approx(3.6)
+    assert len(TapStandIn.queries) == 1 and TapStandIn.queries[0]['UPLOAD'] == 'tile,param:tile'
+
+
+def test_bulk_agrees_with_best_simbad_match_per_star(tap_url):
+    best = ingest.query_simbad_bulk(TILE, tap_url=tap_url).set_index('source_id')
+    for sid, ra, dec in TILE.itertuples(index=False):
+        result = cone(tap_url, ra, dec)
+        if not len(result):
+            assert sid not in best.index
+            continue
+        name, distance = ingest.best_simbad_match(result, SkyCoord(ra=ra * u.degree, dec=dec * u.degree))
+        assert best.loc[sid, 'main_id'] == name
+        assert best.loc[sid, 'dist_arcsec'] == pytest.approx(distance, abs=1e-6)
+
+
+def test_resolve_names_through_tap(tap_url, monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, 'simbad_tap_url', tap_url)
+    monkeypatch.setattr(ingest, 'simbad_bulk_match', True)
+    defaults = {sid: f"Gaia {sid}" for sid in TILE['source_id']}
+    cache = ingest.SimbadNameCache(str(tmp_path / 'simbad.sqlite'))
+    try:
+        names = ingest.resolve_simbad_names(TILE, defaults, cache)
+        assert names == {1: '* alf Test', 2: 'NAME Nearer Cloud', 3: 'Gaia 3', 4: '* wrap Test'}
+        assert cache.lookup([3]) == {3: None}
+    finally:
+        cache.close()
+
+
+def test_tap_url_needs_pyvo_only_when_used(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyvo.dal', None)
+    with pytest.raises(ImportError, match='pyvo'):
+        ingest.query_simbad_bulk(TILE, tap_url='http://127.0.0.1:9/tap')
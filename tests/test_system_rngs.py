@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import import_script
+
+
+@pytest.fixture(scope='module')
+def make_sys(tmp_path_factory):
+    return import_script('4_ES_Make_SYS_FromCustomCsv', tmp_path_factory.mktemp('logs'))
+
+
+def test_system_rngs_are_reproducible(make_sys):
+    (py_a, np_a), (py_b, np_b) = make_sys.system_rngs(7, 123), make_sys.system_rngs(7, 123)
+    assert [py_a.random() for _ in range(5)] == [py_b.random() for _ in range(5)]
+    assert np.array_equal(np_a.random(5), np_b.random(5))
+
+
+def test_system_rngs_streams_come_from_separate_children(make_sys):
+    _, np_rng = make_sys.system_rngs(7, 123)
+    parent = np.random.SeedSequence([7, 123])
+    np_child = parent.spawn(2)[1]
+    assert np.array_equal(np_rng.random(5), np.random.default_rng(np_child).random(5))
+    assert not np.array_equal(np.random.default_rng(np_child).random(5),
+                              np.random.default_rng(np.random.SeedSequence([7, 123])).random(5))
+
+
+def seeded_frame(make_sys, n=120):
+    rng = np.random.default_rng(4)
+    return pd.DataFrame({
+        'source_id': rng.integers(1, 2 ** 62, n),
+        'star_image_key': rng.choice(sorted(make_sys.STARS_BY_CLASS), n),
+        'binary_candidate': rng.random(n).round(),
+        'flat_x': rng.integers(0, 20000, n),
+        'flat_y': rng.integers(0, 4000, n),
+        'Name_two': [f"Test{i}" for i in range(n)],
+    })
+
+
+def test_seeded_output_does_not_depend_on_workers(make_sys):
+    df = seeded_frame(make_sys)
+    serial = list(make_sys.generate_systems_seeded(df, seed=7, workers=1, chunk_rows=1000))
+    assert len(serial) == len(df)
+    assert list(make_sys.generate_systems_seeded(df, seed=7, workers=2, chunk_rows=16)) == serial
+    assert list(make_sys.generate_systems_seeded([df[:50], df[50:]], seed=7, workers=3, chunk_rows=9)) == serial
+    assert list(make_sys.generate_systems_seeded(df, seed=8, workers=1)) != serial
+
+
+def test_seeded_system_matches_its_own_rngs(make_sys):
+    df = seeded_frame(make_sys, n=5)
+    systems = list(make_sys.generate_systems_seeded(df, seed=7, workers=2, chunk_rows=2))
+    for row, system in zip(df.to_dict('records'), systems):
+        rng, np_rng = make_sys.system_rngs(7, row['source_id'])
+        assert make_sys.system_block(row['Name_two'], row['star_image_key'], row['binary_candidate'],
+                                     row['flat_x'], row['flat_y'], rng, np_rng) == system
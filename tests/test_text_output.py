@@ -0,0 +1,57 @@
+# Stage 4's system file written through gaia_io.open_text_output, plain and compressed.
+
+import gzip
+import sys
+
+import pytest
+
+from conftest import import_script
+from gaia_io import open_text_output
+
+# Multi-byte text, and more of it than one TEXT_BUFFER_SIZE buffer
+SYSTEMS = [f'system "Sÿstem {i}"\n\tpos {i}.0 {2 * i}.0\n\tattributes "dull star"' for i in range(20000)]
+EXPECTED = '\n\n'.join(SYSTEMS)
+
+
+@pytest.fixture(scope='module')
+def make_sys(tmp_path_factory):
+    return import_script('4_ES_Make_SYS_FromCustomCsv', tmp_path_factory.mktemp('logs'))
+
+
+def test_plain_output(make_sys, tmp_path):
+    path = tmp_path / 'map.txt'
+    assert make_sys.write_systems(iter(SYSTEMS), str(path)) == len(SYSTEMS)
+    assert path.read_text(encoding='utf-8') == EXPECTED
+
+
+@pytest.mark.parametrize('name, compression', [('map.txt.gz', 'infer'), ('map.txt', 'gzip')])
+def test_gzip_output(make_sys, tmp_path, name, compression):
+    path = tmp_path / name
+    assert make_sys.write_systems(iter(SYSTEMS), str(path), compression) == len(SYSTEMS)
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        assert f.read() == EXPECTED
+
+
+def test_zstd_output(make_sys, tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / 'map.txt.zst'
+    assert make_sys.write_systems(iter(SYSTEMS), str(path)) == len(SYSTEMS)
+    with zstandard.open(path, 'rt', encoding='utf-8') as f:
+        assert f.read() == EXPECTED
+
+
+def test_zstd_needs_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'zstandard', None)
+    with pytest.raises(ImportError, match='zstandard'):
+        open_text_output(str(tmp_path / 'map.txt.zst'))
+
+
+def test_unknown_compression(tmp_path):
+    with pytest.raises(ValueError, match='bz2'):
+        open_text_output(str(tmp_path / 'map.txt'), 'bz2')
+
+
+def test_empty_output(make_sys, tmp_path):
+    path = tmp_path / 'map.txt.gz'
+    assert make_sys.write_systems(iter([]), str(path)) == 0
+    assert gzip.open(path).read() == b''
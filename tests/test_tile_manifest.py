@@ -0,0 +1,97 @@
+# Resuming the stage 1 full-sky pass from its tile manifest, with the Gaia and SIMBAD work stubbed out.
+
+import importlib
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("astroquery")
+ingest = importlib.import_module('1_GAIA_Plus_Create_CSV')
+
+TILES = [ingest.Tile(i, 2 * i, 2 * i + 2, 0, 2) for i in range(3)]
+
+
+def tile_rows(tile, simbad_cache=None):
+    ids = [tile.index * 10 + i for i in range(3)]
+    return pd.DataFrame({'source_id': ids, 'Name_two': [f"S{sid}" for sid in ids],
+                         'simbad_names': [f"S{sid}" if sid % 2 else f"* {sid}" for sid in ids]})
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    monkeypatch.setattr(ingest, 'output_dir', str(tmp_path))
+    monkeypatch.setattr(ingest, 'endless_sky_csv', str(tmp_path / 'GAIA_Plus.csv'))
+    monkeypatch.setattr(ingest, 'endless_sky_no_simbad_csv', str(tmp_path / 'GAIA_Plus_Simbad.csv'))
+    monkeypatch.setattr(ingest, 'tile_manifest_path', str(tmp_path / 'manifest.sqlite'))
+    monkeypatch.setattr(ingest, 'simbad_cache_path', str(tmp_path / 'simbad.sqlite'))
+    monkeypatch.setattr(ingest, 'append_mode', False)
+    monkeypatch.setattr(ingest, 'resume', True)
+    monkeypatch.setattr(ingest, 'truncate_outputs', False)
+    monkeypatch.setattr(ingest, 'write_parquet', False)
+    monkeypatch.setattr(ingest, 'tile_workers', 1)
+    monkeypatch.setattr(ingest, 'iter_tiles', lambda: iter(TILES))
+    monkeypatch.setattr(ingest, 'process_tile', tile_rows)
+    return tmp_path
+
+
+def run(monkeypatch):
+    monkeypatch.setattr(ingest, 'append_mode', False)
+    ingest.main()
+    return pd.read_csv(ingest.endless_sky_csv)['source_id'].tolist()
+
+
+def test_failed_side_write_is_rolled_back_and_redone_once(pipeline, monkeypatch):
+    def write_parquet(df, out_dir, name, row_order=None):
+        if name.startswith('tile-00001'):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(ingest, 'write_parquet', True)
+    monkeypatch.setattr(ingest, 'write_catalogue_parquet', write_parquet)
+    assert run(monkeypatch) == [0, 1, 2, 20, 21, 22]
+
+    monkeypatch.setattr(ingest, 'write_catalogue_parquet', lambda df, out_dir, name, row_order=None: None)
+    assert run(monkeypatch) == [0, 1, 2, 20, 21, 22, 10, 11, 12]
+    side = pd.read_csv(ingest.endless_sky_no_simbad_csv)['source_id'].tolist()
+    assert side == [0, 2, 20, 22, 10, 12]
+
+
+def test_resume_cuts_rows_of_an_interrupted_tile(pipeline, monkeypatch):
+    run(monkeypatch)
+    manifest = ingest.TileManifest(ingest.tile_manifest_path)
+    starts = manifest.conn.execute("SELECT csv_start, no_simbad_start FROM tiles WHERE tile_id = ?",
+                                   [ingest.TileManifest.tile_id(TILES[2])]).fetchone()
+    manifest.begin_write(TILES[2], *starts)  # as if the run died before tile 2 was recorded done
+    manifest.close()
+    with open(ingest.endless_sky_csv, 'ab') as f:
+        f.write(b"99,S99,S")
+    assert run(monkeypatch) == [0, 1, 2, 10, 11, 12, 20, 21, 22]
+
+
+def test_resume_refuses_rows_without_a_manifest(pipeline, monkeypatch):
+    with open(ingest.endless_sky_csv, 'w') as f:
+        f.write("source_id,Name_two,simbad_names\n7,S7,S7\n")
+    with pytest.raises(RuntimeError, match="truncate_outputs"):
+        run(monkeypatch)
+    assert pd.read_csv(ingest.endless_sky_csv)['source_id'].tolist() == [7]
+
+    monkeypatch.setattr(ingest, 'truncate_outputs', True)
+    assert run(monkeypatch) == [0, 1, 2, 10, 11, 12, 20, 21, 22]
+
+
+def test_resume_refuses_other_tiling(pipeline, monkeypatch):
+    run(monkeypatch)
+    monkeypatch.setattr(ingest, 'base_tile_deg', ingest.base_tile_deg * 2)
+    with pytest.raises(ValueError, match="base_tile_deg"):
+        run(monkeypatch)
+
+
+def test_checkpoint_stops_at_a_gap(tmp_path):
+    manifest = ingest.TileManifest(str(tmp_path / 'manifest.sqlite'))
+    try:
+        for tile, (start, end) in zip(TILES, [(0, 10), (10, 20), (30, 40)]):
+            manifest.begin_write(tile, start, start)
+            manifest.finish(tile, 'done', 3, 'x', end, end)
+        assert manifest.checkpoint() == (20, 20)
+        assert manifest.completed() == {ingest.TileManifest.tile_id(t) for t in TILES[:2]}
+    finally:
+        manifest.close()
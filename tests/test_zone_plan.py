@@ -0,0 +1,54 @@
+# Stage 4's memoized zone_plan against the original per-call zone scan.
+
+import random
+
+import numpy as np
+import pytest
+
+from conftest import import_script
+from endless_sky_data import star_image
+
+# Every star's habitability, plus the clamp at 1 and values outside the table
+HABITABILITIES = sorted({s['base_habitability'] for s in star_image} | {0, 1, 20000})
+
+
+@pytest.fixture(scope='module')
+def make_sys(tmp_path_factory):
+    return import_script('4_ES_Make_SYS_FromCustomCsv', tmp_path_factory.mktemp('logs'))
+
+
+def test_zone_plan_is_cached(make_sys):
+    make_sys.zone_plan.cache_clear()
+    first = make_sys.zone_plan(1000)
+    assert make_sys.zone_plan(1000) is first
+    info = make_sys.zone_plan.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    assert make_sys.zone_plan.__wrapped__(1000) == first
+
+
+@pytest.mark.parametrize('habitability', HABITABILITIES)
+def test_planets_match_the_scan(make_sys, habitability):
+    for seed in range(50):
+        random.seed(seed)
+        expected = make_sys.generate_planets_from_zones_scan(habitability)
+        state = random.getstate()
+        assert make_sys.generate_planets_from_zones(habitability, random.Random(seed)) == expected
+        random.seed(seed)
+        assert make_sys.generate_planets_from_zones(habitability) == expected
+        assert random.getstate() == state
+
+
+def test_system_block_matches_the_scan(make_sys, monkeypatch):
+    star_classes = sorted(make_sys.STARS_BY_CLASS)
+    expected = []
+    with monkeypatch.context() as patch:
+        patch.setattr(make_sys, 'generate_planets_from_zones',
+                      lambda star_habitability, rng=random: make_sys.generate_planets_from_zones_scan(star_habitability))
+        for seed, star_class in enumerate(star_classes * 4):
+            random.seed(seed)
+            np.random.seed(seed)
+            expected.append(make_sys.system_block("Test", star_class, seed % 2, 10.0, 20.0))
+    for seed, star_class in enumerate(star_classes * 4):
+        random.seed(seed)
+        np.random.seed(seed)
+        assert make_sys.system_block("Test", star_class, seed % 2, 10.0, 20.0) == expected[seed]